@@ -2,6 +2,7 @@ from django.contrib import admin
 from .models import CustomUser, ProfileUser
 from django.contrib.auth.admin import UserAdmin
 from image_cropping.admin import ImageCroppingMixin
+from core.admin_tools import AutocompleteFilter, ChangelistPerformanceMixin
 
 
 class CustomUserAdmin(UserAdmin):
@@ -47,25 +48,40 @@ class CustomUserAdmin(UserAdmin):
 admin.site.register(CustomUser, CustomUserAdmin)
 
 
-class ProfileUserAdmin(ImageCroppingMixin, admin.ModelAdmin):
+class UserFilter(AutocompleteFilter):
+    """Filter by user, searched by username and email."""
+    title = 'user'
+    field_name = 'user'
+
+
+class ProfileUserAdmin(ChangelistPerformanceMixin, ImageCroppingMixin, admin.ModelAdmin):
     """
     Admin configuration for the ProfileUser model.
 
     This class customizes the admin panel for managing user profiles, including:
     - Displaying user and last update time in the list view
     - Enabling search functionality by username
-    - Adding filtering options by user
+    - Adding filtering options by user, chosen with an autocomplete field
     - Structuring fields for editing user profiles
     """
 
     # Fields to display in the profile list in the admin panel
     list_display = ('user', 'updated')
 
+    # The user of every profile is read with the profiles, in a single query
+    list_select_related = ('user',)
+
+    # The bios are not shown in the list view
+    changelist_defer = ('bio',)
+
     # Fields that can be searched in the admin panel (searching by username)
     search_fields = ('user__username',)
 
     # Filters available in the admin panel (filtering by user)
-    list_filter = ('user',)
+    list_filter = (UserFilter,)
+
+    # Searched instead of listing every user in the form
+    autocomplete_fields = ('user',)
 
     # Field structure for editing profile details
     fieldsets = (
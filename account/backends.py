@@ -0,0 +1,54 @@
+from django.contrib.auth.backends import ModelBackend
+
+from core import cache as core_cache
+from .models import CustomUser, ProfileUser
+
+
+def viewer_record(user_id):
+    """
+    Builds the record of a user shown by the templates, or None when the user does not
+    exist. It is a plain dict, read with one query joining the profile of the user.
+    """
+    row = CustomUser.objects.filter(pk=user_id).values(
+        'id', 'username', 'full_name', 'is_staff', 'is_superuser', 'profile__id', 'profile__photo', 'profile__bio',
+    ).first()
+    if row is None:
+        return None
+    photo = row['profile__photo']
+    return {
+        'id': row['id'],
+        'username': row['username'],
+        'full_name': row['full_name'],
+        'is_staff': row['is_staff'],
+        'is_superuser': row['is_superuser'],
+        'has_profile': row['profile__id'] is not None,
+        'photo_url': ProfileUser.photo.field.storage.url(photo) if photo else None,
+        'bio': row['profile__bio'],
+    }
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    Authentication backend resolving the user of a session from the cache.
+
+    'AuthenticationMiddleware' loads the user of the session on every authenticated
+    request. This backend reads it from the cache instead of the users table, in the
+    same round trip as the viewer record shown by the templates (see
+    'account.context_processors.viewer'). Both are in the namespace of the user, which
+    is bumped on every save of the user or of its profile, a password change included,
+    and on every 'update' of users (see 'account.models.CustomUserQuerySet'), so the
+    session of a user whose password changed or who was deactivated is still rejected.
+    """
+
+    def get_user(self, user_id):
+        batch = core_cache.CacheBatch()
+        batch.add('user', core_cache.CUSTOM_USER_INFO,
+                  lambda: CustomUser._default_manager.filter(pk=user_id).first(), user_id=user_id)
+        batch.add('viewer', core_cache.VIEWER, lambda: viewer_record(user_id), user_id=user_id)
+        values = batch.fetch()
+
+        user = values['user']
+        if user is None or not self.user_can_authenticate(user):
+            return None
+        user.viewer = values['viewer']
+        return user
@@ -0,0 +1,23 @@
+from django.utils.functional import SimpleLazyObject
+
+from core import cache as core_cache
+from .backends import viewer_record
+
+
+def viewer(request):
+    """
+    Adds 'viewer' to the context of every template: the cached record of the signed-in
+    user (see 'account.backends.viewer_record'), or None for anonymous visitors.
+
+    It is resolved on first use only, and comes with the user of the request when the
+    user was loaded by 'CachedModelBackend', so showing it costs no extra lookup.
+    """
+    def get_viewer():
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return None
+        if hasattr(user, 'viewer'):
+            return user.viewer
+        return core_cache.cached(core_cache.VIEWER, lambda: viewer_record(user.id), user_id=user.id)
+
+    return {'viewer': SimpleLazyObject(get_viewer)}
@@ -20,3 +20,25 @@ def redirect_if_authenticated(view_func):
 
     return _wrapped_view
 
+
+def is_admin(user):
+    """
+    Returns True if the user is a staff member.
+    Staff members can moderate comments and profile requests.
+    """
+    return user.is_authenticated and user.is_staff
+
+
+def staff_required(view_func):
+    """
+    A decorator to restrict a view to staff members (see 'is_admin').
+    Other users are redirected to the home page with an error message.
+    """
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if not is_admin(request.user):
+            messages.error(request, 'Sorry! you are not Admin')
+            return redirect('core:home')
+        return view_func(request, *args, **kwargs)
+
+    return _wrapped_view
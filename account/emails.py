@@ -0,0 +1,18 @@
+from django.template.loader import render_to_string
+
+from core import outbox
+
+
+def queue_reset_email(subject, email, reset_link, username):
+    """
+    Queues a password reset email in the outbox (see 'core.outbox').
+
+    The email content is rendered from the 'password-reset-email.html' template here,
+    once, and the email is sent by the 'drain_outbox' Celery task with the other
+    queued emails.
+    """
+    message = render_to_string('account/password-reset-email.html', {
+        'user': username,
+        'reset_link': reset_link,
+    })
+    return outbox.enqueue(subject, message, email)
@@ -1,8 +1,28 @@
 from django.db import models
-from django.contrib.auth.models import AbstractUser
-from PIL import Image
-from io import BytesIO
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.contrib.auth.models import AbstractUser, UserManager
+from core import cache as core_cache, media
+
+
+class CustomUserQuerySet(models.QuerySet):
+    """
+    QuerySet of the users whose 'update' invalidates the cached users it changed.
+
+    A save bumps the cache namespace of the user (see 'account.signals'), but an
+    'update', such as a bulk deactivation, sends no signal: without the bump, the
+    authentication backend would keep a deactivated user logged in from the cache
+    (see 'account.backends.CachedModelBackend').
+    """
+
+    def update(self, **kwargs):
+        user_ids = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        for user_id in user_ids:
+            core_cache.bump(core_cache.USER, user_id=user_id)
+        return rows
+
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    pass
 
 
 class CustomUser(AbstractUser):
@@ -14,6 +34,8 @@ class CustomUser(AbstractUser):
     email = models.EmailField(unique=True)
     username = models.CharField(max_length=255, unique=True)
 
+    objects = CustomUserManager()
+
     def __str__(self):
         return self.username
 
@@ -28,23 +50,14 @@ class ProfileUser(models.Model):
     bio = models.TextField(max_length=500, blank=True, null=True, default='')
     updated = models.DateTimeField(auto_now=True)
 
+    # Quality of the WebP photos
+    WEBP_QUALITY = 50
+
     def __str__(self):
         return self.user.username
 
     def save(self, *args, **kwargs):
-        if self.photo:
-            img = Image.open(self.photo)
-            img = img.convert("RGB")
-            img = img.copy()
-            img_io = BytesIO()
-            img.save(img_io, format="WEBP", quality=50, optimize=True)
-
-        self.photo = InMemoryUploadedFile(
-            file=img_io,
-            field_name=None,
-            name=self.photo.name.split('.')[0] + ".webp",
-            content_type="image/webp",
-            size=img_io.tell(),
-            charset=None
-        )
-        super().save(*args, **kwargs)
\ No newline at end of file
+        # Only a new photo is encoded, so an edit of the bio does not open the image
+        # (see 'core.media.encode_upload')
+        media.encode_upload(self, 'photo', self.WEBP_QUALITY)
+        super().save(*args, **kwargs)
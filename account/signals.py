@@ -1,7 +1,8 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.core.cache import cache
+from core import cache as core_cache
 from core.models import Comment
+from .models import CustomUser
 
 
 @receiver([post_save, post_delete], sender=Comment)
@@ -13,7 +14,15 @@ def update_comments_and_reply_cache(sender, instance, **kwarg):
     This ensures that the cache is refreshed with the most up-to-date data for the admin profile.
     """
     # Deleting cache related to approved comments and replies in the admin profile
-    cache.delete('approved_comments_in_admin_profile')
-    cache.delete('approved_reply_in_admin_profile')
+    core_cache.invalidate(core_cache.PENDING_COMMENTS)
+    core_cache.invalidate(core_cache.PENDING_REPLIES)
 
 
+@receiver([post_save, post_delete], sender=CustomUser)
+def update_user_cache_on_change(sender, instance, **kwargs):
+    """
+    Signal receiver that listens to post_save and post_delete signals for the CustomUser model.
+    When a user is saved or deleted, it invalidates every cached value about the user
+    (profile, profile page and like status) by bumping the user's namespace.
+    """
+    core_cache.bump(core_cache.USER, user_id=instance.id)
@@ -1,16 +1,17 @@
 from celery import shared_task
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.conf import settings
 
+from .emails import queue_reset_email
 
-@shared_task
+
+@shared_task(ignore_result=True)
 def send_reset_email(subject, email, reset_link, username):
     """
     Celery task to send a password reset email to the user.
 
-    This task is responsible for sending an email with a password reset link to the user.
-    It renders the email content from an HTML template and sends it using the Django email backend.
+    The email is queued in the outbox, and sent by the 'drain_outbox' task through a
+    shared SMTP connection and within the rate limit. The views queue it directly (see
+    'account.emails.queue_reset_email'); this task serves the messages queued in the
+    broker by older releases.
 
     Args:
         subject (str): The subject of the email.
@@ -18,15 +19,6 @@ def send_reset_email(subject, email, reset_link, username):
         reset_link (str): The URL to reset the user's password.
         username (str): The username of the user who requested the password reset.
 
-    Sends:
-        A password reset email to the provided email address.
+    Nobody waits for the email to be sent, so the result of the task is not stored.
     """
-
-    # Render the email content using the 'password-reset-email.html' template
-    message = render_to_string('account/password-reset-email.html', {
-        'user': username,
-        'reset_link': reset_link,
-    })
-
-    # Send the email to the specified recipient
-    send_mail(subject, message, settings.EMAIL_HOST_USER, [email])
\ No newline at end of file
+    queue_reset_email(subject, email, reset_link, username)
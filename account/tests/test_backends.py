@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from account.backends import CachedModelBackend
+from account.models import CustomUser, ProfileUser
+from core.tests.utils import make_image
+
+
+class CachedModelBackendTest(TestCase):
+    """
+    Test suite for the cached authentication backend.
+    It covers the cached user and viewer record, and their invalidation on changes
+    of the user, of its profile and of its password.
+    """
+    def setUp(self):
+        """Set up a user with a profile and the backend."""
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            username='testuser', email='testuser@email.com', password='testpass123', full_name='Test User'
+        )
+        self.profile = ProfileUser.objects.create(user=self.user, bio='Test bio', photo=make_image())
+        self.backend = CachedModelBackend()
+
+    def test_user_is_read_from_the_cache(self):
+        """Once cached, the user and the viewer record are resolved without any query."""
+        self.backend.get_user(self.user.id)
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.user.id)
+        self.assertEqual(user, self.user)
+        self.assertEqual(user.viewer['full_name'], 'Test User')
+        self.assertEqual(user.viewer['bio'], 'Test bio')
+        self.assertEqual(user.viewer['photo_url'], self.profile.photo.url)
+
+    def test_missing_and_inactive_users(self):
+        """Unknown and inactive users are not authenticated."""
+        self.assertIsNone(self.backend.get_user(self.user.id + 1))
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.get_user(self.user.id))
+
+    def test_profile_change_updates_the_viewer(self):
+        """Saving the profile invalidates the cached viewer record."""
+        self.backend.get_user(self.user.id)
+        self.profile.bio = 'New bio'
+        self.profile.save()
+        self.assertEqual(self.backend.get_user(self.user.id).viewer['bio'], 'New bio')
+
+    def test_password_change_ends_the_other_sessions(self):
+        """A session authenticated with the old password is rejected, although the user was cached."""
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('core:home'))
+        self.assertTrue(response.wsgi_request.user.is_authenticated)
+
+        self.user.set_password('newpass123')
+        self.user.save()
+        response = self.client.get(reverse('core:home'))
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_bulk_deactivation_ends_the_sessions(self):
+        """Users deactivated with 'QuerySet.update' are no longer authenticated from the cache."""
+        self.backend.get_user(self.user.id)
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNone(self.backend.get_user(self.user.id))
+
+    def test_sessions_of_the_model_backend_are_kept(self):
+        """A session opened with 'ModelBackend', before the cached backend, stays logged in."""
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get(reverse('core:home'))
+        self.assertTrue(response.wsgi_request.user.is_authenticated)
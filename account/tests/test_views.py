@@ -1,9 +1,12 @@
+from unittest import mock
+
 from django.test import TestCase, Client, RequestFactory
 from account.models import CustomUser, ProfileUser
-from core.models import Comment, BlogPost
+from core.models import Comment, BlogPost, OutboxEmail
 from django.urls import reverse
 from django.contrib.messages import get_messages
 from django.core.cache import cache
+from core import cache as core_cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
@@ -111,6 +114,7 @@ class ForgetPasswordViewTest(TestCase):
     """
     def setUp(self):
         """Set up test user and password reset URL."""
+        cache.clear()
         self.url = reverse('account:forget-pass')
         self.user = CustomUser.objects.create_user(
             username='testuser',
@@ -131,6 +135,33 @@ class ForgetPasswordViewTest(TestCase):
         response = self.client.post(self.url, data)
         self.assertRedirects(response, reverse('core:home'))
 
+    def test_post_request_with_valid_email_queues_the_email(self):
+        """Test if the reset email, with its link, is queued in the outbox for the user."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {'email': 'testuser@email.com'})
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.to, 'testuser@email.com')
+        self.assertIn('/account/reset-password/', email.body)
+        self.assertIn('testuser', email.body)
+
+    def test_repeated_requests_queue_one_email(self):
+        """Test if sending the form again within the window queues no other email."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {'email': 'testuser@email.com'})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'email': 'testuser@email.com'})
+        self.assertRedirects(response, reverse('core:home'))
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+
+    def test_failed_queuing_is_retried(self):
+        """Test if the email is queued by the next request when queuing it failed."""
+        with mock.patch('account.views.queue_reset_email', side_effect=OSError('database down')), \
+                self.assertRaises(OSError), self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {'email': 'testuser@email.com'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {'email': 'testuser@email.com'})
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+
     def test_post_request_with_invalid_email_shows_error(self):
         """Test if submitting an invalid email shows an error message."""
         data = {'email': 'invalid@example.com'}
@@ -218,7 +249,7 @@ class ProfileUserViewTests(TestCase):
 
     def test_profile_cache(self):
         """Test if the profile is cached correctly."""
-        cache_key = f'profile_user_info_{self.user.id}'
+        cache_key = core_cache.PROFILE_USER_INFO.key(user_id=self.user.id)
         cache.set(cache_key, self.profile, timeout=43200)
         cached_profile = cache.get(cache_key)
         self.assertEqual(cached_profile, self.profile)
@@ -244,12 +275,13 @@ class ProfileUserViewTests(TestCase):
 
     def test_cache_clear_on_update(self):
         """Test if cache is cleared after profile update."""
-        cache.set(f'profile_user_info_{self.user.id}', self.profile)
-        cache.set(f'custom_user_info_{self.user.id}', self.user)
+        cache.set(core_cache.PROFILE_USER_INFO.key(user_id=self.user.id), self.profile)
+        cache.set(core_cache.CUSTOM_USER_INFO.key(user_id=self.user.id), self.user)
         data = {'full_name': 'Updated Name', 'bio': 'New Bio'}
         self.client.post(self.url, data)
-        self.assertIsNone(cache.get(f'profile_user_info_{self.user.id}'))
-        self.assertIsNone(cache.get(f'custom_user_info_{self.user.id}'))
+        # The user's namespace is bumped, so the keys of the old version are no longer read
+        self.assertIsNone(cache.get(core_cache.PROFILE_USER_INFO.key(user_id=self.user.id)))
+        self.assertIsNone(cache.get(core_cache.CUSTOM_USER_INFO.key(user_id=self.user.id)))
 
 
 class CommentManagementViewTest(TestCase):
@@ -288,7 +320,7 @@ class CommentManagementViewTest(TestCase):
     def test_approve_comment_by_admin(self):
         """Test if an admin can approve a comment."""
         self.client.login(username='admin', password='adminpass')
-        cache_key = f"approved_comments_{self.post.id}"
+        cache_key = core_cache.POST_APPROVED_COMMENTS.key(post_id=self.post.id)
         cache.set(cache_key, 'test_value')
 
         response = self.client.post(self.url, {'action': 'approve'})
@@ -306,7 +338,7 @@ class CommentManagementViewTest(TestCase):
         """Test if an admin can delete a comment."""
         self.client.force_login(self.admin_user)
 
-        cache_key = f"approved_comments_{self.post.id}"
+        cache_key = core_cache.POST_APPROVED_COMMENTS.key(post_id=self.post.id)
         cache.set(cache_key, 'test_value')
 
         response = self.client.post(reverse('account:comment-management', args=[self.comment.id]), {'action': 'delete'})
@@ -323,7 +355,7 @@ class CommentManagementViewTest(TestCase):
         """Test if an admin can approve a reply."""
         self.client.force_login(self.admin_user)
 
-        cache_key = f"approved_comments_{self.post.id}"
+        cache_key = core_cache.POST_APPROVED_COMMENTS.key(post_id=self.post.id)
         cache.set(cache_key, 'test_value')
 
         response = self.client.post(reverse('account:comment-management', args=[self.reply.id]), {'action': 'approve_reply'})
@@ -340,7 +372,7 @@ class CommentManagementViewTest(TestCase):
         """Test if an admin can delete a reply."""
         self.client.force_login(self.admin_user)
 
-        cache_key = f"approved_comments_{self.post.id}"
+        cache_key = core_cache.POST_APPROVED_COMMENTS.key(post_id=self.post.id)
         cache.set(cache_key, 'test_value')
 
         response = self.client.post(reverse('account:comment-management', args=[self.reply.id]), {'action': 'delete_reply'}, follow=True)
@@ -1,19 +1,22 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
+from django.conf import settings
+from django.http import Http404
 from . forms import SignUpForm, ForgetPasswordForm, ResetPasswordForm
 from django.contrib import messages
 from django.contrib.auth.forms import AuthenticationForm
-from .decorators import redirect_if_authenticated
+from django.contrib.auth import authenticate, login, logout
+from .decorators import redirect_if_authenticated, staff_required
 from django.utils.decorators import method_decorator
 from . models import CustomUser, ProfileUser
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes
 from django.contrib.sites.shortcuts import get_current_site
-from .tasks import send_reset_email
+from .emails import queue_reset_email
 from .forms import UserProfileForm, CustomUserForm
 from core.models import Comment
-from django.core.cache import cache
+from core import cache as core_cache, dispatch, notifications
 
 
 @method_decorator(redirect_if_authenticated, name='dispatch')
@@ -123,9 +126,11 @@ class ForgetPasswordView(View):
                 # Generate password reset link
                 domain = get_current_site(request).domain
                 reset_link = f'http://{domain}/account/reset-password/{uid}/{token}'
-                print(reset_link)
-                # Send reset email asynchronously
-                send_reset_email.delay('Password Reset Request from FREEWORDS', email, reset_link, user.username)
+                # Queue the reset email, sent by a Celery worker with the other queued emails.
+                # A user gets one email per window, however many times the form is sent.
+                dispatch.run_once(f'password_reset_{user.id}', settings.PASSWORD_RESET_EMAIL_WINDOW,
+                                  lambda: queue_reset_email('Password Reset Request from FREEWORDS', email,
+                                                            reset_link, user.username))
 
                 messages.info(request, 'Please check your email. we send you a link to resting your password!')
                 return redirect('core:home')
@@ -189,37 +194,29 @@ class ProfileUserView(View):
 
     def get(self, request, user_id):
         """Handles GET request to display the user's profile."""
-        custom_user_cache_key = f'custom_user_info_{user_id}'
-        custom_user = cache.get(custom_user_cache_key)
-
-        if not custom_user:
-            custom_user = get_object_or_404(CustomUser, id=user_id)
-            cache.set(custom_user_cache_key, custom_user, timeout=43200)
-
-        profile_user_cache_key = f'profile_user_info_{user_id}'
-        profile_user = cache.get(profile_user_cache_key)
-
-        if not profile_user:
-            profile_user, created = ProfileUser.objects.get_or_create(user=custom_user)
-            cache.set(profile_user_cache_key, profile_user, timeout=43200)
+        custom_user = core_cache.cached(
+            core_cache.CUSTOM_USER_INFO, lambda: get_object_or_404(CustomUser, id=user_id), user_id=user_id
+        )
+        # The authentication backend caches None for a user that does not exist
+        if custom_user is None:
+            raise Http404('No user found matching the query')
+
+        profile_user = core_cache.cached(
+            core_cache.PROFILE_USER_INFO, lambda: ProfileUser.objects.get_or_create(user=custom_user)[0],
+            user_id=user_id,
+        )
 
         user_form = CustomUserForm(instance=custom_user)
         profile_form = UserProfileForm(instance=profile_user)
 
         # Cache approved comments and replies
-        comment_cache_key = 'approved_comments_in_admin_profile'
-        comments = cache.get(comment_cache_key)
-
-        if not comments:
-            comments = list(Comment.objects.filter(is_approved=False, is_reply=False))
-            cache.set(comment_cache_key, comments, timeout=43200)
+        comments = core_cache.cached(core_cache.PENDING_COMMENTS, lambda: list(
+            Comment.objects.filter(is_approved=False, is_reply=False)
+        ))
 
-        reply_cache_key = 'approved_reply_in_admin_profile'
-        replies = cache.get(reply_cache_key)
-
-        if not replies:
-            replies = list(Comment.objects.filter(is_reply=True, is_approved=False))
-            cache.set(reply_cache_key, replies, timeout=43200)
+        replies = core_cache.cached(core_cache.PENDING_REPLIES, lambda: list(
+            Comment.objects.filter(is_reply=True, is_approved=False)
+        ))
 
         return render(request, self.template_name, {
             'profile': profile_user,
@@ -240,20 +237,14 @@ class ProfileUserView(View):
         if 'photo' in request.FILES:
             if profile_form.is_valid():
                 profile_user.profile_picture = request.FILES['photo']
-                profile_user.save()
-
-                cache.delete(f'profile_user_info_{user_id}')
-                cache.delete(f'custom_user_info_{user_id}')
+                profile_user.save()  # The cached user and profile are invalidated by the signal receivers
 
                 messages.success(request, 'Your profile picture has been updated!')
                 return redirect('account:profile-user', user_id=user_id)
 
         if user_form.is_valid() and profile_form.is_valid():
             user_form.save()
-            profile_form.save()
-
-            cache.delete(f'profile_user_info_{user_id}')
-            cache.delete(f'custom_user_info_{user_id}')
+            profile_form.save()  # The cached user and profile are invalidated by the signal receivers
 
             messages.success(request, 'Your profile has been updated successfully!')
             return redirect('account:profile-user', user_id=user_id)
@@ -264,45 +255,46 @@ class ProfileUserView(View):
         })
 
 
+@method_decorator(staff_required, name='dispatch')
 class CommentManagementView(View):
     """
     View for managing comments and replies.
     Allows admin users to approve or delete comments and replies.
     """
     def post(self, request, comment_id):
-        # Check if the user is an admin
-        if request.user.is_staff:
-            action = request.POST.get('action')
-            comment = get_object_or_404(Comment, id=comment_id)
-
-            if action == 'approve':
-                # Approving a comment
-                comment.is_approved = True
-                comment.save()
-                cache.delete(f"approved_comments_{comment.post.id}")
-                messages.success(request, 'Comment approved successfully.')
-
-            elif action == 'delete':
-                # Deleting a comment
-                cache.delete(f"approved_comments_{comment.post.id}")
-                comment.delete()
-                messages.success(request, 'Comment deleted successfully.')
-
-            elif action == 'approve_reply':
-                # Approving a reply
-                comment.is_approved = True
-                comment.save()
-                cache.delete(f"approved_comments_{comment.post.id}")
-                messages.success(request, 'Reply approved successfully.')
-
-            elif action == 'delete_reply':
-                # Deleting a reply
-                cache.delete(f"approved_comments_{comment.post.id}")
-                comment.delete()
-                messages.success(request, 'Reply deleted successfully.')
-
-            return redirect('account:profile-user', user_id=request.user.id)
-
-        # If the user is not an admin, show an error message
-        messages.error(request, 'Sorry! you are not Admin')
-        return redirect('core:home')
+        action = request.POST.get('action')
+        comment = get_object_or_404(Comment, id=comment_id)
+
+        if action == 'approve':
+            # Approving a comment
+            was_approved, comment.is_approved = comment.is_approved, True
+            comment.save()
+            core_cache.invalidate(core_cache.POST_APPROVED_COMMENTS, post_id=comment.post_id)
+            if not was_approved:
+                notifications.notify_approval(comment, request.user)
+            messages.success(request, 'Comment approved successfully.')
+
+        elif action == 'delete':
+            # Deleting a comment
+            core_cache.invalidate(core_cache.POST_APPROVED_COMMENTS, post_id=comment.post_id)
+            comment.delete()
+            messages.success(request, 'Comment deleted successfully.')
+
+        elif action == 'approve_reply':
+            # Approving a reply
+            was_approved, comment.is_approved = comment.is_approved, True
+            comment.save()
+            core_cache.invalidate(core_cache.POST_APPROVED_COMMENTS, post_id=comment.post_id)
+            if not was_approved:
+                notifications.notify_approval(comment, request.user)
+                # A reply reaches its thread only once approved, like it reaches the page
+                notifications.notify_reply(comment)
+            messages.success(request, 'Reply approved successfully.')
+
+        elif action == 'delete_reply':
+            # Deleting a reply
+            core_cache.invalidate(core_cache.POST_APPROVED_COMMENTS, post_id=comment.post_id)
+            comment.delete()
+            messages.success(request, 'Reply deleted successfully.')
+
+        return redirect('account:profile-user', user_id=request.user.id)
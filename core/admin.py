@@ -1,12 +1,23 @@
 from django.contrib import admin
-from .models import BlogPost, Comment, Tag, PostLike
+from django.http import FileResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .admin_tools import AutocompleteFilter, ChangelistPerformanceMixin
+from .models import BlogPost, Comment, Tag, PostLike, ProfileCapture, OutboxEmail
+from .profiling import make_token, PROFILE_PARAM
 from image_cropping.admin import ImageCroppingMixin
 
 
+class PostFilter(AutocompleteFilter):
+    """Filter by post, searched by title."""
+    title = 'post'
+    field_name = 'post'
+
 
 # Registering the BlogPost model with the admin panel
 @admin.register(BlogPost)
-class BlogPostAdmin(ImageCroppingMixin, admin.ModelAdmin):
+class BlogPostAdmin(ChangelistPerformanceMixin, ImageCroppingMixin, admin.ModelAdmin):
     """
     Admin configuration for the BlogPost model.
 
@@ -15,6 +26,7 @@ class BlogPostAdmin(ImageCroppingMixin, admin.ModelAdmin):
     - Enabling filtering by creation date
     - Adding search functionality by title and description
     - Automatically generating slugs from the title
+    - Not reading the content of the posts in the list view
     """
 
     # Fields to display in the blog post list in the admin panel
@@ -29,23 +41,40 @@ class BlogPostAdmin(ImageCroppingMixin, admin.ModelAdmin):
     # Automatically generate the slug based on the title_heading field
     prepopulated_fields = {'slug': ('title_heading',)}
 
+    # The content of the posts is not shown in the list view
+    changelist_defer = ('description',)
+
 
 # Registering the Comment model with the admin panel
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ChangelistPerformanceMixin, admin.ModelAdmin):
     """
     Admin configuration for the Comment model.
 
     This class customizes the admin panel for managing comments, including:
     - Displaying post title, user, and creation date in the list view
     - Enabling search functionality by post title, username, and comment content
+    - Filtering by post and approval
+    - Choosing the post, user and replied comment with autocomplete fields
     """
 
     # Fields to display in the comment list in the admin panel
     list_display = ('post', 'user', 'created_at')
 
+    # The post and user of every comment are read with the comments, in a single query
+    list_select_related = ('post', 'user')
+
+    # Neither the comments nor their posts are shown with their content in the list view
+    changelist_defer = ('content', 'post__description')
+
+    # Filters available in the admin panel (filtering by post and approval)
+    list_filter = (PostFilter, 'is_approved')
+
     # Fields that can be searched in the admin panel (searching by post title, username, and content)
-    search_fields = ('post__title', 'user__username', 'content')
+    search_fields = ('post__title_heading', 'user__username', 'content')
+
+    # Searched instead of listing every post, user and comment in the form
+    autocomplete_fields = ('post', 'user', 'reply')
 
 
 # Registering the Tag model with the admin panel
@@ -56,30 +85,129 @@ class TagAdmin(admin.ModelAdmin):
 
     This class customizes the admin panel for managing tags, including:
     - Displaying tag name and creation date in the list view
-    - Enabling filtering by tag name
+    - Enabling search functionality by tag name
     """
 
     # Fields to display in the tag list in the admin panel
     list_display = ['name', 'created_at']
 
-    # Filters available in the admin panel (filtering by tag name)
-    list_filter = ['name']
+    # Fields that can be searched in the admin panel (searching by tag name), a filter would list every tag
+    search_fields = ['name']
 
 
 # Registering the PostLike model with the admin panel
 @admin.register(PostLike)
-class PostLikeAdmin(admin.ModelAdmin):
+class PostLikeAdmin(ChangelistPerformanceMixin, admin.ModelAdmin):
     """
     Admin configuration for the PostLike model.
 
     This class customizes the admin panel for managing post likes, including:
     - Displaying user and post information in the list view
-    - Enabling filtering by post
+    - Enabling filtering by post, chosen with an autocomplete field
     """
 
     # Fields to display in the post like list in the admin panel
     list_display = ['user', 'post']
 
+    # The user and post of every like are read with the likes, in a single query
+    list_select_related = ['user', 'post']
+
+    # The content of the posts is not shown in the list view
+    changelist_defer = ['post__description']
+
     # Filters available in the admin panel (filtering by post)
-    list_filter = ['post']
+    list_filter = [PostFilter]
+
+    # Searched instead of listing every user and post in the form
+    autocomplete_fields = ['user', 'post']
+
+
+# Registering the ProfileCapture model with the admin panel
+@admin.register(ProfileCapture)
+class ProfileCaptureAdmin(ChangelistPerformanceMixin, admin.ModelAdmin):
+    """
+    Admin configuration for the ProfileCapture model.
+
+    This class customizes the admin panel for browsing request profiles, including:
+    - Listing recent captures by URL name and duration
+    - Filtering by URL name and profiler
+    - Downloading the profiler output
+    - Showing the profiling token of the current staff user
+    """
+
+    # Fields to display in the capture list in the admin panel
+    list_display = ('url_name', 'method', 'path', 'duration_ms', 'status_code', 'profiler', 'user', 'created_at',
+                    'download')
+
+    # The user of every capture is read with the captures, in a single query
+    list_select_related = ('user',)
+
+    # The summary of the profiles is not shown in the list view
+    changelist_defer = ('summary',)
+
+    # Filters available in the admin panel (filtering by URL name and profiler)
+    list_filter = ('url_name', 'profiler')
+
+    # Fields that can be searched in the admin panel (searching by path)
+    search_fields = ('path',)
+
+    # Captures are created by the profiling middleware only
+    readonly_fields = [field.name for field in ProfileCapture._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        """Adds a view downloading the profiler output, which is not publicly served."""
+        urls = [
+            path('<int:capture_id>/download/', self.admin_site.admin_view(self.download_view),
+                 name='core_profilecapture_download'),
+        ]
+        return urls + super().get_urls()
+
+    def download_view(self, request, capture_id):
+        capture = get_object_or_404(ProfileCapture, id=capture_id)
+        return FileResponse(capture.output.open('rb'), as_attachment=True,
+                            filename=capture.output.name.rsplit('/', 1)[-1])
+
+    @admin.display(description='Output')
+    def download(self, obj):
+        return format_html('<a href="{}">download</a>', reverse('admin:core_profilecapture_download', args=[obj.id]))
+
+    def changelist_view(self, request, extra_context=None):
+        """Shows how to profile a page with the token of the current staff user."""
+        if request.method == 'GET':
+            self.message_user(request, f'To profile a page, add ?{PROFILE_PARAM}={make_token(request.user)} '
+                                       f'to its URL (valid for one hour).')
+        return super().changelist_view(request, extra_context)
+
+
+# Registering the OutboxEmail model with the admin panel
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(ChangelistPerformanceMixin, admin.ModelAdmin):
+    """
+    Admin configuration for the OutboxEmail model.
+
+    This class customizes the admin panel for following the outbound emails, including:
+    - Listing the emails by recipient, status and number of attempts
+    - Filtering by status
+    - Searching by recipient and subject
+    """
+
+    # Fields to display in the email list in the admin panel
+    list_display = ('subject', 'to', 'status', 'attempts', 'send_after', 'sent_at')
+
+    # Filters available in the admin panel (filtering by status)
+    list_filter = ('status',)
+
+    # The bodies and errors are not shown in the list view
+    changelist_defer = ('body', 'html_body', 'last_error')
+
+    # Fields that can be searched in the admin panel (searching by recipient and subject)
+    search_fields = ('to', 'subject')
+
+    # Emails are queued by 'core.outbox.enqueue' only
+    readonly_fields = [field.name for field in OutboxEmail._meta.fields]
 
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,132 @@
+"""
+Building blocks keeping the admin changelists fast on large tables.
+
+- 'EstimatedCountPaginator' reads the number of rows of a table from the statistics
+  of PostgreSQL instead of counting them, when the changelist is not filtered and the
+  table is large: a COUNT(*) reads the whole table.
+- 'AutocompleteFilter' filters a changelist by a foreign key with the autocomplete
+  widget of the admin, instead of listing every related object in the sidebar as the
+  default filter of a foreign key does.
+- 'ChangelistPerformanceMixin' uses the paginator, does not count the rows of the
+  whole table a second time ('show_full_result_count'), and defers the large columns
+  the changelist does not show ('changelist_defer').
+"""
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimated_count(model, using='default'):
+    """
+    Returns the number of rows of the table of a model according to the statistics of
+    the database, or None when the database keeps none (any but PostgreSQL, a table
+    never analyzed).
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        row = cursor.fetchone()
+    # -1 when the table was never analyzed
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator counting the rows of an unfiltered queryset from the statistics of the
+    database once the table holds more than 'ADMIN_ESTIMATED_COUNT_THRESHOLD' rows.
+    The last pages may then be empty, or missing, until the statistics are updated.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where and not query.distinct:
+            estimate = estimated_count(self.object_list.model, self.object_list.db)
+            if estimate is not None and estimate > getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 100000):
+                return estimate
+        return super().count
+
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    """
+    Filter of a changelist by a foreign key, chosen with the autocomplete widget of the
+    admin. Only the object selected is read, the others are searched for as the user
+    types, so the admin of the related model needs 'search_fields'.
+
+    Subclasses set 'field_name', the name of the foreign key, and 'title'. The
+    ModelAdmin adds the 'media' of the filter (see 'ChangelistPerformanceMixin').
+    """
+    template = 'admin/autocomplete_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        self.parameter_name = f'{self.field_name}__id__exact'
+        super().__init__(request, params, model, model_admin)
+        self.widget = self.build_widget(model, model_admin.admin_site)
+
+    @classmethod
+    def build_widget(cls, model, admin_site):
+        field = model._meta.get_field(cls.field_name)
+        widget = AutocompleteSelect(field, admin_site)
+        # Lazy: the widget reads the object selected only
+        widget.choices = field.formfield().choices
+        return widget
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.parameter_name: self.value()})
+        return queryset
+
+    def choices(self, changelist):
+        # The query string without this filter, the value chosen is added by the widget
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'display': 'All',
+        }
+
+    def rendered_widget(self):
+        return self.widget.render(self.parameter_name, self.value(), attrs={
+            'id': f'autocomplete-filter-{self.field_name}', 'class': 'admin-autocomplete-filter',
+        })
+
+
+class ChangelistPerformanceMixin:
+    """
+    Mixin of a ModelAdmin over a table growing large: estimates its number of rows,
+    never counts it twice, defers the columns listed in 'changelist_defer' on the
+    changelist, and loads the media of its autocomplete filters.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    # Columns not read by the changelist, e.g. 'description' or 'post__description'
+    changelist_defer = ()
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        opts = self.model._meta
+        if self.changelist_defer and match and match.url_name == f'{opts.app_label}_{opts.model_name}_changelist':
+            queryset = queryset.defer(*self.changelist_defer)
+        return queryset
+
+    @property
+    def media(self):
+        media = super().media
+        for list_filter in self.list_filter:
+            if isinstance(list_filter, type) and issubclass(list_filter, AutocompleteFilter):
+                media += list_filter.build_widget(self.model, self.admin_site).media
+        return media
@@ -0,0 +1,285 @@
+"""
+Read-only JSON API, version 1, used by the mobile client instead of the HTML pages.
+
+- GET /api/v1/posts/                 The posts, newest first. '?limit=' posts per page
+                                     (API_PAGE_SIZE, at most API_MAX_PAGE_SIZE), '?cursor='
+                                     the 'next' of the previous page, '?tag=' a tag name.
+- GET /api/v1/posts/<id>/            A post, with its content.
+- GET /api/v1/posts/<id>/comments/   The approved comments of a post, as a tree of replies.
+- GET /api/v1/tags/                  The tags, with their number of posts.
+
+'?fields=' selects the fields of the objects returned, e.g. '?fields=id,title,url'.
+Only the columns of the fields asked for are selected.
+
+The responses are cached per version of the data they show (see 'core.cache'): a post
+and its comments per version of the post, the pages of posts per version of all the
+posts. They are serialized with orjson when it is installed, carry an ETag (a client
+sending it back gets a 304), and are gzipped for the clients accepting it.
+"""
+
+import base64
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.dateparse import parse_datetime
+from django.views import View
+from django.views.decorators.gzip import gzip_page
+from django.db.models import Q
+
+from . import cache as core_cache, queries
+from .models import BlogPost, Comment
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the json module is used without it
+    orjson = None
+
+
+def dumps(data):
+    """Serializes the data of a response to JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+
+
+class APIError(Exception):
+    """A request the API cannot answer, returned as {'error': message} with its status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _absolute(path):
+    return settings.SITE_URL.rstrip('/') + path
+
+
+def _post_url(row):
+    # A post without a slug has no page
+    return _absolute(reverse('core:post-detail', args=(row['id'], row['slug']))) if row['slug'] else None
+
+
+def _cover_url(row):
+    return BlogPost._meta.get_field('cover_image').storage.url(row['cover_image']) if row['cover_image'] else None
+
+
+# Fields of a post: the columns they are read from, and their value from a row of these columns
+POST_FIELDS = {
+    'id': (['id'], lambda row: row['id']),
+    'title': (['title_heading'], lambda row: row['title_heading']),
+    'slug': (['slug'], lambda row: row['slug']),
+    'summary': (['title_description'], lambda row: row['title_description']),
+    'url': (['id', 'slug'], _post_url),
+    'cover_image': (['cover_image'], _cover_url),
+    'created_at': (['created_at'], lambda row: row['created_at'].isoformat()),
+    'tags': ([], lambda row: row['tags']),
+    'content': (['description'], lambda row: row['description']),
+}
+
+# The content is only returned by the detail of a post, unless asked for
+POST_LIST_FIELDS = [field for field in POST_FIELDS if field != 'content']
+
+COMMENT_FIELDS = ['id', 'author', 'content', 'created_at', 'replies']
+
+TAG_FIELDS = ['id', 'name', 'post_count']
+
+
+def post_rows(queryset, fields, columns=('id',)):
+    """
+    Returns the rows of the posts of a queryset, with the columns of the given fields
+    only, and the given 'columns'. The tags are read in one more query when asked for.
+    """
+    columns = set(columns) | {'id'}
+    for field in fields:
+        columns.update(POST_FIELDS[field][0])
+    rows = list(queryset.values(*columns))
+    if 'tags' in fields:
+        tags = {row['id']: [] for row in rows}
+        for post_id, name in (BlogPost.tags.through.objects.filter(blogpost_id__in=tags)
+                              .order_by('tag__name').values_list('blogpost_id', 'tag__name')):
+            tags[post_id].append(name)
+        for row in rows:
+            row['tags'] = tags[row['id']]
+    return rows
+
+
+def serialize_post(row, fields):
+    """Returns a post as a dict of the given fields."""
+    return {field: POST_FIELDS[field][1](row) for field in fields}
+
+
+def comment_tree(post_id):
+    """
+    Returns the approved comments of a post as a tree: the comments, oldest first, each
+    with its approved replies. A reply to a comment not approved is left out.
+    """
+    comments = {}
+    roots = []
+    for row in (Comment.objects.filter(post=post_id, is_approved=True).order_by('created_at', 'id')
+                .values('id', 'reply_id', 'content', 'created_at', 'user__username')):
+        comments[row['id']] = comment = {
+            'id': row['id'], 'author': row['user__username'], 'content': row['content'],
+            'created_at': row['created_at'].isoformat(), 'replies': [], 'reply_id': row['reply_id'],
+        }
+        if row['reply_id'] is None:
+            roots.append(comment)
+    for comment in comments.values():
+        parent = comments.get(comment.pop('reply_id'))
+        if parent is not None:
+            parent['replies'].append(comment)
+    return roots
+
+
+def select(items, fields, nested=None):
+    """Keeps the given fields of dicts already serialized, in the dicts nested under 'nested' as well."""
+    return [
+        {field: select(item[field], fields, nested) if field == nested else item[field] for field in fields}
+        for item in items
+    ]
+
+
+def _encode_cursor(row):
+    value = f"{row['created_at'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """Returns the (created_at, id) of the last post of the previous page."""
+    try:
+        created_at, post_id = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split('|')
+        created_at = parse_datetime(created_at)
+        if created_at is None:
+            raise ValueError(cursor)
+        return created_at, int(post_id)
+    except (ValueError, UnicodeDecodeError):
+        raise APIError('Invalid cursor')
+
+
+@method_decorator(gzip_page, name='dispatch')
+class APIView(View):
+    """
+    Base view of the API: parses '?fields=', serializes the data returned by 'get_data'
+    with its ETag, and returns the errors as JSON.
+    """
+    http_method_names = ['get', 'head', 'options']
+    fields = []
+    default_fields = None
+
+    def get_fields(self):
+        """The fields asked for with '?fields=', in the order of 'fields', or the default ones."""
+        value = self.request.GET.get('fields')
+        if not value:
+            return list(self.default_fields or self.fields)
+        asked = {field.strip() for field in value.split(',') if field.strip()}
+        unknown = asked.difference(self.fields)
+        if unknown:
+            raise APIError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        return [field for field in self.fields if field in asked]
+
+    def get_data(self, **kwargs):
+        raise NotImplementedError
+
+    def get(self, request, **kwargs):
+        try:
+            data = self.get_data(**kwargs)
+        except APIError as error:
+            return self.error(str(error), error.status)
+        except Http404:
+            return self.error('Not found', 404)
+
+        body = dumps(data)
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        response = get_conditional_response(request, etag=etag) or HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'API_MAX_AGE', 60))
+        return response
+
+    def error(self, message, status):
+        return HttpResponse(dumps({'error': message}), content_type='application/json', status=status)
+
+
+class PostListView(APIView):
+    """The posts, newest first, by pages following a cursor, optionally of a tag."""
+    fields = list(POST_FIELDS)
+    default_fields = POST_LIST_FIELDS
+
+    def get_data(self):
+        fields = self.get_fields()
+        try:
+            limit = int(self.request.GET.get('limit') or getattr(settings, 'API_PAGE_SIZE', 20))
+        except ValueError:
+            raise APIError('Invalid limit')
+        limit = max(1, min(limit, getattr(settings, 'API_MAX_PAGE_SIZE', 50)))
+        cursor = self.request.GET.get('cursor')
+        after = _decode_cursor(cursor) if cursor else None
+        tag = self.request.GET.get('tag')
+
+        query = hashlib.sha1(dumps([fields, limit, cursor, tag])).hexdigest()
+        return core_cache.cached(core_cache.API_POSTS, lambda: self.page(fields, limit, after, tag), query=query)
+
+    def page(self, fields, limit, after, tag):
+        queryset = BlogPost.objects.order_by('-created_at', '-id')
+        if tag:
+            queryset = queryset.filter(tags__name=tag)
+        if after is not None:
+            created_at, post_id = after
+            # The posts after the last one of the previous page, even when several share its date
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=post_id))
+
+        # The cursor needs the date and id of the last post, one more post tells there is a next page
+        rows = post_rows(queryset[:limit + 1], fields, columns=('id', 'created_at'))
+        return {
+            'results': [serialize_post(row, fields) for row in rows[:limit]],
+            'next': _encode_cursor(rows[limit - 1]) if len(rows) > limit else None,
+        }
+
+
+class PostDetailView(APIView):
+    """A post, with its content."""
+    fields = list(POST_FIELDS)
+
+    def get_data(self, pk):
+        fields = self.get_fields()
+
+        def compute():
+            rows = post_rows(BlogPost.objects.filter(id=pk), fields)
+            return serialize_post(rows[0], fields) if rows else None
+
+        post = core_cache.cached(core_cache.API_POST, compute, post_id=pk, fields='.'.join(fields))
+        if post is None:
+            raise Http404
+        return post
+
+
+class CommentTreeView(APIView):
+    """The approved comments of a post, each with its approved replies."""
+    fields = COMMENT_FIELDS
+
+    def get_data(self, pk):
+        fields = self.get_fields()
+
+        def compute():
+            return comment_tree(pk) if BlogPost.objects.filter(id=pk).exists() else None
+
+        comments = core_cache.cached(core_cache.API_POST_COMMENTS, compute, post_id=pk)
+        if comments is None:
+            raise Http404
+        return {'results': select(comments, fields, nested='replies')}
+
+
+class TagListView(APIView):
+    """The tags, by number of posts, read from the cached tag cloud."""
+    fields = TAG_FIELDS
+
+    def get_data(self):
+        fields = self.get_fields()
+        tags = core_cache.cached(core_cache.TOP_TAGS_POSTS, lambda: list(queries.top_tags()))
+        return {'results': select(
+            [{'id': tag.id, 'name': tag.name, 'post_count': tag.post_count} for tag in tags], fields,
+        )}
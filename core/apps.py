@@ -1,4 +1,6 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class CoreConfig(AppConfig):
@@ -17,6 +19,13 @@ class CoreConfig(AppConfig):
         Import signal handlers when the application is ready.
 
         This ensures that all defined signals in 'core.signals' are connected
-        properly and will be triggered when necessary.
+        properly and will be triggered when necessary, including the cache
+        warming run after the migrations.
         """
         import core.signals  # Importing signals to register them properly
+        from core import timing
+
+        # Warm the cache after the migrations of every deploy
+        post_migrate.connect(core.signals.warm_cache_after_migrate, sender=self)
+        # Time the queries of sampled requests on every connection, in any thread
+        connection_created.connect(timing.install_db_timer)
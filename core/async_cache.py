@@ -0,0 +1,135 @@
+import asyncio
+import time
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+
+from . import local_cache, routers
+from .cache import MISSING, metrics, namespace_versions, payload_size
+from .timing import span
+
+try:
+    import redis.asyncio as aioredis
+    from django_redis.cache import RedisCache
+except ImportError:  # Without django_redis, the async methods of the Django cache are used
+    aioredis = RedisCache = None
+
+# One async Redis client per event loop, as the connections of a pool are bound to their loop
+_clients = weakref.WeakKeyDictionary()
+
+
+def _redis_client():
+    """
+    Returns the redis.asyncio client of the running event loop, or None when the
+    default cache is not a django_redis cache.
+    """
+    # 'cache' is a proxy, so the backend itself is checked
+    if RedisCache is None or not isinstance(caches['default'], RedisCache):
+        return None
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        location = settings.CACHES['default']['LOCATION']
+        if isinstance(location, (list, tuple)):
+            location = location[0]  # The first server is the primary in django_redis
+        options = settings.CACHES['default'].get('OPTIONS', {})
+        pool_kwargs = options.get('CONNECTION_POOL_KWARGS', {})
+        # A coroutine waits for a free connection, like the threads of the sync pool,
+        # rather than failing when the concurrent requests of the loop exceed the pool.
+        # 'health_check_interval' is not forwarded: the PING it sends before a command
+        # after an idle period fails on fakeredis, and a broken connection is
+        # reconnected on its next command anyway.
+        pool = aioredis.BlockingConnectionPool.from_url(
+            location,
+            socket_timeout=options.get('SOCKET_TIMEOUT'),
+            socket_connect_timeout=options.get('SOCKET_CONNECT_TIMEOUT'),
+            max_connections=options.get('ASYNC_MAX_CONNECTIONS', pool_kwargs.get('max_connections', 50)),
+            timeout=pool_kwargs.get('timeout', 20),
+            # e.g. the fakeredis connection of the load-test settings
+            **({'connection_class': options['ASYNC_CONNECTION_CLASS']} if 'ASYNC_CONNECTION_CLASS' in options else {}),
+        )
+        client = aioredis.Redis(connection_pool=pool)
+        _clients[loop] = client
+    return client
+
+
+async def aget(key):
+    """Reads a key written by the django_redis client; returns MISSING when it is absent."""
+    client = _redis_client()
+    with span('cache'):
+        if client is None:
+            return await cache.aget(key, MISSING)
+        value = await client.get(cache.make_and_validate_key(key))
+    # django_redis stores integers as plain strings and other values pickled (and maybe compressed)
+    return MISSING if value is None else cache.client.decode(value)
+
+
+async def aset(key, value, timeout):
+    """Writes a key in the format of the django_redis client, so sync views can read it."""
+    client = _redis_client()
+    with span('cache'):
+        if client is None:
+            return await cache.aset(key, value, timeout=timeout)
+        await client.set(cache.make_and_validate_key(key), cache.client.encode(value), ex=timeout)
+
+
+async def anamespace_versions(namespace_keys, local_keys=()):
+    """Async version of 'core.cache.namespace_versions'; the counters are read concurrently."""
+    versions = {}
+    local = local_cache.is_enabled()
+    if local:
+        for namespace_key in local_keys:
+            version = local_cache.lru.get(namespace_key, MISSING)
+            if version is not MISSING:
+                versions[namespace_key] = version
+
+    remaining = [namespace_key for namespace_key in namespace_keys if namespace_key not in versions]
+    values = await asyncio.gather(*(aget(namespace_key) for namespace_key in remaining))
+    if MISSING in values:
+        # A counter does not exist yet; it is created (atomically) by the sync version
+        versions.update(await sync_to_async(namespace_versions)(remaining, local_keys))
+        return versions
+    versions.update(zip(remaining, values))
+    if local:
+        for namespace_key, version in zip(remaining, values):
+            if namespace_key in local_keys:
+                local_cache.lru.set(namespace_key, version, payload_size(version))
+    return versions
+
+
+async def acached(family, compute, **params):
+    """
+    Async version of 'core.cache.cached': 'compute' is a coroutine function.
+
+    Several lookups can run concurrently with 'asyncio.gather', so the Redis round
+    trips of a page overlap instead of adding up.
+    """
+    versions = await anamespace_versions(family.namespace_keys(**params), family.local_namespace_keys(**params))
+    key = family.key(versions, **params)
+    local = family.local and local_cache.is_enabled()
+    if local:
+        value = local_cache.lru.get(key, MISSING)
+        if value is not MISSING:
+            metrics.record(family.name, hits=1, local_hits=1)
+            return value
+
+    value = await aget(key)
+    if value is not MISSING:
+        metrics.record(family.name, hits=1)
+        if local:
+            local_cache.lru.set(key, value, payload_size(value), family.timeout)
+        return value
+
+    started = time.perf_counter()
+    with routers.primary():  # Also in the threads of 'sync_to_async', which copy the context
+        value = await compute()
+        size = payload_size(value)
+    elapsed = time.perf_counter() - started
+
+    await aset(key, value, family.timeout)
+    if local:
+        local_cache.lru.set(key, value, size, family.timeout)
+    metrics.record(family.name, misses=1, recompute_us=int(elapsed * 1_000_000), payload_bytes=size)
+    return value
@@ -0,0 +1,165 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Q
+from django.http import Http404
+from django.shortcuts import render
+from django.views import View
+
+from . import cache as core_cache, queries
+from .async_cache import acached
+from .forms import CommentForm, ReplyForm
+from .models import BlogPost, PostLike
+from .views import BlogPostDetailView
+
+# Templates may follow relations or load the user of the request (e.g. for 'viewer'), which
+# are synchronous, so they are rendered in the thread used by the ORM instead of in the
+# event loop.
+arender = sync_to_async(render)
+
+
+async def _approved_comments_per_post():
+    return [item async for item in queries.approved_comment_counts()]
+
+
+async def _top_liked_posts():
+    return [post async for post in queries.top_liked_posts()]
+
+
+async def _top_tags_posts():
+    return [tag async for tag in queries.top_tags()]
+
+
+class AsyncHomeView(View):
+    """
+    Async version of 'HomeView' for the ASGI deployment.
+
+    The page of posts and the three cached sidebar values (approved comments count,
+    top liked posts and top tags) are fetched concurrently.
+    """
+    template_name = 'core/home.html'
+    paginate_by = 5
+
+    async def get(self, request):
+        queryset = BlogPost.objects.all()
+
+        paginator = Paginator(range(await queryset.acount()), self.paginate_by)
+        try:
+            page_obj = paginator.page(request.GET.get('page') or 1)
+        except InvalidPage:
+            raise Http404('Invalid page')
+        offset = (page_obj.number - 1) * self.paginate_by
+
+        async def page_posts():
+            return [post async for post in queryset[offset:offset + self.paginate_by]]
+
+        posts, comments, top_liked_posts, top_tags_posts = await asyncio.gather(
+            page_posts(),
+            acached(core_cache.APPROVED_COMMENTS_PER_POST, _approved_comments_per_post),
+            acached(core_cache.TOP_LIKED_POSTS, _top_liked_posts),
+            acached(core_cache.TOP_TAGS_POSTS, _top_tags_posts),
+        )
+
+        comment_dict = {item['id']: item['approved_comments'] for item in comments}
+        for post in posts:
+            post.approved_comments = comment_dict.get(post.id, 0)
+        page_obj.object_list = posts
+
+        return await arender(request, self.template_name, {
+            'obj': posts,
+            'page_obj': page_obj,
+            'paginator': paginator,
+            'is_paginated': page_obj.has_other_pages(),
+            'top_liked_posts': top_liked_posts,
+            'top_tags_posts': top_tags_posts,
+        })
+
+
+class AsyncBlogPostDetailView(View):
+    """
+    Async version of 'BlogPostDetailView' for the ASGI deployment.
+
+    The approved comments, the top liked posts and the like status of the user are
+    fetched concurrently. Comment submissions (POST) are handled by the sync view.
+    """
+    template_name = 'core/post-detail.html'
+
+    async def get(self, request, pk, slug):
+        try:
+            post = await BlogPost.objects.aget(pk=pk)
+        except BlogPost.DoesNotExist:
+            raise Http404('No blog post found matching the query')
+        user = await request.auser()
+
+        async def approved_comments():
+            return [comment async for comment in queries.approved_comments(post.id)]
+
+        async def is_liked():
+            if not user.is_authenticated:
+                return False
+            return await acached(
+                core_cache.USER_LIKED_POST, lambda: PostLike.objects.filter(user=user, post=post.id).aexists(),
+                user_id=user.id, post_id=post.id,
+            )
+
+        comments, top_liked_posts, liked = await asyncio.gather(
+            acached(core_cache.POST_APPROVED_COMMENTS, approved_comments, post_id=post.id),
+            acached(core_cache.TOP_LIKED_POSTS, _top_liked_posts),
+            is_liked(),
+        )
+
+        return await arender(request, self.template_name, {
+            'post': post,
+            'object': post,
+            'comments': comments,
+            'comment_form': CommentForm(),
+            'reply_form': ReplyForm,
+            'top_liked_posts': top_liked_posts,
+            'is_liked': liked,
+        })
+
+    async def post(self, request, pk, slug):
+        return await sync_to_async(BlogPostDetailView.as_view())(request, pk=pk, slug=slug)
+
+
+class AsyncPostsShowView(View):
+    """
+    Async version of 'PostsShowView' for the ASGI deployment.
+
+    The (optionally searched) posts, the approved comments counts and the like counts
+    are fetched concurrently.
+    """
+    template_name = 'core/posts.html'
+
+    async def get(self, request):
+        query = request.GET.get('q', None)
+        queryset = BlogPost.objects.all()
+        if query:
+            queryset = queryset.filter(Q(title_heading__icontains=query) | Q(title_description__icontains=query))
+
+        async def posts():
+            return [post async for post in queryset]
+
+        async def approved_comments():
+            return [item async for item in queries.approved_comment_counts()]
+
+        async def like_counts():
+            return [item async for item in queries.like_counts()]
+
+        posts, comments, likes = await asyncio.gather(
+            posts(),
+            acached(core_cache.APPROVED_COMMENTS_COUNTS, approved_comments),
+            acached(core_cache.POST_LIKE_COUNTS, like_counts),
+        )
+
+        comment_dict = {item['id']: item['approved_comments'] for item in comments}
+        like_dict = {item['id']: item['like_count'] for item in likes}
+        for post in posts:
+            post.approved_comments = comment_dict.get(post.id, 0)
+            post.like_count = like_dict.get(post.id, 0)
+
+        return await arender(request, self.template_name, {
+            'obj': posts,
+            'query': request.GET.get('q', ''),
+        })
@@ -0,0 +1,461 @@
+import pickle
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache, caches
+
+from . import local_cache, routers
+from .timing import span
+
+try:
+    from django_redis.cache import RedisCache
+except ImportError:  # Without django_redis, the counters are flushed one by one
+    RedisCache = None
+
+# Returned by cache.get when a key is absent, so a cached None is not mistaken for a miss
+MISSING = object()
+
+
+class Namespace:
+    """
+    A version counter shared by a group of cache keys, e.g. every key about a post.
+
+    The current version is part of the keys of the families in the namespace, so
+    bumping the counter invalidates all of them at once, without knowing their names
+    (e.g. the like status of every user for a post). The entries of old versions are
+    never read again and expire with their timeout.
+
+    The version of a 'local' namespace is also kept in the per-process cache of
+    'core.local_cache', so the local families of the namespace are served without any
+    round trip to Redis; 'bump' deletes it from every process.
+    """
+
+    def __init__(self, name, template, local=False):
+        self.name = name
+        self.template = template
+        self.local = local
+
+    def key(self, **params):
+        """Builds the key of the version counter for the given parameters."""
+        return self.template.format(**params)
+
+    def __repr__(self):
+        return f'<Namespace {self.name}>'
+
+
+# Aggregates computed over every post (counts per post, top liked posts, tags), the
+# namespace of every local family
+POSTS = Namespace('posts', 'ns:posts:v', local=True)
+
+# Everything about a single post
+POST = Namespace('post', 'ns:post:{post_id}:v')
+
+# Everything about a single user
+USER = Namespace('user', 'ns:user:{user_id}:v')
+
+
+class CacheFamily:
+    """
+    A named family of cache keys sharing the same key template and timeout.
+
+    Every cache access of the application goes through a family, so hits, misses,
+    recompute time, payload size and invalidations can be recorded per family.
+    Values of 'local' families are also kept in the per-process LRU cache of
+    'core.local_cache', in front of Redis. The versions of the 'namespaces' of the
+    family are appended to its keys (see 'Namespace').
+    """
+
+    def __init__(self, name, template, timeout, local=False, namespaces=()):
+        self.name = name
+        self.template = template
+        self.timeout = timeout
+        self.local = local
+        self.namespaces = namespaces
+
+    def namespace_keys(self, **params):
+        """Returns the keys of the version counters of this family for the given parameters."""
+        return [namespace.key(**params) for namespace in self.namespaces]
+
+    def local_namespace_keys(self, **params):
+        """Returns the keys of the version counters of the local namespaces of this family."""
+        return [namespace.key(**params) for namespace in self.namespaces if namespace.local]
+
+    def key(self, versions=None, **params):
+        """
+        Builds the cache key of this family for the given parameters.
+
+        'versions' maps the namespace keys to their versions; they are read from the
+        cache when they are not given.
+        """
+        key = self.template.format(**params)
+        if not self.namespaces:
+            return key
+        namespace_keys = self.namespace_keys(**params)
+        if versions is None:
+            versions = namespace_versions(namespace_keys, self.local_namespace_keys(**params))
+        return f"{key}:v{'.'.join(str(versions[namespace_key]) for namespace_key in namespace_keys)}"
+
+    def __repr__(self):
+        return f'<CacheFamily {self.name}>'
+
+
+# Approved comments count per post, shown on the home page
+APPROVED_COMMENTS_PER_POST = CacheFamily('approved_comments_per_post', 'approved_comments_per_post', 1200,
+                                         local=True, namespaces=(POSTS,))
+
+# Approved comments count per post, shown on the posts page
+APPROVED_COMMENTS_COUNTS = CacheFamily('approved_comments', 'approved_comments', 1200,
+                                       local=True, namespaces=(POSTS,))
+
+# Like count per post, shown on the posts page
+POST_LIKE_COUNTS = CacheFamily('post_like', 'post_like', 1200, local=True, namespaces=(POSTS,))
+
+# The four most liked posts, shown in the sidebar
+TOP_LIKED_POSTS = CacheFamily('top_liked_posts', 'top_liked_posts', 21600, local=True, namespaces=(POSTS,))
+
+# Tags ordered by their number of posts, shown in the tag cloud
+TOP_TAGS_POSTS = CacheFamily('top_tags_posts', 'top_tags_posts', 21600, local=True, namespaces=(POSTS,))
+
+# Approved comments of a single post, shown on the post detail page
+POST_APPROVED_COMMENTS = CacheFamily('approved_comments_post', 'approved_comments_{post_id}', 1200,
+                                     namespaces=(POST,))
+
+# Whether a user has liked a post
+USER_LIKED_POST = CacheFamily('user_liked_post', 'user_like_{user_id}_liked_post_{post_id}', 3600,
+                              namespaces=(POST, USER))
+
+# The signed-in user as shown by the templates (see 'account.backends'): name, flags,
+# bio and profile photo URL. Kept less than the hour for which a signed S3 URL is valid.
+VIEWER = CacheFamily('viewer', 'viewer_{user_id}', 1800, namespaces=(USER,))
+
+# User and profile shown on the profile page; the user also authenticates every request
+CUSTOM_USER_INFO = CacheFamily('custom_user_info', 'custom_user_info_{user_id}', 43200, namespaces=(USER,))
+PROFILE_USER_INFO = CacheFamily('profile_user_info', 'profile_user_info_{user_id}', 43200, namespaces=(USER,))
+
+# Comments and replies waiting for approval, shown on the admin profile page
+PENDING_COMMENTS = CacheFamily('approved_comments_in_admin_profile', 'approved_comments_in_admin_profile', 43200)
+PENDING_REPLIES = CacheFamily('approved_reply_in_admin_profile', 'approved_reply_in_admin_profile', 43200)
+
+# Responses of the JSON API (see 'core.api'): a page of posts per query, a post per
+# selection of fields, and the comment tree of a post. Kept less than the hour for
+# which a signed S3 URL of a cover is valid.
+API_POSTS = CacheFamily('api_posts', 'api_posts_{query}', 1200, namespaces=(POSTS,))
+API_POST = CacheFamily('api_post', 'api_post_{post_id}_{fields}', 1200, namespaces=(POST,))
+API_POST_COMMENTS = CacheFamily('api_post_comments', 'api_post_comments_{post_id}', 1200, namespaces=(POST,))
+
+FAMILIES = [
+    APPROVED_COMMENTS_PER_POST, APPROVED_COMMENTS_COUNTS, POST_LIKE_COUNTS, TOP_LIKED_POSTS, TOP_TAGS_POSTS,
+    POST_APPROVED_COMMENTS, USER_LIKED_POST, VIEWER, CUSTOM_USER_INFO, PROFILE_USER_INFO,
+    PENDING_COMMENTS, PENDING_REPLIES, API_POSTS, API_POST, API_POST_COMMENTS,
+]
+
+
+class CacheMetrics:
+    """
+    Per-family cache counters.
+
+    Counters are accumulated in the process and added to shared counters in the cache
+    at most every 'CACHE_METRICS_FLUSH_INTERVAL' seconds, so every worker contributes
+    to the figures exposed by '/metrics/' and the 'cache_stats' command.
+    """
+    FIELDS = ('hits', 'local_hits', 'misses', 'invalidations', 'recompute_us', 'payload_bytes')
+    KEY_PREFIX = 'cache_metrics'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(Counter)
+        self._last_flush = time.monotonic()
+
+    def metric_key(self, family_name, field):
+        return f'{self.KEY_PREFIX}:{family_name}:{field}'
+
+    def record(self, family_name, **deltas):
+        """Adds the given deltas to the counters of a family and flushes them when due."""
+        with self._lock:
+            self._pending[family_name].update(deltas)
+            due = time.monotonic() - self._last_flush >= getattr(settings, 'CACHE_METRICS_FLUSH_INTERVAL', 10)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Adds the pending counters of this process to the shared counters in the cache."""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(Counter)
+            self._last_flush = time.monotonic()
+
+        increments = {self.metric_key(family_name, field): value
+                      for family_name, counter in pending.items() for field, value in counter.items()}
+        if not increments:
+            return
+        with span('cache'):
+            if RedisCache is not None and isinstance(caches['default'], RedisCache):
+                # A single round trip for every counter: INCRBY creates the missing ones, and
+                # django_redis stores integers unserialized, so they are read back as usual
+                pipeline = cache.client.get_client(write=True).pipeline(transaction=False)
+                for key, value in increments.items():
+                    pipeline.incrby(cache.client.make_key(key), value)
+                pipeline.execute()
+                return
+            for key, value in increments.items():
+                # Create the counter if it does not exist yet, otherwise increment it
+                if not cache.add(key, value, timeout=None):
+                    cache.incr(key, value)
+
+    def snapshot(self):
+        """Returns the shared counters of every family, as {family name: {field: value}}."""
+        self.flush()
+        keys = {self.metric_key(family.name, field): (family.name, field)
+                for family in FAMILIES for field in self.FIELDS}
+        values = cache.get_many(list(keys))
+        stats = {family.name: dict.fromkeys(self.FIELDS, 0) for family in FAMILIES}
+        for key, value in values.items():
+            family_name, field = keys[key]
+            stats[family_name][field] = value
+        return stats
+
+    def reset(self):
+        """Drops every counter, both pending and shared."""
+        with self._lock:
+            self._pending = defaultdict(Counter)
+        cache.delete_many([self.metric_key(family.name, field) for family in FAMILIES for field in self.FIELDS])
+
+
+metrics = CacheMetrics()
+
+
+def payload_size(value):
+    """Returns the size in bytes of a value once pickled, as stored by the cache backend."""
+    try:
+        return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return 0
+
+
+def initial_version():
+    """
+    Version of a new or evicted counter. It is based on the clock rather than 1, so the
+    entries of a counter lost by Redis are not read again when it is recreated.
+    """
+    return int(time.time() * 1000)
+
+
+def namespace_versions(namespace_keys, local_keys=()):
+    """
+    Returns the current version of the given namespace counters, as {key: version}.
+
+    The versions of 'local_keys', the counters of local namespaces, are read from the
+    per-process cache first. The others are read from Redis with one 'get_many', and
+    missing counters are created. A local version read from Redis is kept in the
+    per-process cache until 'bump' deletes it from every process, or until the
+    'CACHE_LOCAL_TIMEOUT' of the local cache.
+    """
+    versions = {}
+    local = local_cache.is_enabled()
+    if local:
+        for namespace_key in local_keys:
+            version = local_cache.lru.get(namespace_key, MISSING)
+            if version is not MISSING:
+                versions[namespace_key] = version
+
+    remaining = [namespace_key for namespace_key in namespace_keys if namespace_key not in versions]
+    if not remaining:
+        return versions
+    with span('cache'):
+        versions.update(cache.get_many(remaining))
+        for namespace_key in remaining:
+            if namespace_key not in versions:
+                version = initial_version()
+                # Another process may create the counter concurrently; its version wins
+                if cache.add(namespace_key, version, timeout=None):
+                    if local and namespace_key in local_keys:
+                        # The counter was lost by Redis: the other processes drop the old version
+                        local_cache.publish(namespace_key)
+                else:
+                    version = cache.get(namespace_key, version)
+                versions[namespace_key] = version
+    if local:
+        for namespace_key in remaining:
+            if namespace_key in local_keys:
+                local_cache.lru.set(namespace_key, versions[namespace_key], payload_size(versions[namespace_key]))
+    return versions
+
+
+def bump(namespace, **params):
+    """
+    Invalidates every key of a namespace by incrementing its version counter, and
+    records an invalidation for each family of the namespace. The version of a local
+    namespace is deleted from the per-process cache of every process.
+    """
+    namespace_key = namespace.key(**params)
+    with span('cache'):
+        if not cache.add(namespace_key, initial_version(), timeout=None):
+            cache.incr(namespace_key)
+        if namespace.local:
+            local_cache.publish(namespace_key)
+    for family in FAMILIES:
+        if namespace in family.namespaces:
+            metrics.record(family.name, invalidations=1)
+
+
+def cached(family, compute, **params):
+    """
+    Returns the cached value of a family key, computing and caching it on a miss.
+
+    A cached None is a hit, so negative results (e.g. a user without a profile) are
+    cached as well. Hits, misses, recompute time and payload size are recorded.
+    Local families are read from the per-process cache first.
+    """
+    key = family.key(**params)
+    local = family.local and local_cache.is_enabled()
+    if local:
+        value = local_cache.lru.get(key, MISSING)
+        if value is not MISSING:
+            metrics.record(family.name, hits=1, local_hits=1)
+            return value
+
+    with span('cache'):
+        value = cache.get(key, MISSING)
+    if value is not MISSING:
+        metrics.record(family.name, hits=1)
+        if local:
+            local_cache.lru.set(key, value, payload_size(value), family.timeout)
+        return value
+
+    started = time.perf_counter()
+    with routers.primary():  # Cached for every client, so never read from a lagging replica
+        value = compute()
+        size = payload_size(value)  # Pickling also evaluates lazy querysets, so it counts as recompute time
+    elapsed = time.perf_counter() - started
+
+    with span('cache'):
+        cache.set(key, value, timeout=family.timeout)
+    if local:
+        local_cache.lru.set(key, value, size, family.timeout)
+    metrics.record(family.name, misses=1, recompute_us=int(elapsed * 1_000_000), payload_bytes=size)
+    return value
+
+
+class CacheBatch:
+    """
+    Request-scoped batch of family keys, read with one 'get_many' and written back with 'set_many'.
+
+    A view declares the values it needs with 'add', then 'fetch' reads the namespace
+    versions of all of them in one round trip and the values in another (one MGET on
+    Redis each), recomputes only the missing ones and writes them back in one pipeline
+    per timeout. Values already fetched are kept on the batch, so the same key is never
+    read twice during a request. Local versions and values found in the per-process
+    cache are not read from Redis at all.
+
+        batch = CacheBatch()
+        batch.add('top_liked_posts', TOP_LIKED_POSTS, compute_top_liked_posts)
+        batch.add('viewer', VIEWER, compute_viewer, user_id=user.id)
+        values = batch.fetch()
+    """
+
+    def __init__(self, refresh=False):
+        self.refresh = refresh  # Recompute every value without reading the cache, e.g. to warm it
+        self._pending = {}
+        self._versions = {}
+        self._values = {}
+
+    def add(self, name, family, compute, **params):
+        """Declares a value of the batch; 'compute' is called only when the key is missing."""
+        self._pending[name] = (family, params, compute)
+        return self
+
+    def fetch(self):
+        """Reads the declared values and returns them as {name: value}."""
+        # The namespace versions of every declared key are read first, in one round trip
+        namespace_keys = {namespace_key for family, params, _ in self._pending.values()
+                          for namespace_key in family.namespace_keys(**params)} - self._versions.keys()
+        if namespace_keys:
+            local_keys = {namespace_key for family, params, _ in self._pending.values()
+                          for namespace_key in family.local_namespace_keys(**params)}
+            self._versions.update(namespace_versions(sorted(namespace_keys), local_keys))
+        pending = {name: (family, family.key(self._versions, **params), compute)
+                   for name, (family, params, compute) in self._pending.items()}
+        self._pending = {}
+        local = local_cache.is_enabled()
+        local_hits = set()
+        for family, key, _ in pending.values():
+            if local and family.local and key not in self._values and not self.refresh:
+                value = local_cache.lru.get(key, MISSING)
+                if value is not MISSING:
+                    self._values[key] = value
+                    local_hits.add(key)
+
+        keys = {key for _, key, _ in pending.values() if key not in self._values}
+        if keys and not self.refresh:
+            with span('cache'):
+                fetched = cache.get_many(list(keys))
+            self._values.update(fetched)
+            for family, key, _ in pending.values():
+                if local and family.local and key in fetched:
+                    local_cache.lru.set(key, fetched[key], payload_size(fetched[key]), family.timeout)
+
+        missing = defaultdict(dict)  # {timeout: {key: value}}
+        for family, key, compute in pending.values():
+            if key in self._values:
+                if key not in missing[family.timeout]:  # Not recomputed by a previous name of this batch
+                    metrics.record(family.name, hits=1, local_hits=int(key in local_hits))
+                continue
+
+            started = time.perf_counter()
+            with routers.primary():
+                value = compute()
+                size = payload_size(value)
+            elapsed = time.perf_counter() - started
+
+            self._values[key] = missing[family.timeout][key] = value
+            if local and family.local:
+                local_cache.lru.set(key, value, size, family.timeout)
+            metrics.record(family.name, misses=int(not self.refresh), recompute_us=int(elapsed * 1_000_000),
+                           payload_bytes=size)
+
+        with span('cache'):
+            for timeout, values in missing.items():
+                if values:
+                    cache.set_many(values, timeout=timeout)
+
+        return {name: self._values[key] for name, (_, key, _) in pending.items()}
+
+
+def invalidate(family, **params):
+    """
+    Deletes a family key and records the invalidation. Keys of local families are
+    also deleted from the local cache of every process, through Redis pub/sub; other
+    keys only from the local cache of this process, in case the family was local
+    when the key was cached.
+    """
+    key = family.key(**params)
+    with span('cache'):
+        cache.delete(key)
+        if family.local:
+            local_cache.publish(key)
+        else:
+            local_cache.lru.delete(key)
+    metrics.record(family.name, invalidations=1)
+
+
+# Prometheus metric name, type and help text of each counter field
+PROMETHEUS_METRICS = {
+    'hits': ('freewords_cache_hits_total', 'Cache reads that found the key.'),
+    'local_hits': ('freewords_cache_local_hits_total', 'Cache reads served by the per-process cache.'),
+    'misses': ('freewords_cache_misses_total', 'Cache reads that had to recompute the value.'),
+    'invalidations': ('freewords_cache_invalidations_total', 'Keys deleted by views and signal receivers.'),
+    'recompute_us': ('freewords_cache_recompute_microseconds_total', 'Time spent recomputing missed values.'),
+    'payload_bytes': ('freewords_cache_payload_bytes_total', 'Pickled size of the recomputed values.'),
+}
+
+
+def prometheus_text(stats):
+    """Renders a metrics snapshot in the Prometheus text exposition format."""
+    lines = []
+    for field, (metric, help_text) in PROMETHEUS_METRICS.items():
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} counter')
+        for family_name, counters in stats.items():
+            lines.append(f'{metric}{{family="{family_name}"}} {counters[field]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,32 @@
+"""
+Compressors of the values stored in Redis by django_redis (the 'COMPRESSOR' option of
+'settings.CACHES').
+
+django_redis compresses every value larger than 15 bytes. The cached values of this
+project are mostly small (counters, versions, short lists), for which compressing costs
+more CPU than it saves on the network, so they are only compressed above
+'CACHE_COMPRESS_MIN_BYTES'. Values stored uncompressed are read back as they are, as
+django_redis falls back to the raw value when it cannot decompress one.
+"""
+
+from django.conf import settings
+from django_redis.compressors import lz4, zlib
+
+
+class ThresholdMixin:
+    """Compresses only the values larger than 'CACHE_COMPRESS_MIN_BYTES'."""
+
+    def __init__(self, options):
+        super().__init__(options)
+        self.min_length = getattr(settings, 'CACHE_COMPRESS_MIN_BYTES', 1024)
+
+
+class ZlibCompressor(ThresholdMixin, zlib.ZlibCompressor):
+    """zlib: the smallest payloads, for a Redis with little memory or a slow network."""
+
+    # Level 1 is about three times faster than the default 6, for payloads a third larger
+    preset = 1
+
+
+class Lz4Compressor(ThresholdMixin, lz4.Lz4Compressor):
+    """lz4: several times faster than zlib for slightly larger payloads; the default."""
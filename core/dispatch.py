@@ -0,0 +1,110 @@
+"""
+Dispatch of the Celery tasks.
+
+A task queued with 'delay' during a request can be picked by a worker before the
+transaction of the request is committed: the worker then reads the old rows, or none.
+'dispatch' queues the task once the transaction is committed instead (right away
+outside of a transaction), and drops the duplicates with a key in the cache:
+
+- By default, a task is not queued again while an identical one (same task and same
+  arguments, or same 'key') waits for a worker, so a burst of changes queues a single
+  job. The key is released when the task starts, so a change made while it runs
+  queues the next one.
+- With a 'window', the key is kept for that many seconds instead, so the task is
+  queued at most once per window for a key. 'run_once' applies the same rule to work
+  done without a task, e.g. one password reset email per user.
+
+A broker that cannot be reached is logged rather than raised: the key is released,
+and the next dispatch queues the task.
+"""
+
+import hashlib
+import json
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Message header carrying the key to release when the task starts
+HEADER = 'dispatch_key'
+
+# Seconds a key is kept when its task never starts (a lost message, a stopped worker)
+PENDING_TIMEOUT = 600
+
+
+def task_key(task, args=(), kwargs=None):
+    """Returns the key of a task and its arguments."""
+    arguments = json.dumps([list(args), kwargs or {}], sort_keys=True, default=str)
+    return f'task:{task.name}:{hashlib.sha1(arguments.encode()).hexdigest()}'
+
+
+def claim(key, timeout):
+    """
+    Claims a key for 'timeout' seconds. Returns False when it is already claimed, i.e.
+    when the work it stands for is already queued or done.
+    """
+    return cache.add(key, True, timeout=timeout)
+
+
+def run_once(key, window, func):
+    """
+    Calls 'func' once the current transaction is committed, unless 'key' was claimed
+    during the last 'window' seconds. The key is claimed only once committed, so a
+    rolled back transaction leaves it free, and released when 'func' raises, so the
+    next attempt calls it again.
+    """
+    def run():
+        if not claim(key, window):
+            return
+        try:
+            func()
+        except Exception:
+            cache.delete(key)
+            raise
+
+    transaction.on_commit(run)
+
+
+def dispatch(task, args=(), kwargs=None, key=None, window=None, countdown=0):
+    """
+    Queues a task once the current transaction is committed, unless a duplicate is
+    queued (see 'send').
+    """
+    transaction.on_commit(lambda: send(task, args, kwargs, key=key, window=window, countdown=countdown))
+
+
+def send(task, args=(), kwargs=None, key=None, window=None, countdown=0):
+    """
+    Queues a task now, unless a duplicate is queued.
+
+    Args:
+        task: The Celery task.
+        args, kwargs: The arguments of the task.
+        key (str): The key of the duplicates, the task and its arguments by default.
+        window (int): Seconds during which the duplicates are dropped. By default, they
+            are dropped until the task starts.
+        countdown (int): Seconds before the task is run.
+
+    Returns:
+        bool: Whether the task was queued.
+    """
+    key = key or task_key(task, args, kwargs)
+    if not claim(key, window or countdown + PENDING_TIMEOUT):
+        return False
+    try:
+        task.apply_async(args=args, kwargs=kwargs, countdown=countdown, retry=False,
+                         headers=None if window else {HEADER: key})
+    except Exception:
+        cache.delete(key)
+        logger.warning('Could not queue the task %s', task.name, exc_info=True)
+        return False
+    return True
+
+
+def release(request):
+    """Releases the key of a task starting, so the next duplicate can be queued."""
+    key = getattr(request, HEADER, None) or (request.headers or {}).get(HEADER)
+    if key:
+        cache.delete(key)
@@ -0,0 +1,204 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+try:
+    from django_redis import get_redis_connection
+    from django_redis.cache import RedisCache
+except ImportError:  # Without django_redis, there is no pub/sub to keep the local caches coherent
+    get_redis_connection = RedisCache = None
+
+logger = logging.getLogger(__name__)
+
+# Redis pub/sub channel of the invalidated keys
+CHANNEL = getattr(settings, 'CACHE_INVALIDATION_CHANNEL', 'freewords:cache:invalidate')
+
+# Message sent on the channel to clear the whole local cache; no family key is empty
+CLEAR_ALL = ''
+
+# Seconds the invalidation listener waits for a message, below the SOCKET_TIMEOUT of Redis
+POLL_TIMEOUT = 0.5
+
+
+class LocalCache:
+    """
+    In-process LRU cache bounded by the total size of its values, with a TTL per entry.
+
+    It sits in front of Redis for the families marked as 'local' (see 'core.cache'),
+    so the values read on nearly every request are neither fetched over the network
+    nor unpickled again. Values are shared between the requests of a process and
+    must not be mutated by the views.
+    """
+
+    def __init__(self, max_bytes, timeout):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.size = 0
+        self._entries = OrderedDict()  # {key: (value, size, expires)}, least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, size, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                self.size -= size
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, size, timeout=None):
+        """Stores a value whose pickled size is 'size', evicting the least recently used entries."""
+        if size > self.max_bytes:
+            return
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = (value, size, time.monotonic() + timeout)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class InvalidationListener:
+    """
+    Deletes the keys invalidated by other processes from the local cache.
+
+    Invalidations are published on the 'CACHE_INVALIDATION_CHANNEL' Redis channel by
+    'core.cache.invalidate'. Every process listens in a daemon thread, started on the
+    first use of the local cache (after the gunicorn fork). As messages sent while the
+    listener is disconnected are lost, the local cache is cleared on every reconnection.
+
+    The channel is polled with 'get_message(timeout=...)' rather than read with a
+    blocking 'listen()': the connections of the pool have a 1 second SOCKET_TIMEOUT
+    and 'retry_on_timeout', so a blocking read on an idle channel would time out and
+    reconnect every second, losing the messages published in between.
+    """
+
+    def __init__(self, local_cache):
+        self.local_cache = local_cache
+        self._pid = None
+        self._stopped = None  # Event of the running thread, set to stop it
+        self._lock = threading.Lock()
+        self.subscribed = threading.Event()  # Set while the listener is subscribed to the channel
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopped = threading.Event()
+            # A forked worker inherits the entries of the master but not its listener thread
+            self.local_cache.clear()
+            threading.Thread(target=self.listen, args=(self._stopped,), name='cache-invalidation',
+                             daemon=True).start()
+
+    def stop(self):
+        """Stops the listener thread and clears the local cache; the next use of the cache starts a new one."""
+        with self._lock:
+            if self._stopped is not None:
+                self._stopped.set()
+            self._pid = self._stopped = None
+            self.subscribed.clear()
+            self.local_cache.clear()
+
+    def listen(self, stopped):
+        while not stopped.is_set():
+            pubsub = None
+            try:
+                pubsub = get_redis_connection('default').pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                self.local_cache.clear()
+                if not stopped.is_set():
+                    self.subscribed.set()
+                while not stopped.is_set():
+                    message = pubsub.get_message(timeout=POLL_TIMEOUT)
+                    if message is None or message['type'] != 'message':
+                        continue
+                    key = message['data'].decode()
+                    if key == CLEAR_ALL:
+                        self.local_cache.clear()
+                    else:
+                        self.local_cache.delete(key)
+            except Exception:
+                if stopped.is_set():
+                    break
+                self.subscribed.clear()
+                logger.exception('Cache invalidation listener disconnected, reconnecting')
+                self.local_cache.clear()
+                stopped.wait(1)
+            finally:
+                if pubsub is not None:
+                    pubsub.close()
+
+
+lru = LocalCache(
+    max_bytes=getattr(settings, 'CACHE_LOCAL_MAX_BYTES', 0),
+    timeout=getattr(settings, 'CACHE_LOCAL_TIMEOUT', 60),
+)
+listener = InvalidationListener(lru)
+
+
+def is_enabled():
+    """
+    The local cache is used only with django_redis, as it relies on pub/sub to be
+    invalidated in every process, and only when 'CACHE_LOCAL_MAX_BYTES' is set.
+    """
+    if RedisCache is None or not lru.max_bytes or not isinstance(caches['default'], RedisCache):
+        return False
+    listener.ensure_started()
+    return True
+
+
+def publish(key):
+    """Deletes a key from the local cache of every process, this one included."""
+    lru.delete(key)
+    if RedisCache is not None and isinstance(caches['default'], RedisCache):
+        get_redis_connection('default').publish(CHANNEL, key)
+
+
+def clear():
+    """Clears the local cache of every process, this one included."""
+    lru.clear()
+    if RedisCache is not None and isinstance(caches['default'], RedisCache):
+        get_redis_connection('default').publish(CHANNEL, CLEAR_ALL)
+
+
+@receiver(setting_changed)
+def restart_listener(setting, **kwargs):
+    """
+    When CACHES changes (e.g. 'override_settings' in tests), the listener is still
+    subscribed on the previous Redis server: it is stopped, and started again on the
+    new one by the next use of the local cache.
+    """
+    if setting == 'CACHES':
+        listener.stop()
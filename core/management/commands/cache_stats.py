@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.cache import metrics
+
+
+class Command(BaseCommand):
+    """
+    Prints the hit/miss counters of every cache key family as a table.
+
+    With '--watch', the table is refreshed every few seconds until interrupted.
+    """
+    help = 'Print the cache hit/miss counters of every key family.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', type=float, metavar='SECONDS',
+                            help='refresh the table every SECONDS seconds')
+        parser.add_argument('--reset', action='store_true', help='reset every counter and exit')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            metrics.reset()
+            self.stdout.write(self.style.SUCCESS('Cache metrics reset.'))
+            return
+
+        while True:
+            self.print_table(metrics.snapshot())
+            if not options['watch']:
+                return
+            time.sleep(options['watch'])
+            self.stdout.write('\033[2J\033[H', ending='')  # Clear the terminal before the next table
+
+    def print_table(self, stats):
+        header = (f"{'family':<36}{'hits':>10}{'local':>10}{'misses':>10}{'hit ratio':>11}"
+                  f"{'invalid.':>10}{'avg recompute ms':>18}{'avg payload B':>15}")
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for family_name, counters in stats.items():
+            reads = counters['hits'] + counters['misses']
+            misses = counters['misses'] or 1
+            ratio = f"{counters['hits'] / reads:.1%}" if reads else '-'
+            self.stdout.write(
+                f"{family_name:<36}{counters['hits']:>10}{counters['local_hits']:>10}{counters['misses']:>10}{ratio:>11}"
+                f"{counters['invalidations']:>10}{counters['recompute_us'] / misses / 1000:>18.2f}"
+                f"{counters['payload_bytes'] // misses:>15}"
+            )
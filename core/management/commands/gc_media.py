@@ -0,0 +1,28 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core.media import collect
+
+
+class Command(BaseCommand):
+    """
+    Deletes the media files that no post or profile references any more (see
+    'core.media.collect'). Files are shared between models, so their models never
+    delete them; run this command daily, e.g. from cron.
+
+    A file is kept for a grace period after its last reference is released, for the
+    pages still cached with its URL and the uploads not yet attached to their post.
+    """
+    help = 'Delete the media files no longer referenced.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=24 * 3600,
+                            help='seconds a file stays unreferenced before it is deleted (one day)')
+        parser.add_argument('--dry-run', action='store_true', help='list the files without deleting them')
+
+    def handle(self, *args, **options):
+        deleted = collect(default_storage, options['grace'], dry_run=options['dry_run'])
+        for name in deleted:
+            self.stdout.write(name)
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(deleted)} media files.'))
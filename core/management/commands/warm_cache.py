@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from core.tasks import warm_cache
+from core.warming import warm
+
+
+class Command(BaseCommand):
+    """
+    Pre-computes the hot cache families: the aggregates of the home and posts pages,
+    and the detail page of the posts listed on the first home pages.
+
+    With '--background', the warming is queued as a Celery task instead.
+    """
+    help = 'Pre-compute the hot cache families after a deploy or a Redis restart.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, help='number of home pages whose posts are warmed')
+        parser.add_argument('--concurrency', type=int, help='maximum number of jobs run at the same time')
+        parser.add_argument('--refresh', action='store_true', help='recompute the values already in the cache')
+        parser.add_argument('--background', action='store_true', help='queue the warming as a Celery task')
+
+    def handle(self, *args, **options):
+        kwargs = {'pages': options['pages'], 'concurrency': options['concurrency'], 'refresh': options['refresh']}
+        if options['background']:
+            warm_cache.delay(**kwargs)
+            self.stdout.write(self.style.SUCCESS('Cache warming queued.'))
+            return
+
+        durations = warm(**kwargs)
+        for name, seconds in durations.items():
+            self.stdout.write(f'{name:<24}{seconds * 1000:>10.1f} ms')
+        self.stdout.write(self.style.SUCCESS(f'Cache warmed: {len(durations)} jobs.'))
@@ -0,0 +1,150 @@
+import json
+import logging
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import profiling, routers, timing
+
+logger = logging.getLogger('freeWords.timing')
+
+
+class RequestTimingMiddleware:
+    """
+    Middleware splitting the wall time of sampled requests into DB, cache, template,
+    storage and image processing time.
+
+    A share of the requests given by 'REQUEST_TIMING_SAMPLE_RATE' is sampled. For those,
+    the breakdown is logged as a JSON line on the 'freeWords.timing' logger and returned
+    in a 'Server-Timing' header, so it is visible in the browser developer tools.
+    It supports both the WSGI (sync) and the ASGI (async) deployments. Queries are
+    measured by the wrapper installed on every connection ('timing.install_db_timer'),
+    as under ASGI they run in other threads than the middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= getattr(settings, 'REQUEST_TIMING_SAMPLE_RATE', 0):
+            return self.get_response(request)
+
+        token = timing.current_timings.set(timing.RequestTimings())
+        try:
+            response = self.get_response(request)
+            return self.report(request, response)
+        finally:
+            timing.current_timings.reset(token)
+
+    async def __acall__(self, request):
+        if random.random() >= getattr(settings, 'REQUEST_TIMING_SAMPLE_RATE', 0):
+            return await self.get_response(request)
+
+        token = timing.current_timings.set(timing.RequestTimings())
+        try:
+            response = await self.get_response(request)
+            return self.report(request, response)
+        finally:
+            timing.current_timings.reset(token)
+
+    def report(self, request, response):
+        """Adds the 'Server-Timing' header to the response and logs the breakdown."""
+        summary = timing.current_timings.get().summary()
+        response['Server-Timing'] = ', '.join(
+            f'{category};dur={milliseconds:.1f}' for category, (milliseconds, _) in summary.items()
+        )
+        logger.info(json.dumps({
+            'event': 'request_timing',
+            'method': request.method,
+            'path': request.path,
+            'view': request.resolver_match.view_name if request.resolver_match else None,
+            'status': response.status_code,
+            **{f'{category}_ms': round(milliseconds, 2) for category, (milliseconds, _) in summary.items()},
+            **{f'{category}_calls': summary[category][1] for category in timing.CATEGORIES},
+        }))
+        return response
+
+    def process_template_response(self, request, response):
+        """Renders template responses here, so the rendering time is measured under 'template'."""
+        if timing.current_timings.get() is not None:
+            with timing.span('template'):
+                response.render()
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Middleware routing the reads of the GET and HEAD requests to the read replicas, and
+    pinning the clients that just wrote to the primary (see 'core.routers').
+
+    It comes before the session and authentication middleware, so their reads and
+    writes are routed as well.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = routers.start_request(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            state = routers.end_request(token)
+        return routers.pin_client(state, response)
+
+    async def __acall__(self, request):
+        token = routers.start_request(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            state = routers.end_request(token)
+        return routers.pin_client(state, response)
+
+
+class ProfilingMiddleware:
+    """
+    Middleware running a view under a profiler when a staff user asks for it.
+
+    Profiling is enabled per request by a signed token (see 'core.profiling.make_token')
+    sent in the '_profile' query parameter or the 'X-Profile-Token' header. The capture
+    is listed in the admin under 'Profile Captures', and its id is returned in the
+    'X-Profile-Capture' response header. Async views are not profiled.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if iscoroutinefunction(view_func) or not profiling.is_profiling_requested(request):
+            return None
+
+        def callback():
+            response = view_func(request, *view_args, **view_kwargs)
+            # Template responses are rendered lazily; render them inside the profile
+            if hasattr(response, 'render') and callable(response.render):
+                response = response.render()
+            return response
+
+        response, capture = profiling.profile_request(request, callback)
+        response['X-Profile-Capture'] = str(capture.pk)
+        return response
@@ -1,11 +1,12 @@
 from django.db import models
+from django.core.mail import EmailMultiAlternatives
+from django.utils import timezone
 from ckeditor_uploader.fields import RichTextUploadingField
 from django.urls import reverse
 from account.models import CustomUser
 from image_cropping import ImageCropField, ImageRatioField
-from PIL import Image
-from io import BytesIO
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from . import media
+from .storage import ProfilingStorage
 
 
 class Tag(models.Model):
@@ -33,6 +34,8 @@ class BlogPost(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Created At')
     tags = models.ManyToManyField(Tag, blank=True)
 
+    # Quality of the WebP covers
+    WEBP_QUALITY = 30
 
     class Meta:
         verbose_name = 'Blog Post'
@@ -50,21 +53,10 @@ class BlogPost(models.Model):
         return reverse('core:post-detail', args=(self.id, self.slug))
 
     def save(self, *args, **kwargs):
-        if self.cover_image:
-            img = Image.open(self.cover_image)
-            img = img.convert("RGB")
-            img = img.copy()
-            img_io = BytesIO()
-            img.save(img_io, format="WEBP", quality=30, optimize=True)
-
-        self.cover_image = InMemoryUploadedFile(
-            file=img_io,
-            field_name=None,
-            name=self.cover_image.name.split('.')[0] + ".webp",
-            content_type="image/webp",
-            size=img_io.tell(),
-            charset=None
-        )
+        # Only a new upload is encoded: an edit of the text keeps the stored cover, and
+        # a cover already in the storage (e.g. uploaded straight to the bucket, see
+        # 'core.uploads') is converted by a Celery task instead
+        media.encode_upload(self, 'cover_image', self.WEBP_QUALITY)
         super().save(*args, **kwargs)
 
 
@@ -89,6 +81,51 @@ class Comment(models.Model):
         return self.replies.all()
 
 
+class MediaObject(models.Model):
+    """
+    A file of the media storage, whose name is the hash of its content and which can
+    be shared by several posts or profiles (see 'core.storage.ContentAddressedMixin').
+
+    'refcount' counts the references of the models to the file, kept by the receivers
+    in 'core.signals'. The files no longer referenced are deleted by 'manage.py gc_media'.
+    'source_hash' is the hash of the upload the file was encoded from, so the same
+    upload is not encoded again (see 'core.media.rendition').
+    """
+    name = models.CharField(max_length=255, unique=True)
+    source_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    refcount = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
+
+
+class Notification(models.Model):
+    """
+    A notice for a user about one of their comments: a reply to it, or its approval by
+    a moderator. Created by the 'fan_out_notification' Celery task, and emailed in a
+    digest (see 'core.notifications').
+    """
+    REPLY = 'reply'
+    APPROVAL = 'approval'
+    KIND_CHOICES = [(REPLY, 'Reply'), (APPROVAL, 'Approval')]
+
+    recipient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='notifications')
+    actor = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    emailed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # The digest reads the notifications of a user that were not emailed yet
+        indexes = [models.Index(fields=['recipient', 'emailed_at'])]
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f'{self.kind} for {self.recipient.username}'
+
+
 class PostLike(models.Model):
     """
     Represents a like on a blog post by a user.
@@ -103,3 +140,68 @@ class PostLike(models.Model):
 
     def __str__(self):
         return f'{self.user.username} like {self.post.title_heading}'
+
+
+class ProfileCapture(models.Model):
+    """
+    Represents the profile of a single request, captured on demand by a staff user.
+    The profiler output (pstats or pyinstrument HTML) is kept in a local storage.
+    """
+    url_name = models.CharField(max_length=250, blank=True, db_index=True)
+    path = models.CharField(max_length=2000)
+    method = models.CharField(max_length=10)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField(verbose_name='Duration (ms)')
+    profiler = models.CharField(max_length=20)
+    output = models.FileField(upload_to='%Y/%m/%d/', storage=ProfilingStorage())
+    summary = models.TextField(blank=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Profile Capture'
+        verbose_name_plural = 'Profile Captures'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.duration_ms:.0f} ms)'
+
+
+class OutboxEmail(models.Model):
+    """
+    An email to a single recipient, queued by 'core.outbox.enqueue' and sent by the
+    'drain_outbox' Celery task. Failed sends are retried at 'send_after' with an
+    exponential backoff, until 'EMAIL_OUTBOX_MAX_ATTEMPTS' attempts have failed.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENT, 'Sent'), (FAILED, 'Failed')]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    to = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    send_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Outbox Email'
+        verbose_name_plural = 'Outbox Emails'
+        # The drain reads the pending emails that are due, oldest first
+        indexes = [models.Index(fields=['status', 'send_after'])]
+
+    def __str__(self):
+        return f'{self.subject} to {self.to} ({self.status})'
+
+    def message(self):
+        """Builds the email to send, with its HTML version when there is one."""
+        message = EmailMultiAlternatives(self.subject, self.body, self.from_email, [self.to])
+        if self.html_body:
+            message.attach_alternative(self.html_body, 'text/html')
+        return message
@@ -0,0 +1,105 @@
+"""
+Notifications of the comment authors, when someone replies to their comment or when a
+moderator approves it.
+
+Nothing is sent during the request:
+
+1. The moderation view calls 'notify_approval' when it approves a comment or a
+   reply, and 'notify_reply' as well for a reply: a reply is pending until then, and
+   its thread is not notified of a reply it cannot see. Both queue the
+   'fan_out_notification' Celery task once the transaction is committed (see
+   'core.dispatch').
+2. The task finds the users to notify and stores a 'Notification' for each of them.
+3. A user gets at most one email per 'NOTIFICATION_DIGEST_INTERVAL' seconds: the first
+   notification of an interval queues the 'send_notification_digest' task for the end
+   of the interval, and the following ones are coalesced into the same digest, which
+   is sent through the email outbox (see 'core.outbox').
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import dispatch, outbox
+from .models import Comment, Notification
+
+# Held while a digest of the user is queued, so the next notifications are coalesced into it
+DIGEST_SCHEDULED_KEY = 'notification_digest_scheduled_{user_id}'
+
+
+def notify_reply(reply):
+    """Notifies the author of the replied comment, and the other users in its thread, of an approved reply."""
+    from .tasks import fan_out_notification  # The tasks import this module
+    dispatch.dispatch(fan_out_notification, (Notification.REPLY, reply.id, reply.user_id))
+
+
+def notify_approval(comment, moderator):
+    """Notifies the author of a comment or a reply that a moderator approved it."""
+    from .tasks import fan_out_notification
+    dispatch.dispatch(fan_out_notification, (Notification.APPROVAL, comment.id, moderator.id))
+
+
+def fan_out(kind, comment_id, actor_id):
+    """
+    Stores a notification of the event for every user concerned, and schedules their
+    digests. Returns the number of users notified.
+    """
+    comment = Comment.objects.select_related('reply').filter(id=comment_id).first()
+    if comment is None:  # Deleted since the event
+        return 0
+
+    if kind == Notification.REPLY:
+        if comment.reply is None or not comment.is_approved:
+            return 0
+        # The author of the comment, and the users whose replies to it were approved
+        recipients = {comment.reply.user_id}
+        recipients.update(
+            Comment.objects.filter(reply=comment.reply, is_approved=True).values_list('user_id', flat=True)
+        )
+        recipients.discard(comment.user_id)
+    else:
+        recipients = {comment.user_id}
+    recipients.discard(actor_id)
+
+    Notification.objects.bulk_create([
+        Notification(recipient_id=user_id, actor_id=actor_id, kind=kind, comment=comment)
+        for user_id in recipients
+    ])
+    for user_id in recipients:
+        schedule_digest(user_id)
+    return len(recipients)
+
+
+def schedule_digest(user_id):
+    """Queues the digest of a user at the end of the interval, unless one is already queued."""
+    from .tasks import send_notification_digest
+    interval = getattr(settings, 'NOTIFICATION_DIGEST_INTERVAL', 600)
+    dispatch.send(send_notification_digest, (user_id,), key=DIGEST_SCHEDULED_KEY.format(user_id=user_id),
+                  countdown=interval)
+
+
+def send_digest(user_id):
+    """
+    Queues in the outbox one email listing the notifications of a user not emailed yet.
+    Returns the number of notifications in the email.
+    """
+    with transaction.atomic():
+        notifications = list(
+            Notification.objects.select_for_update()
+            .filter(recipient=user_id, emailed_at=None)
+            .select_related('recipient', 'actor', 'comment__post')
+        )
+        if not notifications:
+            return 0
+        recipient = notifications[0].recipient
+        if recipient.is_active and recipient.email:
+            body = render_to_string('core/notification-digest.txt', {
+                'user': recipient,
+                'notifications': notifications,
+                'site_url': settings.SITE_URL,
+            })
+            count = len(notifications)
+            outbox.enqueue(f'{count} new notification{"s" if count > 1 else ""} on FREEWORDS', body, recipient.email)
+        Notification.objects.filter(id__in=[n.id for n in notifications]).update(emailed_at=timezone.now())
+    return len(notifications)
@@ -0,0 +1,164 @@
+"""
+Outbound email pipeline.
+
+Emails are not sent by the request (or the task) producing them: 'enqueue' stores
+them in the 'OutboxEmail' table, and the 'drain_outbox' Celery task sends the due ones
+in batches, each batch through a single SMTP connection, so a wave of emails costs one
+TLS handshake per batch instead of one per email.
+
+The drain sends at most 'EMAIL_OUTBOX_RATE_LIMIT' emails per minute across every
+worker, and an email that cannot be sent is retried after 'EMAIL_OUTBOX_RETRY_DELAY'
+seconds, doubled at each attempt.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+# Emails sent during the current minute, across every worker
+RATE_KEY = 'outbox_sent'
+
+# Seconds a claimed email is reserved to the drain sending it. A drain that dies while
+# sending leaves its emails to the next one once this lease is over.
+CLAIM_LEASE = 300
+
+
+def enqueue(subject, body, to, html_body='', from_email=None):
+    """
+    Queues an email for every recipient in 'to' (an address or a list of addresses),
+    and schedules a drain once the current transaction is committed.
+    """
+    recipients = [to] if isinstance(to, str) else list(to)
+    emails = OutboxEmail.objects.bulk_create([
+        OutboxEmail(subject=subject, body=body, html_body=html_body,
+                    from_email=from_email or settings.DEFAULT_FROM_EMAIL, to=recipient)
+        for recipient in recipients
+    ])
+    from .tasks import schedule_drain  # The tasks import this module
+    transaction.on_commit(schedule_drain)
+    return emails
+
+
+def _reserve(count):
+    """
+    Reserves up to 'count' sends in the rate limit of the current minute.
+
+    Returns:
+        tuple: The number of sends reserved, and the key of the minute they were
+            reserved from (None without a rate limit), to give back the unused ones.
+    """
+    limit = getattr(settings, 'EMAIL_OUTBOX_RATE_LIMIT', 0)
+    if not limit:
+        return count, None
+    key = f'{RATE_KEY}:{int(time.time() // 60)}'
+    cache.add(key, 0, timeout=120)
+    used = cache.incr(key, count)
+    return max(0, min(count, limit - (used - count))), key
+
+
+def _release(key, count):
+    """
+    Gives back sends reserved from the minute 'key' but not used, e.g. as fewer emails
+    were due. The sends go back to the minute they were taken from, even when the next
+    one has started since.
+    """
+    if key and count:
+        try:
+            cache.decr(key, count)
+        except ValueError:  # The minute is over and its counter expired
+            pass
+
+
+def _claim(count):
+    """Reserves up to 'count' due emails to this drain, oldest first."""
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.PENDING, send_after__lte=now).order_by('send_after')[:count]
+        )
+        OutboxEmail.objects.filter(id__in=[email.id for email in emails]).update(
+            send_after=now + timedelta(seconds=CLAIM_LEASE)
+        )
+    return emails
+
+
+def _defer(email, error):
+    """Schedules the next attempt of an email that could not be sent, or gives up on it."""
+    attempts = email.attempts + 1
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    delay = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', 60) * 2 ** (attempts - 1)
+    status = OutboxEmail.FAILED if attempts >= max_attempts else OutboxEmail.PENDING
+    OutboxEmail.objects.filter(id=email.id).update(
+        attempts=attempts, status=status, last_error=repr(error),
+        send_after=timezone.now() + timedelta(seconds=delay),
+    )
+    logger.warning('Could not send the email %s to %s (attempt %s): %r', email.id, email.to, attempts, error)
+
+
+def _send(emails):
+    """Sends a batch of emails through one connection, returns the number sent."""
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as error:
+        for email in emails:
+            _defer(email, error)
+        return 0
+
+    sent = []
+    try:
+        for email in emails:
+            try:
+                connection.send_messages([email.message()])
+            except Exception as error:
+                _defer(email, error)
+            else:
+                sent.append(email.id)
+    finally:
+        connection.close()
+
+    OutboxEmail.objects.filter(id__in=sent).update(
+        status=OutboxEmail.SENT, sent_at=timezone.now(), attempts=F('attempts') + 1, last_error='',
+    )
+    return len(sent)
+
+
+def drain(batch_size=None):
+    """
+    Sends the due emails of the outbox, 'batch_size' ('EMAIL_OUTBOX_BATCH_SIZE') per
+    connection, within the rate limit.
+
+    Returns:
+        tuple: The number of emails sent, and the seconds until the next drain is due
+            (the next minute when the rate limit is reached, the next retry otherwise),
+            or None when no email is pending.
+    """
+    batch_size = batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50)
+    sent = 0
+    while True:
+        allowed, key = _reserve(batch_size)
+        if not allowed:
+            return sent, 60 - int(time.time() % 60)
+        emails = _claim(allowed)
+        _release(key, allowed - len(emails))
+        if not emails:
+            break
+        sent += _send(emails)
+
+    next_send = (OutboxEmail.objects.filter(status=OutboxEmail.PENDING)
+                 .order_by('send_after').values_list('send_after', flat=True).first())
+    if next_send is None:
+        return sent, None
+    return sent, max(0, int((next_send - timezone.now()).total_seconds()))
@@ -0,0 +1,94 @@
+import cProfile
+import io
+import marshal
+import pstats
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+
+from account.decorators import is_admin
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:  # pyinstrument is optional, cProfile is used without it
+    SamplingProfiler = None
+
+# Query parameter and header carrying the profiling token
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'X-Profile-Token'
+
+_SALT = 'core.profiling'
+
+
+def make_token(user):
+    """Returns a signed token enabling the profiling of requests made by the given staff user."""
+    return signing.TimestampSigner(salt=_SALT).sign(str(user.pk))
+
+
+def is_profiling_requested(request):
+    """
+    Returns True if the request carries a valid profiling token of the requesting user,
+    and that user is a staff member (the same check as the comment management).
+    """
+    token = request.GET.get(PROFILE_PARAM) or request.headers.get(PROFILE_HEADER)
+    if not token or not is_admin(request.user):
+        return False
+    try:
+        user_pk = signing.TimestampSigner(salt=_SALT).unsign(
+            token, max_age=getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 3600)
+        )
+    except signing.BadSignature:
+        return False
+    return user_pk == str(request.user.pk)
+
+
+def _profile_with_cprofile(callback):
+    profiler = cProfile.Profile()
+    response = profiler.runcall(callback)
+    profiler.create_stats()
+
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(30)
+    # Same format as 'Profile.dump_stats', so it can be loaded with 'pstats.Stats(path)' or snakeviz
+    return response, ContentFile(marshal.dumps(profiler.stats)), 'prof', summary.getvalue()
+
+
+def _profile_with_pyinstrument(callback):
+    profiler = SamplingProfiler(interval=getattr(settings, 'PROFILING_INTERVAL', 0.001))
+    profiler.start()
+    try:
+        response = callback()
+    finally:
+        profiler.stop()
+    return response, ContentFile(profiler.output_html().encode()), 'html', profiler.output_text()
+
+
+def profile_request(request, callback):
+    """
+    Runs the callback (the view) under a profiler and stores the capture.
+
+    pyinstrument is used when installed and 'PROFILER' is not 'cprofile',
+    otherwise cProfile. Returns the response and the saved ProfileCapture.
+    """
+    from .models import ProfileCapture
+
+    use_sampling = SamplingProfiler is not None and getattr(settings, 'PROFILER', 'auto') != 'cprofile'
+    started = time.perf_counter()
+    if use_sampling:
+        response, output, extension, summary = _profile_with_pyinstrument(callback)
+    else:
+        response, output, extension, summary = _profile_with_cprofile(callback)
+    duration_ms = (time.perf_counter() - started) * 1000
+
+    url_name = request.resolver_match.view_name if request.resolver_match else ''
+    capture = ProfileCapture(
+        url_name=url_name, path=request.path[:2000], method=request.method,
+        status_code=response.status_code, duration_ms=duration_ms,
+        profiler='pyinstrument' if use_sampling else 'cprofile',
+        summary=summary, user=request.user,
+    )
+    capture.output.save(f"{url_name.replace(':', '-') or 'request'}.{extension}", output, save=False)
+    capture.save()
+    return response, capture
@@ -0,0 +1,38 @@
+"""
+Queries of the cached values, shared by the sync views, the async views and the cache
+warming, so every one of them caches the same data under the same key.
+
+They return unevaluated querysets: the sync callers wrap them in 'list()' and the async
+ones iterate them with 'async for'.
+"""
+
+from django.db.models import Count, Q
+
+from .models import BlogPost, Comment, Tag
+
+
+def approved_comment_counts():
+    """Number of approved comments of every post, as {'id', 'approved_comments'} rows."""
+    return BlogPost.objects.annotate(
+        approved_comments=Count('comments', filter=Q(comments__is_approved=True))
+    ).values('id', 'approved_comments')
+
+
+def like_counts():
+    """Number of likes of every post, as {'id', 'like_count'} rows."""
+    return BlogPost.objects.annotate(like_count=Count('likes')).values('id', 'like_count')
+
+
+def top_liked_posts():
+    """The four most liked posts, shown in the sidebar."""
+    return BlogPost.objects.annotate(like_count=Count('likes')).order_by('-like_count')[:4]
+
+
+def top_tags():
+    """Tags ordered by their number of posts, shown in the tag cloud."""
+    return Tag.objects.annotate(post_count=Count('blogpost')).order_by('-post_count')
+
+
+def approved_comments(post_id):
+    """Approved comments of a post, shown on the post detail page."""
+    return Comment.objects.filter(post=post_id, is_approved=True)
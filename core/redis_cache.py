@@ -0,0 +1,20 @@
+"""
+Cache backend of 'settings.CACHES': django_redis, kept coherent with the per-process
+cache of 'core.local_cache'.
+"""
+
+from django_redis.cache import RedisCache as BaseRedisCache
+
+from . import local_cache
+
+
+class RedisCache(BaseRedisCache):
+    """
+    django_redis backend whose 'clear' also clears the local cache of every process,
+    which would otherwise keep serving the values of the local families until they expire.
+    """
+
+    def clear(self, *args, **kwargs):
+        result = super().clear(*args, **kwargs)
+        local_cache.clear()
+        return result
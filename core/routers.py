@@ -0,0 +1,121 @@
+"""
+Database router sending the reads of the views to the read replicas.
+
+The replicas are the aliases of DATABASES listed in 'DATABASE_REPLICAS', copies of
+'default' (the primary) kept by the streaming replication of PostgreSQL. They lag
+behind the primary, so they only serve the reads that can be a little stale:
+
+- The reads of the GET and HEAD requests go to a replica picked at random for the
+  request, once 'ReplicaRoutingMiddleware' (see 'core.middleware') has started it with
+  'start_request'. Everything else reads from the primary: the other requests, the
+  Celery tasks and the management commands.
+- The values computed for the cache are read from the primary ('primary'): a value
+  read from a lagging replica would be served stale for the whole timeout of its key,
+  to every client.
+- The writes always go to the primary. A request writing, e.g. a GET deleting a
+  comment, reads from the primary from then on, and so does a transaction open on the
+  primary, whose reads may lock rows ('select_for_update').
+- A client that just wrote is pinned to the primary for 'DATABASE_REPLICA_PIN_SECONDS'
+  seconds, by a cookie set by the middleware, so it reads its own writes (the comment
+  it posted, the like it toggled) even while the replicas have not caught up.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Cookie pinning a client that just wrote to the primary
+PIN_COOKIE = 'db_primary'
+
+# Routing state of the current request, None outside a request
+_current = ContextVar('replica_routing', default=None)
+
+# Set while the reads must go to the primary, see 'primary'
+_primary = ContextVar('read_from_primary', default=False)
+
+
+class RoutingState:
+    """
+    Routing state of a request: whether it reads from the replicas and from which one,
+    whether it wrote, and the transactions already open on the primary when it started.
+    A single replica serves the whole request, so its reads never go back in time
+    from one replica to another lagging further behind.
+    """
+
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.replica = random.choice(replicas()) if use_replicas else None
+        self.wrote = False
+        self.atomic_depth = len(connections[DEFAULT_DB_ALIAS].atomic_blocks)
+
+    def in_transaction(self):
+        """Whether the request opened a transaction on the primary."""
+        return len(connections[DEFAULT_DB_ALIAS].atomic_blocks) > self.atomic_depth
+
+
+def replicas():
+    """Aliases of the read replicas."""
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def start_request(request):
+    """
+    Starts routing the queries of a request: to the replicas for a GET or HEAD request
+    of a client not pinned to the primary. Returns the token of 'end_request'.
+    """
+    use_replicas = (bool(replicas()) and request.method in ('GET', 'HEAD')
+                    and PIN_COOKIE not in request.COOKIES)
+    return _current.set(RoutingState(use_replicas))
+
+
+def end_request(token):
+    """Stops routing the queries of a request, returns its state."""
+    state = _current.get()
+    _current.reset(token)
+    return state
+
+
+@contextmanager
+def primary():
+    """Sends the reads of the enclosed block to the primary, e.g. to compute a cached value."""
+    token = _primary.set(True)
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+def pin_client(state, response):
+    """Pins the client of a request that wrote to the primary for 'DATABASE_REPLICA_PIN_SECONDS'."""
+    if state.wrote and replicas():
+        response.set_cookie(PIN_COOKIE, '1', max_age=getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 10),
+                            httponly=True, samesite='Lax')
+    return response
+
+
+class ReplicaRouter:
+    """Router reading from the replicas when the current request allows it, and writing to the primary."""
+
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if state is None or not state.use_replicas or _primary.get() or state.in_transaction():
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            # The rest of the request reads what it wrote
+            state.use_replicas = False
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,77 @@
+"""
+Session engine storing the sessions in Redis instead of the 'django_session' table
+(the 'SESSION_ENGINE' setting).
+
+It is the cache engine of Django, on the 'sessions' cache alias, with three changes:
+
+- Saving a session that was already stored is a single 'SET XX' with django_redis,
+  where Django reads the session back first to check it still exists.
+- While 'SESSION_DB_FALLBACK' is set, a session missing from Redis is looked up in the
+  'django_session' table and moved to Redis, so switching engines logs nobody out.
+- 'clearsessions' deletes the rows left in the table in small batches, through the
+  index on their expiry date. The sessions in Redis expire by themselves.
+
+As with every Django engine, nothing is read until the session is accessed: requests
+without a session cookie never reach Redis.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends import cache
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+try:
+    from django_redis.cache import RedisCache
+except ImportError:  # Without django_redis, sessions are saved as Django does
+    RedisCache = None
+
+
+class SessionStore(cache.SessionStore):
+
+    def load(self):
+        session_key = self.session_key
+        session_data = super().load()
+        if self.session_key is None and session_key and getattr(settings, 'SESSION_DB_FALLBACK', False):
+            return self._load_from_db(session_key)
+        return session_data
+
+    async def aload(self):
+        session_key = self.session_key
+        session_data = await super().aload()
+        if self.session_key is None and session_key and getattr(settings, 'SESSION_DB_FALLBACK', False):
+            return await sync_to_async(self._load_from_db)(session_key)
+        return session_data
+
+    def _load_from_db(self, session_key):
+        """Moves a session that is still valid from the database to the cache, and returns its data."""
+        now = timezone.now()
+        row = Session.objects.filter(session_key=session_key, expire_date__gt=now).first()
+        if row is None:
+            return {}
+        session_data = self.decode(row.session_data)
+        self._session_key = session_key
+        self._cache.set(self.cache_key, session_data, max(1, int((row.expire_date - now).total_seconds())))
+        row.delete()
+        return session_data
+
+    def save(self, must_create=False):
+        if self.session_key is None or must_create or RedisCache is None or not isinstance(self._cache, RedisCache):
+            return super().save(must_create=must_create)
+        # Only overwrites a session that still exists, without reading it first
+        if not self._cache.set(self.cache_key, self._get_session(), self.get_expiry_age(), xx=True):
+            raise UpdateError
+
+    @classmethod
+    def clear_expired(cls):
+        """Deletes the expired sessions left in the database, 'SESSION_CLEAR_BATCH_SIZE' at a time."""
+        batch_size = getattr(settings, 'SESSION_CLEAR_BATCH_SIZE', 1000)
+        now = timezone.now()
+        while True:
+            keys = list(
+                Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size]
+            )
+            if not keys:
+                return
+            Session.objects.filter(session_key__in=keys).delete()
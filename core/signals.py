@@ -1,11 +1,53 @@
 # from Tools.demo.mcast import sender
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+from django.apps import apps
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import m2m_changed, post_init, post_save, post_delete, pre_delete
+from django.dispatch import Signal, receiver
 from django.core.cache import cache
-from .models import Comment, BlogPost, PostLike
+from celery.signals import task_prerun
+from . import cache as core_cache, dispatch, media, syndication
+from .models import Comment, BlogPost, PostLike, Tag
 from account.models import ProfileUser
 from django.db.models import Count, Q
 
+# Sent after a bulk change of the posts, with the ids of the posts changed ('post_ids')
+posts_bulk_changed = Signal()
+
+# Ids of the posts changed in the current 'bulk_changes' block, or None outside of one
+_bulk_post_ids = ContextVar('bulk_post_ids', default=None)
+
+
+@contextmanager
+def bulk_changes():
+    """
+    Groups the cache invalidations of a bulk change of the posts, e.g. an import.
+
+    Inside the block, the receivers below only record the posts that changed instead of
+    invalidating the cache for every object. At the end, 'posts_bulk_changed' is sent
+    once, which invalidates the changed posts and the aggregates and warms the cache.
+    """
+    post_ids = set()
+    token = _bulk_post_ids.set(post_ids)
+    try:
+        yield
+    finally:
+        _bulk_post_ids.reset(token)
+        posts_bulk_changed.send(sender=BlogPost, post_ids=post_ids)
+
+
+def _deferred(post_id):
+    """Records a changed post and returns True when the invalidation is deferred to the end of the bulk change."""
+    post_ids = _bulk_post_ids.get()
+    if post_ids is None:
+        return False
+    post_ids.add(post_id)
+    return True
+
 
 
 def update_comments_cache():
@@ -46,19 +88,23 @@ def update_comment_cache_on_change(sender, instance, **kwargs):
     When a comment is saved or deleted, it deletes the cache for approved comments per post
     to ensure the cache is updated with the most recent data.
     """
+    if _deferred(instance.post_id):
+        return
     # Deleting the cache key for approved comments to trigger a cache refresh on the next update
-    cache.delete('approved_comments_per_post')
+    core_cache.invalidate(core_cache.APPROVED_COMMENTS_PER_POST)
+    # The comment tree of the post in the JSON API
+    core_cache.invalidate(core_cache.API_POST_COMMENTS, post_id=instance.post_id)
 
 
 @receiver([post_save, post_delete], sender=ProfileUser)
 def update_profile_cache_on_change(sender, instance, **kwargs):
     """
     Signal receiver that listens to post_save and post_delete signals for ProfileUser model.
-    When a profile is saved or deleted, it deletes the user's profile cache to trigger a refresh
-    with the most recent data.
+    When a profile is saved or deleted, it invalidates every cached value about the user to
+    trigger a refresh with the most recent data.
     """
-    # Deleting the cache for the user's profile to trigger a cache refresh on the next update
-    cache.delete(f"profile_{instance.user.id}")
+    # Bumping the user's namespace invalidates the profile on the home page and the profile page
+    core_cache.bump(core_cache.USER, user_id=instance.user_id)
 
 
 @receiver([post_save, post_delete], sender=PostLike)
@@ -68,9 +114,10 @@ def update_likes_cache(sender, instance, **kwargs):
     When a like is added or removed, it deletes the 'post_like' cache key to ensure the cache is updated.
     This ensures that the like count for the post is always up to date.
     """
+    if _deferred(instance.post_id):
+        return
     # Deleting the cache key 'post_like' to force a cache refresh with the updated like count
-    cache_key = 'post_like'
-    cache.delete(cache_key)
+    core_cache.invalidate(core_cache.POST_LIKE_COUNTS)
 
 
 @receiver([post_save, post_delete], sender=Comment)
@@ -80,9 +127,10 @@ def update_comments_cache(sender, instance, **kwargs):
     When a comment is added or removed, it deletes the 'approved_comments' cache key to ensure the cache is updated.
     This ensures that the approved comments count for the post is always up to date.
     """
+    if _deferred(instance.post_id):
+        return
     # Deleting the cache key 'approved_comments' to force a cache refresh with the updated approved comments count
-    cache_key = 'approved_comments'
-    cache.delete(cache_key)
+    core_cache.invalidate(core_cache.APPROVED_COMMENTS_COUNTS)
 
 @receiver([post_save, post_delete], sender=PostLike)
 def update_user_liked_post_cache(sender, instance, **kwargs):
@@ -91,6 +139,212 @@ def update_user_liked_post_cache(sender, instance, **kwargs):
     When a like is added or removed by a user, it deletes the user's cache for that post's like status.
     This ensures that the cache is refreshed the next time the like status for the user is checked.
     """
+    if _deferred(instance.post_id):
+        return
     # Constructing a cache key that identifies the like status for a specific user and post
-    cache_key = f'user_like_{instance.user.id}_liked_post_{instance.post_id}'
-    cache.delete(cache_key)
+    core_cache.invalidate(core_cache.USER_LIKED_POST, user_id=instance.user_id, post_id=instance.post_id)
+
+
+@receiver([post_save, post_delete], sender=BlogPost)
+def update_post_cache_on_change(sender, instance, **kwargs):
+    """
+    Signal receiver that listens to post_save and post_delete signals for the BlogPost model.
+    When a post is saved or deleted, it invalidates every cached value about the post (its
+    approved comments and the like status of every user) and the aggregates over all posts
+    (comment and like counts, top liked posts and tags), by bumping their namespaces.
+    """
+    if _deferred(instance.id):
+        return
+    core_cache.bump(core_cache.POST, post_id=instance.id)
+    core_cache.bump(core_cache.POSTS)
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def remember_cleared_tag_links(sender, instance, action, reverse, **kwargs):
+    """
+    Signal receiver for the clearing of the tags of a post, or of the posts of a tag.
+    The links are deleted without their ids, so the ids of the posts (from a tag) or
+    the names of the tags (from a post) are remembered on 'pre_clear', for the cache and
+    syndication receivers of 'post_clear'.
+    """
+    if action == 'pre_clear':
+        instance._cleared_links = list(
+            instance.blogpost_set.values_list('id', flat=True) if reverse
+            else instance.tags.values_list('name', flat=True)
+        )
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def update_post_cache_on_tags_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Signal receiver for the changes of the tags of the posts. The tags are shown with a
+    post and counted in the tag cloud, so it bumps the namespaces of the posts changed
+    and of the aggregates over all posts.
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        post_ids = [instance.id]
+    elif action == 'post_clear':
+        post_ids = instance._cleared_links  # Remembered by 'remember_cleared_tag_links'
+    else:
+        post_ids = pk_set
+    if any([_deferred(post_id) for post_id in post_ids]):
+        return
+    for post_id in post_ids:
+        core_cache.bump(core_cache.POST, post_id=post_id)
+    core_cache.bump(core_cache.POSTS)
+
+
+@receiver(posts_bulk_changed)
+def update_cache_on_bulk_change(sender, post_ids, **kwargs):
+    """
+    Signal receiver for the end of a bulk change of the posts (see 'bulk_changes').
+    Once the changes are committed, it invalidates the changed posts and the aggregates
+    over all posts, then queues the warming of the cache and the rebuild of every feed
+    and sitemap (see 'core.syndication').
+    """
+    from .tasks import schedule_warming
+
+    def invalidate():
+        for post_id in post_ids:
+            core_cache.bump(core_cache.POST, post_id=post_id)
+        core_cache.bump(core_cache.POSTS)
+        schedule_warming()
+        syndication.schedule(committed=True)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=BlogPost)
+def rebuild_syndication_on_post_save(sender, instance, created, **kwargs):
+    """
+    Signal receiver for the saves of the posts. It queues the rebuild of the feeds and
+    sitemaps showing the post (see 'core.syndication'), the feeds of its tags included.
+    """
+    if _deferred(instance.id):
+        return
+    syndication.schedule([instance.id], [] if created else instance.tags.values_list('name', flat=True))
+
+
+@receiver(pre_delete, sender=BlogPost)
+def remember_syndication_tags(sender, instance, **kwargs):
+    """Signal receiver for the deletions of the posts, remembering their tags before their links are deleted."""
+    instance._syndication_tags = list(instance.tags.values_list('name', flat=True))
+
+
+@receiver(post_delete, sender=BlogPost)
+def rebuild_syndication_on_post_delete(sender, instance, **kwargs):
+    """Signal receiver for the deletions of the posts, queuing the rebuild of the feeds and sitemaps showing it."""
+    if _deferred(instance.id):
+        return
+    syndication.schedule([instance.id], getattr(instance, '_syndication_tags', []))
+
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def rebuild_syndication_on_tags_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Signal receiver for the changes of the tags of the posts, made from a post or from a
+    tag. It queues the rebuild of the feeds of the tags added or removed.
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        post_ids = instance._cleared_links if action == 'post_clear' else pk_set
+        tags = [instance.name]
+    else:
+        post_ids = [instance.id]
+        tags = (instance._cleared_links if action == 'post_clear'
+                else Tag.objects.filter(pk__in=pk_set).values_list('name', flat=True))
+    if any([_deferred(post_id) for post_id in post_ids]):
+        return
+    syndication.schedule(post_ids, tags)
+
+
+@receiver(post_init, sender=Tag)
+def remember_tag_name(sender, instance, **kwargs):
+    """Signal receiver for the creation of the tags, remembering their name to tell a renaming."""
+    instance._syndication_name = instance.name
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def rebuild_syndication_on_tag_change(sender, instance, **kwargs):
+    """
+    Signal receiver for the saves and deletions of the tags. It queues the rebuild of
+    the feeds of the tag, under its old name as well when it was renamed, and of the
+    feeds of the latest posts, which list the tags.
+    """
+    syndication.schedule([], [instance._syndication_name, instance.name])
+    instance._syndication_name = instance.name
+
+
+def warm_cache_after_migrate(sender, **kwargs):
+    """
+    Receiver of the post_migrate signal of the 'core' application, connected in
+    'CoreConfig.ready'. Migrations run on every deploy, so the cache is warmed then.
+    """
+    from .tasks import schedule_warming
+
+    if getattr(settings, 'CACHE_WARM_AFTER_MIGRATE', False):
+        schedule_warming()
+
+
+@task_prerun.connect
+def release_dispatch_key(sender=None, task=None, **kwargs):
+    """
+    Signal receiver for the start of every Celery task. It releases the key of a task
+    queued by 'core.dispatch', so the next duplicate can be queued.
+    """
+    dispatch.release(task.request)
+
+
+# The file fields whose references to the media files are counted, per model (see 'core.media')
+MEDIA_FIELDS = {}
+for _app_label, _model, _field in media.TRACKED_FIELDS:
+    MEDIA_FIELDS.setdefault(apps.get_model(_app_label, _model), []).append(_field)
+
+
+def _media_name(instance, field):
+    """
+    Returns the name of the stored file of a field, without building its FieldFile.
+    None when there is none: no file, a file not saved yet, or a deferred field.
+    """
+    value = instance.__dict__.get(field)
+    if isinstance(value, FieldFile):
+        return value.name if value._committed and value.name else None
+    return value if isinstance(value, str) and value else None
+
+
+@receiver(post_init, sender=BlogPost)
+@receiver(post_init, sender=ProfileUser)
+def remember_media_names(sender, instance, **kwargs):
+    """
+    Signal receiver for the creation of the posts and profiles. It remembers the names
+    of their files, so a save can tell which reference changed.
+    """
+    instance._media_names = {field: _media_name(instance, field) for field in MEDIA_FIELDS[sender]}
+
+
+@receiver(post_save, sender=BlogPost)
+@receiver(post_save, sender=ProfileUser)
+def count_media_references(sender, instance, created, **kwargs):
+    """
+    Signal receiver for the saves of the posts and profiles. When a file field changed,
+    it counts a reference to the new file and releases the old one, in the transaction
+    of the save.
+    """
+    names = getattr(instance, '_media_names', {})
+    for field in MEDIA_FIELDS[sender]:
+        old, new = None if created else names.get(field), _media_name(instance, field)
+        if old != new:
+            media.retain(new)
+            media.release(old)
+            names[field] = new
+
+
+@receiver(post_delete, sender=BlogPost)
+@receiver(post_delete, sender=ProfileUser)
+def release_media_references(sender, instance, **kwargs):
+    """Signal receiver for the deletions of the posts and profiles, releasing their files."""
+    for field in MEDIA_FIELDS[sender]:
+        media.release(_media_name(instance, field))
@@ -1,7 +1,77 @@
-  CKEDITOR.replace('id_description', {
+  const postForm = document.getElementById('post-form');
+  const csrfToken = postForm.querySelector('[name=csrfmiddlewaretoken]').value;
+
+  // Posts a form to the server, and returns its JSON response
+  function postJSON(url, data) {
+    const body = new FormData();
+    Object.keys(data).forEach(function (key) { body.append(key, data[key]); });
+    return fetch(url, { method: 'POST', body: body, headers: { 'X-CSRFToken': csrfToken }, credentials: 'same-origin' })
+      .then(function (response) {
+        return response.json().then(function (json) {
+          if (!response.ok) { throw new Error(json.error || 'Upload failed'); }
+          return json;
+        });
+      });
+  }
+
+  // Asks for a presigned upload of a file (kind: 'cover' or 'media')
+  function startUpload(kind, file) {
+    return postJSON(postForm.dataset.uploadStart, { kind: kind, content_type: file.type, size: file.size });
+  }
+
+  // The form of a presigned upload: its fields, then the file
+  function uploadForm(upload, file) {
+    const form = new FormData();
+    Object.keys(upload.fields).forEach(function (key) { form.append(key, upload.fields[key]); });
+    form.append('file', file);
+    return form;
+  }
+
+  // Uploads a file straight to the storage, and returns its token once confirmed
+  function directUpload(kind, file) {
+    return startUpload(kind, file).then(function (started) {
+      return fetch(started.upload.url, { method: 'POST', body: uploadForm(started.upload, file) })
+        .then(function (response) {
+          if (!response.ok) { throw new Error('Upload failed'); }
+          return postJSON(postForm.dataset.uploadComplete, { token: started.token });
+        })
+        .then(function () { return started.token; });
+    });
+  }
+
+  const editor = CKEDITOR.replace('id_description', {
     toolbar: 'full',
     height: 300,
     extraPlugins: 'uploadimage',
+    imageUploadUrl: postForm.dataset.uploadStart,
+  });
+
+  // The images of the editor are uploaded straight to the storage too
+  editor.on('fileUploadRequest', function (evt) {
+    const loader = evt.data.fileLoader;
+    evt.stop();
+    startUpload('media', loader.file).then(function (started) {
+      loader.directUpload = started;
+      loader.xhr.open('POST', started.upload.url, true);
+      loader.xhr.send(uploadForm(started.upload, loader.file));
+    }).catch(function (error) {
+      loader.message = error.message;
+      loader.changeStatus('error');
+    });
+  });
+
+  editor.on('fileUploadResponse', function (evt) {
+    const loader = evt.data.fileLoader;
+    if (!loader.directUpload) { return; }
+    evt.stop();
+    if (loader.xhr.status >= 300) {
+      evt.data.message = 'Upload failed';
+      evt.cancel();
+      return;
+    }
+    // Confirmed in the background: the server checks the image
+    postJSON(postForm.dataset.uploadComplete, { token: loader.directUpload.token });
+    evt.data.url = loader.directUpload.url;
   });
 
   document.getElementById('id_cover_image').addEventListener('change', function (event) {
@@ -25,17 +95,20 @@
             // Create a new File object from the cropped image
             const croppedFile = new File([blob], 'cropped-image.jpg', { type: 'image/jpeg' });
 
-            // Create a new FileList and assign the cropped file to it
-            const dataTransfer = new DataTransfer();
-            dataTransfer.items.add(croppedFile);
-
-            // Assign the FileList to the hidden input
-            const croppedImageInput = document.getElementById('cropped-image-input');
-            croppedImageInput.files = dataTransfer.files;
-
             // Hide the modal and destroy the cropper instance
             document.getElementById('crop-modal').style.display = 'none';
             cropper.destroy();
+
+            // Upload the cropped image straight to the storage; the original is not sent
+            directUpload('cover', croppedFile).then(function (token) {
+              document.getElementById('cover-upload-input').value = token;
+              document.getElementById('id_cover_image').value = '';
+            }).catch(function () {
+              // Falls back to sending the cropped image with the form
+              const dataTransfer = new DataTransfer();
+              dataTransfer.items.add(croppedFile);
+              document.getElementById('cropped-image-input').files = dataTransfer.files;
+            });
           }, 'image/jpeg');
         };
       };
@@ -48,4 +121,4 @@
 
   titleInput.addEventListener('input', () => {
     slugInput.value = titleInput.value.toLowerCase().replace(/\s+/g, '-').replace(/[^a-z0-9\-]/g, '');
-  });
\ No newline at end of file
+  });
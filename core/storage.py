@@ -0,0 +1,232 @@
+import hashlib
+import os
+import posixpath
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.urls import reverse
+from django.utils.encoding import filepath_to_uri
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+from .local_cache import LocalCache
+from .timing import timed
+
+try:
+    from rcssmin import cssmin
+    from rjsmin import jsmin
+except ImportError:  # rcssmin and rjsmin are optional, the assets are collected as they are without them
+    cssmin = jsmin = None
+
+# URLs of the media files built by this process, see 'CachedURLMixin'
+urls = LocalCache(
+    max_bytes=getattr(settings, 'STORAGE_URL_CACHE_MAX_BYTES', 1024 * 1024),
+    timeout=getattr(settings, 'STORAGE_URL_CACHE_TIMEOUT', 3600),
+)
+
+
+class TimedStorageMixin:
+    """
+    Storage mixin measuring the calls to the storage backend under the 'storage'
+    category of the request timings (see 'core.middleware.RequestTimingMiddleware').
+    """
+
+    @timed('storage')
+    def _save(self, name, content):
+        return super()._save(name, content)
+
+    @timed('storage')
+    def _open(self, name, mode='rb'):
+        return super()._open(name, mode)
+
+    @timed('storage')
+    def exists(self, name):
+        return super().exists(name)
+
+    @timed('storage')
+    def delete(self, name):
+        return super().delete(name)
+
+    @timed('storage')
+    def url(self, name, *args, **kwargs):
+        return super().url(name, *args, **kwargs)
+
+
+class CachedURLMixin:
+    """
+    Storage mixin memoizing the URLs of the files in the process, keyed on the name of
+    the file and its variant (the other arguments of 'url'). The pages build the URL of
+    the same covers and photos many times (the list, the sidebar, the detail page), and
+    an S3 URL is built and signed by boto at every call.
+
+    When 'MEDIA_CDN_URL' is set, the URLs point to the CDN instead, unsigned: the CDN
+    must be able to read the objects.
+    """
+    # Seconds a memoized URL is used, at most (see 'url_timeout')
+    url_timeout = None
+
+    def cdn_path(self, name):
+        """Path of a file under 'MEDIA_CDN_URL'."""
+        return filepath_to_uri(name)
+
+    def url(self, name, *args, **kwargs):
+        # The variant can hold dicts (e.g. the 'parameters' of S3), so it is keyed on its repr
+        key = (self.__class__.__name__, name, repr((args, sorted(kwargs.items()))))
+        url = urls.get(key)
+        if url is None:
+            cdn = getattr(settings, 'MEDIA_CDN_URL', '')
+            if cdn:
+                url = f'{cdn.rstrip("/")}/{self.cdn_path(name)}'
+            else:
+                url = super().url(name, *args, **kwargs)
+            urls.set(key, url, len(url), timeout=None if cdn else self.url_timeout)
+        return url
+
+
+class ContentAddressedMixin:
+    """
+    Storage mixin naming the files by the SHA-256 of their content, in the directory
+    of the name asked: '<directory>/<sha256><extension>'. Saving a content already
+    stored uploads nothing and returns the existing file, so a post saved again or an
+    image uploaded twice shares one object, which the browsers and the CDN cache once.
+
+    As a file can be shared, it is never deleted by its models: the references are
+    counted in 'MediaObject' and the orphans deleted by 'manage.py gc_media'.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        directory, filename = posixpath.split(str(name).replace('\\', '/'))
+        name = posixpath.join(directory, digest.hexdigest() + os.path.splitext(filename)[1].lower())
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+
+# Salt of the upload policies signed by the local stand-in of the bucket
+LOCAL_UPLOAD_SALT = 'core.storage.local_upload'
+
+
+class TimedS3Storage(ContentAddressedMixin, CachedURLMixin, TimedStorageMixin, S3Storage):
+    """
+    The S3-compatible storage of the media files, with content-addressed names, timed
+    calls and memoized URLs.
+    """
+
+    @property
+    def url_timeout(self):
+        # A signed URL is memoized for half its validity, so it is never served expired
+        return self.querystring_expire // 2 if self.querystring_auth else None
+
+    def cdn_path(self, name):
+        return filepath_to_uri(self._normalize_name(clean_name(name)))
+
+    def presigned_post(self, name, content_type, max_size, expires):
+        """
+        Returns the URL and the form fields of a browser upload of 'name' straight to
+        the bucket, limited to 'content_type' and to 'max_size' bytes, for 'expires'
+        seconds (see 'core.uploads').
+        """
+        fields = {'Content-Type': content_type}
+        conditions = [{'Content-Type': content_type}, ['content-length-range', 1, max_size]]
+        cache_control = self.object_parameters.get('CacheControl')
+        if cache_control:  # The headers of the other uploads (AWS_S3_OBJECT_PARAMETERS)
+            fields['Cache-Control'] = cache_control
+            conditions.append({'Cache-Control': cache_control})
+        if self.default_acl:
+            fields['acl'] = self.default_acl
+            conditions.append({'acl': self.default_acl})
+        return self.bucket.meta.client.generate_presigned_post(
+            self.bucket_name, self._normalize_name(clean_name(name)),
+            Fields=fields, Conditions=conditions, ExpiresIn=expires,
+        )
+
+
+class TimedFileSystemStorage(ContentAddressedMixin, CachedURLMixin, TimedStorageMixin, FileSystemStorage):
+    """
+    A local filesystem storage with timed calls, used in place of S3 by the load harness
+    and the tests. Its 'presigned_post' stands in for the bucket: the browser uploads to
+    'core.views.LocalUploadView', with a signed policy instead of the S3 one.
+    """
+
+    def presigned_post(self, name, content_type, max_size, expires):
+        # Expired by the view after 'UPLOAD_URL_EXPIRES' seconds
+        policy = signing.dumps({'key': name, 'type': content_type, 'max_size': max_size}, salt=LOCAL_UPLOAD_SALT)
+        return {
+            'url': reverse('core:upload-local'),
+            'fields': {'key': name, 'Content-Type': content_type, 'policy': policy},
+        }
+
+
+class ProfilingStorage(FileSystemStorage):
+    """
+    Local storage of the profiler captures, under 'PROFILING_ROOT'.
+    Captures may contain sensitive data, so they are never uploaded to the media bucket.
+    """
+
+    @property
+    def base_location(self):
+        return settings.PROFILING_ROOT
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    @property
+    def base_url(self):
+        return None
+
+
+class StaticAssetsStorage(CompressedManifestStaticFilesStorage):
+    """
+    Storage of the static files built by 'collectstatic': the CSS and JS files are
+    minified as they are written, and WhiteNoise names every file after the hash of
+    its content (listed in 'staticfiles.json') and writes its gzip and Brotli versions.
+    The hashed files are served by WhiteNoise with far-future, immutable caching headers.
+
+    Until 'collectstatic' has built the manifest (in development and in the tests), the
+    files are served under their own names instead of failing.
+    """
+    manifest_strict = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.built = self.manifest_storage.exists(self.manifest_name)
+
+    def minifier(self, name):
+        """The function minifying the file 'name', or None to collect it as it is."""
+        if name.endswith(('.min.css', '.min.js')):
+            return None
+        return {'.css': cssmin, '.js': jsmin}.get(os.path.splitext(name)[1])
+
+    def _save(self, name, content):
+        # Both the files copied by 'collectstatic' and their hashed copies are written
+        # here. The hashes are those of the source files, which identify the minified
+        # files as well.
+        minify = self.minifier(name)
+        if minify is not None:
+            content.seek(0)  # Already read to be hashed
+            content = ContentFile(minify(content.read().decode('utf-8')).encode('utf-8'))
+        return super()._save(name, content)
+
+    def post_process(self, *args, **kwargs):
+        self.built = True
+        yield from super().post_process(*args, **kwargs)
+
+    def stored_name(self, name):
+        if not self.built:
+            return name
+        return super().stored_name(name)
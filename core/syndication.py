@@ -0,0 +1,274 @@
+"""
+Syndication feeds and sitemaps, precomputed.
+
+Crawlers and feed readers fetch the feeds and the sitemap much more often than the
+posts change, so these documents are never built by the requests:
+
+1. The signal receivers of the posts and tags (see 'core.signals') call 'schedule'
+   with the posts and tags changed, which queues the 'rebuild_syndication' Celery task
+   once the transaction is committed (see 'core.dispatch').
+2. The task rebuilds the documents showing them only ('rebuild'): the feeds of the
+   latest posts, the feeds of the tags, the sitemap chunk of every post and the
+   sitemap index. The sitemap is sharded in chunks of 'SITEMAP_CHUNK_SIZE' posts by
+   id, so a change of a post rebuilds a single chunk however large the archive is.
+3. Every document is stored in the cache gzipped, with its ETag, without expiry, and
+   served from there by 'core.views.SyndicationView' without a query.
+
+A document missing from the cache (e.g. after a Redis restart) is built by the request
+asking for it, a single one at a time: the others wait for it. A document that does not
+exist (an empty chunk, a deleted tag) is remembered as such for 'MISSING_TIMEOUT'
+seconds. The feeds of tags that never existed are refused from the cached list of the
+tag names ('tag_names'), without a query nor a cache key.
+"""
+
+import gzip
+import hashlib
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.urls import reverse
+from django.utils import feedgenerator
+from django.utils.xmlutils import SimplerXMLGenerator
+
+from . import dispatch, routers
+from .models import BlogPost, Tag
+
+# Generators of the feeds, per kind
+FEED_CLASSES = {
+    'rss': feedgenerator.Rss201rev2Feed,
+    'atom': feedgenerator.Atom1Feed,
+}
+
+SITEMAP_INDEX = 'sitemap'
+SITEMAP_NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+SITEMAP_CONTENT_TYPE = 'application/xml; charset=utf-8'
+
+# Seconds a document that does not exist is remembered
+MISSING_TIMEOUT = 300
+
+# Cache key of the names of the tags
+TAG_NAMES_KEY = 'syndication:tags'
+
+# Seconds a request building a missing document holds its lock, and seconds the other
+# requests asking for it wait before building it themselves
+BUILD_LOCK_TIMEOUT = 30
+BUILD_WAIT = 5
+
+
+def feed_name(kind, tag=None):
+    """Name of the feed of the latest posts, or of the latest posts of a tag."""
+    return f'feed:{kind}' if tag is None else f'feed:{kind}:{tag}'
+
+
+def sitemap_name(chunk):
+    """Name of a chunk of the sitemap."""
+    return f'{SITEMAP_INDEX}:{chunk}'
+
+
+def _key(name):
+    # Hashed, as the names of the tags may contain any character
+    return f'syndication:{hashlib.sha1(name.encode()).hexdigest()}'
+
+
+def _lock_key(name):
+    return f'{_key(name)}:lock'
+
+
+def _absolute(path):
+    return settings.SITE_URL.rstrip('/') + path
+
+
+def _chunk_size():
+    return getattr(settings, 'SITEMAP_CHUNK_SIZE', 10000)
+
+
+def _published():
+    """The posts with a URL: a post without a slug has none."""
+    return BlogPost.objects.exclude(slug__isnull=True).exclude(slug='')
+
+
+def _chunks():
+    """The chunks of the sitemap holding at least one post."""
+    return sorted(set(_published().annotate(chunk=F('id') / _chunk_size()).values_list('chunk', flat=True)))
+
+
+def build_feed(kind, tag=None):
+    """Returns the feed of the latest posts, or of the latest posts of a tag, as (content, content type)."""
+    posts = _published()
+    if tag is not None:
+        if not Tag.objects.filter(name=tag).exists():
+            return None
+        posts = posts.filter(tags__name=tag)
+        link = _absolute(reverse('core:tag-feed', args=(tag, kind)))
+    else:
+        link = _absolute(reverse('core:feed', args=(kind,)))
+    posts = (posts.only('id', 'slug', 'title_heading', 'title_description', 'created_at')
+             .prefetch_related('tags')[:getattr(settings, 'SYNDICATION_FEED_SIZE', 20)])
+
+    feed = FEED_CLASSES[kind](
+        title='freeWords' if tag is None else f'freeWords: {tag}',
+        link=_absolute(reverse('core:home')),
+        description='The latest posts of freeWords',
+        feed_url=link,
+        language=settings.LANGUAGE_CODE,
+    )
+    for post in posts:
+        url = _absolute(post.get_absolute_url())
+        feed.add_item(title=post.title_heading, link=url, description=post.title_description, unique_id=url,
+                      pubdate=post.created_at, categories=[tag.name for tag in post.tags.all()])
+    return feed.writeString('utf-8'), feed.content_type
+
+
+def _xml(root, element, entries):
+    """Writes the XML of a sitemap: a 'root' of one 'element' per entry, an entry being a list of (tag, text)."""
+    output = StringIO()
+    handler = SimplerXMLGenerator(output, 'utf-8')
+    handler.startDocument()
+    handler.startElement(root, {'xmlns': SITEMAP_NAMESPACE})
+    for entry in entries:
+        handler.startElement(element, {})
+        for tag, text in entry:
+            handler.addQuickElement(tag, text)
+        handler.endElement(element)
+    handler.endElement(root)
+    return output.getvalue()
+
+
+def build_sitemap(chunk):
+    """Returns a chunk of the sitemap, the posts of ids in [chunk * size, (chunk + 1) * size)."""
+    size = _chunk_size()
+    posts = list(_published().filter(id__gte=chunk * size, id__lt=(chunk + 1) * size)
+                 .only('id', 'slug', 'created_at').order_by('id'))
+    if not posts:
+        return None
+    return _xml('urlset', 'url', [
+        [('loc', _absolute(post.get_absolute_url())), ('lastmod', post.created_at.date().isoformat())]
+        for post in posts
+    ]), SITEMAP_CONTENT_TYPE
+
+
+def build_sitemap_index():
+    """Returns the sitemap index, listing the chunks with the date they were built."""
+    entries = []
+    for chunk in _chunks():
+        document = get(sitemap_name(chunk))
+        if document:
+            lastmod = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(document['last_modified']))
+            entries.append([('loc', _absolute(reverse('core:sitemap-chunk', args=(chunk,)))), ('lastmod', lastmod)])
+    return _xml('sitemapindex', 'sitemap', entries), SITEMAP_CONTENT_TYPE
+
+
+def build(name):
+    """Builds a document from its name, returns (content, content type), or None when it does not exist."""
+    if name == SITEMAP_INDEX:
+        return build_sitemap_index()
+    kind, _, argument = name.partition(':')
+    if kind == SITEMAP_INDEX:
+        return build_sitemap(int(argument))
+    kind, _, tag = argument.partition(':')
+    return build_feed(kind, tag or None)
+
+
+def refresh(name):
+    """
+    Builds a document and stores it. A content unchanged keeps its ETag and date, so the
+    clients revalidating their copy keep it. Returns the document, or {} when it does not
+    exist.
+    """
+    with routers.primary():  # Stored without expiry, so never built from a lagging replica
+        built = build(name)
+    if built is None:
+        cache.set(_key(name), {}, timeout=MISSING_TIMEOUT)
+        return {}
+    content, content_type = built
+    data = content.encode('utf-8')
+    # Weak, as the document is served gzipped or not
+    etag = f'W/"{hashlib.sha1(data).hexdigest()}"'
+    document = cache.get(_key(name))
+    if not document or document['etag'] != etag:
+        document = {'content': gzip.compress(data, mtime=0), 'etag': etag, 'content_type': content_type,
+                    'last_modified': time.time()}
+    cache.set(_key(name), document, timeout=None)
+    return document
+
+
+def get(name):
+    """
+    Returns a document as {'content': gzipped bytes, 'etag', 'content_type',
+    'last_modified': timestamp}, or None when it does not exist.
+    """
+    document = cache.get(_key(name))
+    if document is None:
+        document = _build_missing(name)
+    return document or None
+
+
+def _build_missing(name):
+    """
+    Builds a document missing from the cache in a single request: the request holding
+    the lock builds it, the others wait for it, up to 'BUILD_WAIT' seconds.
+    """
+    deadline = time.monotonic() + BUILD_WAIT
+    while not cache.add(_lock_key(name), True, timeout=BUILD_LOCK_TIMEOUT):
+        time.sleep(0.05)
+        document = cache.get(_key(name))
+        if document is not None:
+            return document
+        if time.monotonic() >= deadline:
+            return refresh(name)
+    try:
+        # Built by another request between the first read and the lock
+        document = cache.get(_key(name))
+        return refresh(name) if document is None else document
+    finally:
+        cache.delete(_lock_key(name))
+
+
+def tag_names():
+    """The names of the tags, cached without expiry and refreshed by 'rebuild'."""
+    names = cache.get(TAG_NAMES_KEY)
+    if names is None:
+        names = refresh_tag_names()
+    return names
+
+
+def refresh_tag_names():
+    with routers.primary():
+        names = frozenset(Tag.objects.values_list('name', flat=True))
+    cache.set(TAG_NAMES_KEY, names, timeout=None)
+    return names
+
+
+def rebuild(post_ids=None, tags=()):
+    """
+    Rebuilds the documents showing the given posts and tags: the feeds of the latest
+    posts, the feeds of the tags, the sitemap chunks of the posts and the index. When
+    'post_ids' is None, every document is rebuilt. Returns the names of the documents.
+    """
+    if post_ids is None or tags:
+        # A tag may have been created, renamed or deleted
+        refresh_tag_names()
+    if post_ids is None:
+        tags = Tag.objects.values_list('name', flat=True)
+        chunks = _chunks()
+    else:
+        chunks = sorted({post_id // _chunk_size() for post_id in post_ids})
+    names = [feed_name(kind, tag) for tag in [None, *tags] for kind in FEED_CLASSES]
+    names += [sitemap_name(chunk) for chunk in chunks]
+    names.append(SITEMAP_INDEX)  # Last, for the dates of the chunks
+    for name in names:
+        refresh(name)
+    return names
+
+
+def schedule(post_ids=None, tags=(), committed=False):
+    """
+    Queues the rebuild of the documents showing the given posts and tags, or of every
+    document, once the transaction is committed, or right away when it is 'committed'.
+    """
+    from .tasks import rebuild_syndication  # The tasks import this module
+    args = () if post_ids is None else (sorted(post_ids), sorted(set(tags)))
+    (dispatch.send if committed else dispatch.dispatch)(rebuild_syndication, args)
@@ -0,0 +1,109 @@
+import logging
+
+from celery import shared_task
+
+from . import dispatch, notifications, outbox, syndication, uploads, warming
+
+logger = logging.getLogger(__name__)
+
+# Set while a warming is queued, so a burst of triggers queues a single one
+WARMING_SCHEDULED_KEY = 'cache_warming_scheduled'
+
+# Set while a drain of the email outbox is queued, for the same reason
+DRAIN_SCHEDULED_KEY = 'outbox_drain_scheduled'
+
+# Set while a delayed drain (for the retries and the rate limit) is queued. It is
+# another key, so the emails queued meanwhile do not wait for its countdown.
+DRAIN_DELAYED_KEY = 'outbox_drain_delayed'
+
+
+@shared_task(ignore_result=True)
+def warm_cache(pages=None, concurrency=None, refresh=False):
+    """
+    Celery task pre-computing the hot cache families (see 'core.warming.warm').
+
+    It is queued after migrations (i.e. after every deploy) and after bulk changes of
+    the posts, and can be queued by hand with 'python manage.py warm_cache --background'.
+
+    Its result is never read, so it is not stored ('ignore_result'); the duration of
+    every warming job is logged instead.
+    """
+    return warming.warm(pages=pages, concurrency=concurrency, refresh=refresh)
+
+
+def schedule_warming(countdown=0):
+    """
+    Queues the 'warm_cache' task unless one is already queued. A broker that cannot be
+    reached is logged rather than raised, as warming the cache is never required.
+    """
+    dispatch.send(warm_cache, key=WARMING_SCHEDULED_KEY, countdown=countdown)
+
+
+@shared_task(bind=True, ignore_result=True)
+def drain_outbox(self):
+    """
+    Celery task sending the due emails of the outbox (see 'core.outbox.drain').
+
+    It is queued when emails are queued, and queues itself again for the emails left:
+    the ones over the rate limit of the minute, and the ones waiting for a retry. An
+    eager task (without a worker) cannot wait for them, so they are left to the next one.
+    """
+    sent, next_drain = outbox.drain()
+    logger.info('Sent %s emails from the outbox', sent)
+    if next_drain is not None and not self.request.is_eager:
+        schedule_drain(countdown=next_drain)
+
+
+def schedule_drain(countdown=0):
+    """
+    Queues the 'drain_outbox' task unless one is already queued. An immediate drain and
+    a delayed one are deduplicated apart, so a drain waiting for a retry never delays
+    the emails queued after it. The emails stay in the outbox when the broker cannot
+    be reached, and are sent by the next drain.
+    """
+    dispatch.send(drain_outbox, key=DRAIN_DELAYED_KEY if countdown else DRAIN_SCHEDULED_KEY, countdown=countdown)
+
+
+@shared_task(ignore_result=True)
+def fan_out_notification(kind, comment_id, actor_id):
+    """
+    Celery task storing the notifications of a reply or of an approval for every user
+    concerned, and scheduling their digests (see 'core.notifications.fan_out').
+    """
+    return notifications.fan_out(kind, comment_id, actor_id)
+
+
+@shared_task(ignore_result=True)
+def send_notification_digest(user_id):
+    """
+    Celery task queuing the email of the notifications a user received during the
+    last interval (see 'core.notifications.send_digest').
+    """
+    return notifications.send_digest(user_id)
+
+
+@shared_task(ignore_result=True)
+def process_media_upload(name):
+    """
+    Celery task checking an image of the editor uploaded straight to the storage, and
+    deleting it when it is not a valid image (see 'core.uploads.process_media').
+    """
+    return uploads.process_media(name)
+
+
+@shared_task(ignore_result=True)
+def process_cover_upload(post_id, name):
+    """
+    Celery task converting the cover of a post uploaded straight to the storage to WebP
+    (see 'core.uploads.process_cover').
+    """
+    return uploads.process_cover(post_id, name)
+
+
+@shared_task(ignore_result=True)
+def rebuild_syndication(post_ids=None, tags=()):
+    """
+    Celery task rebuilding the feeds and sitemaps showing the given posts and tags, or
+    every one of them (see 'core.syndication.rebuild').
+    """
+    return syndication.rebuild(post_ids, tags)
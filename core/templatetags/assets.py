@@ -0,0 +1,45 @@
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+# Content of the critical CSS files, read once per process (see 'critical_css')
+_critical_css = {}
+
+
+def read_static(path):
+    """
+    Returns the content of a static file: the built (minified) file once 'collectstatic'
+    has run, else the source file found by the static files finders.
+    """
+    if getattr(staticfiles_storage, 'built', False):
+        with staticfiles_storage.open(staticfiles_storage.stored_name(path)) as file:
+            return file.read().decode('utf-8')
+    source = finders.find(path)
+    if source is None:
+        raise template.TemplateSyntaxError(f"The static file '{path}' could not be found")
+    with open(source, encoding='utf-8') as file:
+        return file.read()
+
+
+@register.simple_tag
+def critical_css(path):
+    """
+    Inlines the static CSS file 'path' in a <style> element, so the first render of a
+    page does not wait for a stylesheet. Used for the few rules needed above the fold;
+    the other stylesheets are loaded without blocking the render.
+
+    The file is read once per process, except in DEBUG where it is read on every render.
+
+    Usage:
+        {% load assets %}
+        {% critical_css 'core/css/critical.css' %}
+    """
+    css = None if settings.DEBUG else _critical_css.get(path)
+    if css is None:
+        # A '</style>' in the file would end the element
+        css = _critical_css[path] = read_static(path).replace('</', '<\\/')
+    return mark_safe(f'<style>{css}</style>')
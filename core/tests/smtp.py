@@ -0,0 +1,81 @@
+import socketserver
+import threading
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for 'smtplib': greeting, EHLO, MAIL, RCPT, DATA and QUIT."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 localhost SMTP stand-in')
+        data = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if data is not None:
+                if line.rstrip(b'\r\n') == b'.':
+                    with server.lock:
+                        server.messages.append(b''.join(data).decode())
+                    data = None
+                    self.reply('250 OK')
+                else:
+                    data.append(line[1:] if line.startswith(b'..') else line)
+                continue
+            command = line[:4].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.reply('250 localhost')
+            elif command == b'RCPT' and server.reject in line.decode():
+                self.reply('550 Mailbox unavailable')
+            elif command == b'DATA':
+                data = []
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            else:  # MAIL, RCPT, RSET, NOOP
+                self.reply('250 OK')
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    In-process SMTP server for the tests of the email pipeline, counting the connections
+    and the messages it receives. Recipients containing 'reject' are refused.
+
+        with LocalSMTPServer() as smtp, override_settings(**smtp.settings()):
+            ...
+        smtp.connections, smtp.messages
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, reject='reject'):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.reject = reject
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = []
+
+    def settings(self):
+        """Settings sending the emails of the SMTP backend to this server."""
+        return {
+            'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+            'EMAIL_HOST': '127.0.0.1',
+            'EMAIL_PORT': self.server_address[1],
+            'EMAIL_USE_TLS': False,
+            'EMAIL_HOST_USER': '',
+            'EMAIL_HOST_PASSWORD': '',
+        }
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,84 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from account.models import CustomUser, ProfileUser
+from core import admin_tools
+from core.models import BlogPost, Comment, PostLike
+
+
+class AdminChangelistTest(TestCase):
+    """
+    Test case for the admin changelists: a number of queries independent of the number
+    of rows, no large column read, filters by foreign key not listing every object.
+    """
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        self.client.login(username='admin', password='pass')
+        self.posts = [
+            BlogPost.objects.create(title_heading=f'Post {i}', slug=f'post-{i}', title_description='Summary',
+                                    description='Content')
+            for i in range(2)
+        ]
+
+    def add_rows(self, count):
+        for i in range(count):
+            user = CustomUser.objects.create_user(username=f'reader-{CustomUser.objects.count()}',
+                                                  email=f'reader-{CustomUser.objects.count()}@example.com')
+            post = self.posts[i % 2]
+            Comment.objects.create(post=post, user=user, content='Comment')
+            PostLike.objects.create(post=post, user=user)
+            ProfileUser.objects.create(user=user, bio='Bio')
+
+    def get(self, url, **params):
+        """Returns the response and the queries of a changelist."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries]
+
+    def test_queries_do_not_grow_with_the_rows(self):
+        """The related objects are read with the rows, and their large columns are not read."""
+        for name in ('admin:core_comment_changelist', 'admin:core_postlike_changelist',
+                     'admin:account_profileuser_changelist', 'admin:core_blogpost_changelist'):
+            self.add_rows(2)
+            self.get(reverse(name))  # Loads the content types and permissions, cached afterwards
+            _, queries = self.get(reverse(name))
+            self.add_rows(6)
+            _, more_queries = self.get(reverse(name))
+            self.assertEqual(len(more_queries), len(queries), name)
+            self.assertFalse([sql for sql in queries if '"core_blogpost"."description"' in sql], name)
+
+    def test_search_by_post_title(self):
+        """The comments are searched by the title of their post."""
+        self.add_rows(2)
+        response, _ = self.get(reverse('admin:core_comment_changelist'), q='"Post 1"')
+        self.assertEqual(len(response.context['cl'].result_list), 1)
+
+    def test_filter_by_post_lists_no_post(self):
+        """The likes are filtered by a post chosen with an autocomplete field, the other posts are not read."""
+        self.add_rows(2)
+        response, _ = self.get(reverse('admin:core_postlike_changelist'), post__id__exact=self.posts[0].id)
+        self.assertEqual([like.post for like in response.context['cl'].result_list], [self.posts[0]])
+        self.assertContains(response, 'autocomplete-filter-post')
+        self.assertContains(response, 'admin/js/autocomplete.js')
+        self.assertNotContains(response, 'Post 1')
+
+        response, _ = self.get(reverse('admin:account_profileuser_changelist'))
+        self.assertContains(response, 'autocomplete-filter-user')
+        self.assertNotContains(response, 'reader-2@example.com')
+
+    def test_estimated_count(self):
+        """A large table is counted from the statistics of the database, unless the changelist is filtered."""
+        self.add_rows(2)
+        self.assertIsNone(admin_tools.estimated_count(Comment))
+        with mock.patch.object(admin_tools, 'estimated_count', return_value=250000):
+            response, queries = self.get(reverse('admin:core_comment_changelist'))
+            self.assertEqual(response.context['cl'].result_count, 250000)
+            self.assertFalse([sql for sql in queries if 'COUNT(' in sql.upper()])
+
+            response, _ = self.get(reverse('admin:core_comment_changelist'), is_approved__exact=0)
+            self.assertEqual(response.context['cl'].result_count, 2)
@@ -0,0 +1,104 @@
+import gzip
+import json
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from account.models import CustomUser
+from core.models import BlogPost, Comment, Tag
+
+
+@override_settings(SITE_URL='https://blog.example.com', API_PAGE_SIZE=2)
+class JSONAPITest(TestCase):
+    """
+    Test case for the read-only JSON API: cursor paging, field selection, comment tree,
+    ETags and gzip, and responses cached per version of the posts.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='reader', email='reader@example.com', password='pass')
+        self.tag = Tag.objects.create(name='django')
+        self.posts = [
+            BlogPost.objects.create(title_heading=f'Post {i}', slug=f'post-{i}', title_description='Summary',
+                                    description='Content ' * 50)
+            for i in range(3)
+        ]
+        self.posts[0].tags.add(self.tag)
+
+    def get(self, url, status=200, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status)
+        return response.json()
+
+    def test_posts_are_paged_with_a_cursor(self):
+        """The posts are listed newest first, page after page, without their content by default."""
+        url = reverse('core:api-posts')
+        page = self.get(url)
+        self.assertEqual([post['title'] for post in page['results']], ['Post 2', 'Post 1'])
+        self.assertNotIn('content', page['results'][0])
+        self.assertEqual(page['results'][1]['url'], 'https://blog.example.com/post-detail/%d/post-1/' % self.posts[1].id)
+
+        page = self.get(url, cursor=page['next'])
+        self.assertEqual(page['results'], [self.get(reverse('core:api-post', args=(self.posts[0].id,)),
+                                                    fields='id,title,slug,summary,url,cover_image,created_at,tags')])
+        self.assertEqual(page['results'][0]['tags'], ['django'])
+        self.assertIsNone(page['next'])
+
+        self.assertEqual(self.get(url, fields='title,id', tag='django')['results'], [{'id': self.posts[0].id,
+                                                                                       'title': 'Post 0'}])
+        self.assertEqual(self.get(url, 400, fields='title,password'), {'error': 'Unknown fields: password'})
+        self.assertEqual(self.get(url, 400, cursor='invalid'), {'error': 'Invalid cursor'})
+
+    def test_post_is_cached_per_version(self):
+        """A post is read from the cache until it changes."""
+        url = reverse('core:api-post', args=(self.posts[0].id,))
+        self.assertEqual(self.get(url)['content'], 'Content ' * 50)
+        with self.assertNumQueries(0):
+            self.get(url)
+
+        self.posts[0].title_heading = 'Renamed'
+        self.posts[0].save()
+        self.assertEqual(self.get(url, fields='title'), {'title': 'Renamed'})
+        self.posts[0].tags.remove(self.tag)
+        self.assertEqual(self.get(url, fields='tags'), {'tags': []})
+        self.assertEqual(self.get(reverse('core:api-post', args=(0,)), 404), {'error': 'Not found'})
+
+    def test_comment_tree(self):
+        """The approved comments are nested under the comment they reply to."""
+        post = self.posts[0]
+        comment = Comment.objects.create(post=post, user=self.user, content='First', is_approved=True)
+        Comment.objects.create(post=post, user=self.user, content='Reply', reply=comment, is_reply=True,
+                               is_approved=True)
+        pending = Comment.objects.create(post=post, user=self.user, content='Pending')
+        Comment.objects.create(post=post, user=self.user, content='Hidden', reply=pending, is_reply=True,
+                               is_approved=True)
+
+        url = reverse('core:api-post-comments', args=(post.id,))
+        tree = self.get(url, fields='author,content,replies')['results']
+        self.assertEqual(tree, [{'author': 'reader', 'content': 'First', 'replies': [
+            {'author': 'reader', 'content': 'Reply', 'replies': []},
+        ]}])
+
+        pending.is_approved = True
+        pending.save()
+        self.assertEqual([comment['content'] for comment in self.get(url, fields='content')['results']],
+                         ['First', 'Pending'])
+
+    def test_etag_and_gzip(self):
+        """A client sending back the ETag gets a 304, and a client accepting gzip a gzipped response."""
+        url = reverse('core:api-posts')
+        response = self.client.get(url, {'fields': 'id,title,summary'})
+        self.assertEqual(self.client.get(url, {'fields': 'id,title,summary'},
+                                         HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        compressed = self.client.get(reverse('core:api-post', args=(self.posts[0].id,)), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(compressed.content))['title'], 'Post 0')
+
+    def test_tags(self):
+        """The tags are listed with their number of posts."""
+        self.assertEqual(self.get(reverse('core:api-tags'))['results'],
+                         [{'id': self.tag.id, 'name': 'django', 'post_count': 1}])
+        self.posts[1].tags.add(self.tag)
+        self.assertEqual(self.get(reverse('core:api-tags'), fields='post_count')['results'], [{'post_count': 2}])
@@ -0,0 +1,102 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import include, path, reverse
+
+from account.models import CustomUser, ProfileUser
+from core import async_views, cache as core_cache, urls as core_urls
+from core.models import BlogPost, Comment, PostLike, Tag
+from core.tests.utils import make_image
+
+ASYNC_VIEWS = {
+    'home': async_views.AsyncHomeView.as_view(),
+    'post-detail': async_views.AsyncBlogPostDetailView.as_view(),
+    'posts': async_views.AsyncPostsShowView.as_view(),
+}
+
+# The core URLs with the async views, as routed when ASYNC_VIEWS is enabled
+urlpatterns = [
+    path('', include(([
+        path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name) if pattern.name in ASYNC_VIEWS
+        else pattern for pattern in core_urls.urlpatterns
+    ], 'core'), namespace='core')),
+    path('account/', include('account.urls', namespace='account')),
+]
+
+
+@override_settings(ROOT_URLCONF='core.tests.test_async_views')
+class AsyncViewsTest(TestCase):
+    """
+    Test case for the async versions of the home, post detail and posts pages.
+    They must render the same context as the sync views and share their cache keys.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='testuser', email='test@email.com', password='password')
+        self.profile = ProfileUser.objects.create(user=self.user, bio='Test bio', photo=make_image())
+        self.tag = Tag.objects.create(name='Python')
+        self.post = BlogPost.objects.create(title_heading='Post 1', slug='post-1', title_description='Description 1',
+                                            description='Content 1', cover_image=make_image())
+        self.post.tags.add(self.tag)
+        self.comment = Comment.objects.create(post=self.post, user=self.user, content='Nice post', is_approved=True)
+        PostLike.objects.create(post=self.post, user=self.user)
+
+    async def test_home(self):
+        """The async home page has the posts, comment counts, profile and sidebar."""
+        await self.async_client.alogin(username='testuser', password='password')
+        response = await self.async_client.get(reverse('core:home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['obj'][0].approved_comments, 1)
+        self.assertEqual(response.context['viewer']['bio'], self.profile.bio)
+        self.assertIn(self.post, response.context['top_liked_posts'])
+        self.assertIn(self.tag, response.context['top_tags_posts'])
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1)
+    async def test_queries_are_timed(self):
+        """The queries run by an async view, through 'sync_to_async', are measured under 'db'."""
+        with self.assertLogs('freeWords.timing', level='INFO') as logs:
+            response = await self.async_client.get(reverse('core:post-detail', args=(self.post.id, self.post.slug)))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(json.loads(logs.records[0].getMessage())['db_calls'], 0)
+
+    async def test_home_pagination(self):
+        """The async home page paginates by 5 and rejects invalid pages."""
+        for i in range(6):
+            await BlogPost.objects.acreate(title_heading=f'Post {i}', title_description='Desc', description='Content',
+                                           slug=f'post-{i}', cover_image=make_image())
+        response = await self.async_client.get(reverse('core:home'), {'page': 2})
+        self.assertEqual(len(response.context['obj']), 2)
+        self.assertTrue(response.context['is_paginated'])
+        response = await self.async_client.get(reverse('core:home'), {'page': 9})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_home_reads_sync_cache(self):
+        """Values cached by the sync views are served to the async views."""
+        cache.set(core_cache.TOP_LIKED_POSTS.key(), [])
+        response = await self.async_client.get(reverse('core:home'))
+        self.assertEqual(response.context['top_liked_posts'], [])
+
+    async def test_post_detail(self):
+        """The async post detail page has the approved comments and the like status."""
+        await self.async_client.alogin(username='testuser', password='password')
+        response = await self.async_client.get(reverse('core:post-detail', args=[self.post.id, self.post.slug]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['post'], self.post)
+        self.assertIn(self.comment, response.context['comments'])
+        self.assertTrue(response.context['is_liked'])
+        self.assertTrue(cache.get(core_cache.USER_LIKED_POST.key(user_id=self.user.id, post_id=self.post.id)))
+
+    async def test_post_detail_not_found(self):
+        response = await self.async_client.get(reverse('core:post-detail', args=[999, 'missing']))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_posts_search(self):
+        """The async posts page filters by the search query and adds the counts."""
+        response = await self.async_client.get(reverse('core:posts'), {'q': 'Post 1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['query'], 'Post 1')
+        post = response.context['obj'][0]
+        self.assertEqual((post.approved_comments, post.like_count), (1, 1))
+        response = await self.async_client.get(reverse('core:posts'), {'q': 'nothing'})
+        self.assertEqual(len(response.context['obj']), 0)
@@ -0,0 +1,351 @@
+import time
+from unittest import mock
+
+import fakeredis
+
+from django.core.cache import cache, caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django_redis import get_redis_connection
+
+from account.models import CustomUser
+from core import cache as core_cache, local_cache
+from core.models import BlogPost, PostLike, Tag
+from core.tests.utils import make_image
+
+
+@override_settings(CACHE_METRICS_FLUSH_INTERVAL=0)
+class CacheInstrumentationTest(TestCase):
+    """
+    Test case for the cache key families: hit/miss/invalidation counters,
+    the '/metrics/' endpoint and the counting of signal invalidations.
+    """
+    def setUp(self):
+        """Start every test with an empty cache and zeroed counters."""
+        cache.clear()
+        core_cache.metrics.reset()
+        self.family = core_cache.TOP_LIKED_POSTS
+
+    def test_miss_then_hit(self):
+        """The first read recomputes the value, the second one is served from the cache."""
+        calls = []
+        for _ in range(2):
+            value = core_cache.cached(self.family, lambda: calls.append(1) or ['post'])
+        self.assertEqual(value, ['post'])
+        self.assertEqual(len(calls), 1)
+        stats = core_cache.metrics.snapshot()[self.family.name]
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertGreater(stats['payload_bytes'], 0)
+
+    def test_cached_none_is_a_hit(self):
+        """A cached None is returned without recomputing it."""
+        core_cache.cached(core_cache.VIEWER, lambda: None, user_id=1)
+        value = core_cache.cached(core_cache.VIEWER, lambda: self.fail('recomputed'), user_id=1)
+        self.assertIsNone(value)
+
+    def test_signal_invalidation_is_counted(self):
+        """Deleting a like invalidates the like status of the user through a signal receiver."""
+        user = CustomUser.objects.create_user(username='user', email='user@email.com', password='pass')
+        post = BlogPost.objects.create(title_heading='Post', slug='post', title_description='Desc',
+                                       description='Content', cover_image=make_image())
+        core_cache.metrics.reset()
+        PostLike.objects.create(user=user, post=post).delete()
+        stats = core_cache.metrics.snapshot()
+        self.assertEqual(stats[core_cache.USER_LIKED_POST.name]['invalidations'], 2)
+        self.assertEqual(stats[core_cache.POST_LIKE_COUNTS.name]['invalidations'], 2)
+
+    def test_metrics_endpoint_requires_staff(self):
+        """Anonymous users cannot read the metrics."""
+        response = self.client.get(reverse('core:cache-metrics'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_metrics_endpoint_for_staff(self):
+        """Staff users get the counters in the Prometheus text format."""
+        CustomUser.objects.create_user(username='staff', email='staff@email.com', password='pass', is_staff=True)
+        self.client.login(username='staff', password='pass')
+        core_cache.cached(self.family, lambda: [])
+        response = self.client.get(reverse('core:cache-metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'freewords_cache_misses_total{{family="{self.family.name}"}} 1', response.content.decode())
+
+    @override_settings(CACHE_METRICS_TOKEN='secret')
+    def test_metrics_endpoint_with_token(self):
+        """A scraper with the bearer token can read the metrics."""
+        response = self.client.get(reverse('core:cache-metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHE_METRICS_FLUSH_INTERVAL=0)
+class CacheBatchTest(TestCase):
+    """
+    Test case for the request-scoped cache batch: one 'get_many' per page,
+    only the misses recomputed and written back with 'set_many'.
+    """
+    def setUp(self):
+        cache.clear()
+        core_cache.metrics.reset()
+        self.backend = caches['default']
+
+    def test_single_round_trip(self):
+        """The declared keys are read with one 'get_many' and the misses written with 'set_many'."""
+        cache.set(core_cache.TOP_TAGS_POSTS.key(), ['tag'])
+        batch = core_cache.CacheBatch()
+        batch.add('tags', core_cache.TOP_TAGS_POSTS, lambda: self.fail('recomputed'))
+        batch.add('liked', core_cache.TOP_LIKED_POSTS, lambda: ['post'])
+        batch.add('viewer', core_cache.VIEWER, lambda: None, user_id=1)
+        with mock.patch.object(self.backend, 'get_many', wraps=self.backend.get_many) as get_many, \
+                mock.patch.object(self.backend, 'set_many', wraps=self.backend.set_many) as set_many:
+            values = batch.fetch()
+        self.assertEqual(values, {'tags': ['tag'], 'liked': ['post'], 'viewer': None})
+        self.assertEqual(get_many.call_count, 2)  # The namespace versions, then the values
+        self.assertEqual(set_many.call_count, 2)  # One call per timeout
+        self.assertIsNone(cache.get(core_cache.VIEWER.key(user_id=1), 'absent'))
+        stats = core_cache.metrics.snapshot()
+        self.assertEqual(stats[core_cache.TOP_TAGS_POSTS.name]['hits'], 1)
+        self.assertEqual(stats[core_cache.TOP_LIKED_POSTS.name]['misses'], 1)
+
+    def test_values_are_kept_for_the_request(self):
+        """A key fetched once is not read again by a later fetch of the same batch."""
+        batch = core_cache.CacheBatch()
+        batch.add('liked', core_cache.TOP_LIKED_POSTS, lambda: ['post']).fetch()
+        with mock.patch.object(self.backend, 'get_many', side_effect=AssertionError):
+            values = batch.add('liked', core_cache.TOP_LIKED_POSTS, lambda: self.fail('recomputed')).fetch()
+        self.assertEqual(values, {'liked': ['post']})
+
+    def test_pages_read_the_cache_once(self):
+        """The home and posts pages read their namespace versions, then their values, with one 'get_many' each."""
+        BlogPost.objects.create(title_heading='Post', slug='post', title_description='Desc',
+                                description='Content', cover_image=make_image())
+        for page in ('core:home', 'core:posts'):
+            with self.subTest(page=page):
+                self.client.get(reverse(page))
+                local_cache.lru.clear()  # The values are read from Redis, not from the per-process cache
+                with mock.patch.object(self.backend, 'get_many', wraps=self.backend.get_many) as get_many, \
+                        mock.patch.object(self.backend, 'get', wraps=self.backend.get) as get, \
+                        mock.patch.object(self.backend, 'set_many', wraps=self.backend.set_many) as set_many:
+                    response = self.client.get(reverse(page))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(get_many.call_count, 2)
+                self.assertEqual(get.call_count, 0)
+                self.assertEqual(set_many.call_count, 0)
+
+
+@override_settings(CACHE_METRICS_FLUSH_INTERVAL=0)
+class NamespaceTest(TestCase):
+    """
+    Test case for the versioned namespaces: bumping a version counter invalidates
+    every key of the namespace without deleting them.
+    """
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username='user', email='user@email.com', password='pass')
+        self.post = BlogPost.objects.create(title_heading='Post', slug='post', title_description='Desc',
+                                            description='Content', cover_image=make_image())
+        core_cache.metrics.reset()
+
+    def test_version_is_part_of_the_key(self):
+        key = core_cache.POST_APPROVED_COMMENTS.key(post_id=self.post.id)
+        version = cache.get(core_cache.POST.key(post_id=self.post.id))
+        self.assertEqual(key, f'approved_comments_{self.post.id}:v{version}')
+
+    def test_bump_invalidates_every_user_like_of_a_post(self):
+        """The like status of every user for a post is invalidated as a group."""
+        other = CustomUser.objects.create_user(username='other', email='other@email.com', password='pass')
+        for user in (self.user, other):
+            core_cache.cached(core_cache.USER_LIKED_POST, lambda: True, user_id=user.id, post_id=self.post.id)
+        core_cache.metrics.reset()
+        core_cache.bump(core_cache.POST, post_id=self.post.id)
+        for user in (self.user, other):
+            self.assertFalse(core_cache.cached(core_cache.USER_LIKED_POST, lambda: False,
+                                               user_id=user.id, post_id=self.post.id))
+        stats = core_cache.metrics.snapshot()
+        self.assertEqual(stats[core_cache.USER_LIKED_POST.name]['invalidations'], 1)
+        self.assertEqual(stats[core_cache.POST_APPROVED_COMMENTS.name]['invalidations'], 1)
+
+    def test_other_namespaces_are_kept(self):
+        """Bumping a post does not invalidate the keys of other posts."""
+        other_key = core_cache.POST_APPROVED_COMMENTS.key(post_id=self.post.id + 1)
+        core_cache.bump(core_cache.POST, post_id=self.post.id)
+        self.assertEqual(core_cache.POST_APPROVED_COMMENTS.key(post_id=self.post.id + 1), other_key)
+
+    def test_post_change_bumps_its_namespaces(self):
+        """Saving a post invalidates its keys and the aggregates over all posts."""
+        post_key = core_cache.POST_APPROVED_COMMENTS.key(post_id=self.post.id)
+        top_key = core_cache.TOP_LIKED_POSTS.key()
+        self.post.save()
+        self.assertNotEqual(core_cache.POST_APPROVED_COMMENTS.key(post_id=self.post.id), post_key)
+        self.assertNotEqual(core_cache.TOP_LIKED_POSTS.key(), top_key)
+
+    def test_clearing_a_tag_bumps_its_posts(self):
+        """Clearing the posts of a tag invalidates the keys of each of them."""
+        tag = Tag.objects.create(name='tag')
+        tag.blogpost_set.add(self.post)
+        post_key = core_cache.POST_APPROVED_COMMENTS.key(post_id=self.post.id)
+        tag.blogpost_set.clear()
+        self.assertNotEqual(core_cache.POST_APPROVED_COMMENTS.key(post_id=self.post.id), post_key)
+
+    def test_evicted_counter_does_not_reuse_versions(self):
+        """A counter lost by Redis is recreated with a new version, so stale entries are not read again."""
+        key = core_cache.VIEWER.key(user_id=self.user.id)
+        cache.delete(core_cache.USER.key(user_id=self.user.id))
+        time.sleep(0.002)
+        self.assertNotEqual(core_cache.VIEWER.key(user_id=self.user.id), key)
+
+
+class LocalCacheTest(TestCase):
+    """Test case for the per-process LRU cache: size bound, least recently used eviction and TTL."""
+    def test_evicts_least_recently_used(self):
+        lru = local_cache.LocalCache(max_bytes=100, timeout=60)
+        lru.set('a', 'A', 40)
+        lru.set('b', 'B', 40)
+        lru.get('a')
+        lru.set('c', 'C', 40)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), ('A', None, 'C'))
+        self.assertEqual(lru.size, 80)
+
+    def test_skips_values_larger_than_the_cache(self):
+        lru = local_cache.LocalCache(max_bytes=100, timeout=60)
+        lru.set('a', 'A', 101)
+        self.assertEqual(len(lru), 0)
+
+    def test_expires(self):
+        lru = local_cache.LocalCache(max_bytes=100, timeout=60)
+        lru.set('a', 'A', 10, timeout=0)
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(lru.size, 0)
+
+
+@override_settings(CACHE_METRICS_FLUSH_INTERVAL=0, CACHES={'default': {
+    'BACKEND': 'core.redis_cache.RedisCache',
+    'LOCATION': 'redis://local-cache-test/0',
+    'OPTIONS': {'CONNECTION_POOL_KWARGS': {'connection_class': fakeredis.FakeConnection}},
+}})
+class TwoTierCacheTest(TestCase):
+    """
+    Test case for the local families: served from the per-process cache in front of
+    Redis, and invalidated in every process through Redis pub/sub.
+    """
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(local_cache.lru, 'max_bytes', 1024 * 1024)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.assertTrue(local_cache.is_enabled())
+        self.assertTrue(local_cache.listener.subscribed.wait(5))
+        local_cache.lru.clear()
+        core_cache.metrics.reset()
+        self.family = core_cache.TOP_LIKED_POSTS
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_second_read_skips_redis(self):
+        """Once read, a local family is served without reading Redis, its namespace version included."""
+        core_cache.cached(self.family, lambda: ['post'])
+        with mock.patch.object(caches['default'], 'get', side_effect=AssertionError), \
+                mock.patch.object(caches['default'], 'get_many', side_effect=AssertionError):
+            self.assertEqual(core_cache.cached(self.family, lambda: self.fail('recomputed')), ['post'])
+        self.assertEqual(core_cache.metrics.snapshot()[self.family.name]['local_hits'], 1)
+
+    def test_batch_reads_local_values(self):
+        """The batch only reads from Redis the values missing from the local cache."""
+        core_cache.cached(self.family, lambda: ['post'])
+        batch = core_cache.CacheBatch()
+        batch.add('liked', self.family, lambda: self.fail('recomputed'))
+        batch.add('viewer', core_cache.VIEWER, lambda: None, user_id=1)
+        with mock.patch.object(caches['default'], 'get_many', wraps=caches['default'].get_many) as get_many:
+            batch.fetch()
+        # The local version and value are not read from Redis
+        self.assertEqual(get_many.call_args_list, [
+            mock.call([core_cache.USER.key(user_id=1)]),
+            mock.call([core_cache.VIEWER.key(user_id=1)]),
+        ])
+
+    def test_invalidation_from_another_process(self):
+        """A key published on the invalidation channel is deleted from the local cache."""
+        core_cache.cached(self.family, lambda: ['post'])
+        key = self.family.key()
+        get_redis_connection('default').publish(local_cache.CHANNEL, key)
+        self.assertTrue(self.wait_for(lambda: local_cache.lru.get(key) is None))
+
+    def test_invalidation_is_published(self):
+        """Invalidating a local family publishes its key, and deletes it from this process at once."""
+        pubsub = get_redis_connection('default').pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(local_cache.CHANNEL)
+        self.addCleanup(pubsub.close)
+        core_cache.cached(core_cache.POST_LIKE_COUNTS, lambda: [])
+        key = core_cache.POST_LIKE_COUNTS.key()
+        core_cache.invalidate(core_cache.POST_LIKE_COUNTS)
+        self.assertIsNone(local_cache.lru.get(key))
+        messages = []
+        self.wait_for(lambda: messages.append(pubsub.get_message(timeout=0.1)) or any(messages))
+        self.assertIn(key.encode(), [m['data'] for m in messages if m])
+
+    def test_clear_is_published(self):
+        """Clearing the cache clears the local cache of this process and of the others."""
+        core_cache.cached(self.family, lambda: ['post'])
+        cache.clear()
+        self.assertEqual(len(local_cache.lru), 0)
+        local_cache.lru.set('key', 'value', 10)
+        get_redis_connection('default').publish(local_cache.CHANNEL, local_cache.CLEAR_ALL)
+        self.assertTrue(self.wait_for(lambda: len(local_cache.lru) == 0))
+
+    def test_bump_is_published(self):
+        """Bumping a namespace changes the keys of its local families in every process."""
+        core_cache.cached(self.family, lambda: ['post'])
+        core_cache.bump(core_cache.POSTS)
+        self.assertEqual(core_cache.cached(self.family, lambda: ['new post']), ['new post'])
+
+    def test_bump_from_another_process(self):
+        """A namespace bumped by another process is read again from Redis, with its new version."""
+        core_cache.cached(self.family, lambda: ['post'])
+        namespace_key = core_cache.POSTS.key()
+        cache.incr(namespace_key)
+        get_redis_connection('default').publish(local_cache.CHANNEL, namespace_key)
+        self.assertTrue(self.wait_for(lambda: local_cache.lru.get(namespace_key) is None))
+        self.assertEqual(core_cache.cached(self.family, lambda: ['new post']), ['new post'])
+
+
+@override_settings(CACHE_METRICS_FLUSH_INTERVAL=0, CACHE_COMPRESS_MIN_BYTES=100, CACHES={'default': {
+    'BACKEND': 'django_redis.cache.RedisCache',
+    'LOCATION': 'redis://redis-profile-test/0',
+    'OPTIONS': {
+        'CONNECTION_POOL_CLASS': 'redis.BlockingConnectionPool',
+        'CONNECTION_POOL_KWARGS': {'connection_class': fakeredis.FakeConnection, 'max_connections': 3},
+        'COMPRESSOR': 'core.compressors.Lz4Compressor',
+    },
+}})
+class RedisProfileTest(TestCase):
+    """
+    Test case for the production Redis profile: compression above a threshold, and the
+    metric counters flushed in a single pipeline.
+    """
+    def setUp(self):
+        cache.clear()
+        core_cache.metrics.reset()
+        self.redis = get_redis_connection('default')
+
+    def stored_size(self, key):
+        return self.redis.strlen(cache.make_and_validate_key(key))
+
+    def test_only_large_values_are_compressed(self):
+        """Values above 'CACHE_COMPRESS_MIN_BYTES' are compressed, and both are read back."""
+        small, large = 'a' * 10, [{'id': i, 'like_count': 0} for i in range(100)]
+        cache.set_many({'small': small, 'large': large})
+        self.assertEqual(self.stored_size('small'), len(cache.client._serializer.dumps(small)))
+        self.assertLess(self.stored_size('large'), len(cache.client._serializer.dumps(large)) / 2)
+        self.assertEqual(cache.get_many(['small', 'large']), {'small': small, 'large': large})
+
+    def test_metrics_are_flushed_in_one_pipeline(self):
+        """Every pending counter is sent in one pipeline, and adds up with the stored ones."""
+        family = core_cache.TOP_TAGS_POSTS
+        for _ in range(2):
+            core_cache.metrics._pending[family.name].update(hits=2, misses=1)
+            with mock.patch.object(caches['default'], 'add', side_effect=AssertionError):
+                core_cache.metrics.flush()
+        stats = core_cache.metrics.snapshot()[family.name]
+        self.assertEqual((stats['hits'], stats['misses']), (4, 2))
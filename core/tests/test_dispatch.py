@@ -0,0 +1,74 @@
+from unittest import mock
+
+from celery import shared_task
+from django.core.cache import cache
+from django.test import TestCase
+
+from core import dispatch
+
+runs = []
+
+
+@shared_task(ignore_result=True)
+def record(post_id):
+    runs.append(post_id)
+
+
+class DispatchTest(TestCase):
+    """
+    Test case for the dispatch of the Celery tasks: queued once the transaction is
+    committed, and deduplicated until they start, or during a window.
+    """
+    def setUp(self):
+        cache.clear()
+        runs.clear()
+
+    def test_queued_after_commit(self):
+        """Nothing is queued before the transaction is committed."""
+        with mock.patch.object(record, 'apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                dispatch.dispatch(record, (1,))
+                apply_async.assert_not_called()
+        apply_async.assert_called_once()
+
+    def test_burst_is_coalesced_until_the_task_starts(self):
+        """Identical tasks queue one job until it starts; other arguments queue their own."""
+        with mock.patch.object(record, 'apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                for _ in range(5):
+                    dispatch.dispatch(record, (1,))
+                dispatch.dispatch(record, (2,))
+        self.assertEqual([call.kwargs['args'] for call in apply_async.call_args_list], [(1,), (2,)])
+
+        # The key is released when the task starts, so the next change queues another job
+        record.apply(args=(1,), headers=apply_async.call_args_list[0].kwargs['headers'])
+        self.assertEqual(runs, [1])
+        with mock.patch.object(record, 'apply_async') as apply_async:
+            self.assertTrue(dispatch.send(record, (1,)))
+            self.assertFalse(dispatch.send(record, (2,)))
+
+    def test_window(self):
+        """With a window, the key is kept after the task starts."""
+        with mock.patch.object(record, 'apply_async') as apply_async:
+            self.assertTrue(dispatch.send(record, (1,), key='reindex', window=60))
+            self.assertFalse(dispatch.send(record, (2,), key='reindex', window=60))
+        self.assertIsNone(apply_async.call_args.kwargs['headers'])
+        self.assertFalse(dispatch.claim('reindex', 60))
+
+    def test_run_once(self):
+        """The work runs once per window, after commit; a rollback or a failure leaves the key free."""
+        with self.captureOnCommitCallbacks(execute=False):
+            dispatch.run_once('reset', 60, lambda: runs.append('rolled back'))
+        with self.assertRaises(OSError), self.captureOnCommitCallbacks(execute=True):
+            dispatch.run_once('reset', 60, mock.Mock(side_effect=OSError('failed')))
+        with self.captureOnCommitCallbacks(execute=True):
+            dispatch.run_once('reset', 60, lambda: runs.append('sent'))
+            dispatch.run_once('reset', 60, lambda: runs.append('duplicate'))
+        self.assertEqual(runs, ['sent'])
+
+    def test_unreachable_broker(self):
+        """A task that cannot be queued is logged, and its key released."""
+        with mock.patch.object(record, 'apply_async', side_effect=OSError('broker down')), \
+                self.assertLogs('core.dispatch', 'WARNING'):
+            self.assertFalse(dispatch.send(record, (1,)))
+        self.assertIsNone(cache.get(dispatch.task_key(record, (1,))))
@@ -0,0 +1,119 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from account.models import CustomUser, ProfileUser
+from core import media
+from core.models import BlogPost, MediaObject
+from core.tests.utils import make_image
+
+
+class ContentAddressedMediaTest(TestCase):
+    """
+    Test case for the content-addressed media: files named by their content and shared,
+    uploads encoded once, references counted, and orphans collected.
+    """
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        storage = override_settings(STORAGES={
+            'default': {'BACKEND': 'core.storage.TimedFileSystemStorage', 'OPTIONS': {'location': media_root}},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        })
+        storage.enable()
+        self.addCleanup(storage.disable)
+
+    def create_post(self, title, cover):
+        return BlogPost.objects.create(title_heading=title, slug=title.lower(), title_description='Description',
+                                       description='Content', cover_image=cover)
+
+    def refcount(self, name):
+        return MediaObject.objects.get(name=name).refcount
+
+    def test_same_content_is_stored_once(self):
+        """A content already stored is not uploaded again, and keeps its name."""
+        first = default_storage.save('uploads/a.txt', ContentFile(b'content'))
+        with mock.patch('django.core.files.storage.FileSystemStorage._save') as save:
+            self.assertEqual(default_storage.save('uploads/b.TXT', ContentFile(b'content')), first)
+        save.assert_not_called()
+        self.assertRegex(first, r'^uploads/[0-9a-f]{64}\.txt$')
+        self.assertNotEqual(default_storage.save('uploads/a.txt', ContentFile(b'other')), first)
+
+    def test_same_upload_is_encoded_once(self):
+        """The posts of the same image share one file, encoded for the first one only."""
+        with mock.patch.object(media, 'encode_webp', wraps=media.encode_webp) as encode_webp:
+            first = self.create_post('First', make_image(name='a.jpg'))
+            second = self.create_post('Second', make_image(name='b.jpg'))
+        self.assertEqual(encode_webp.call_count, 1)
+        self.assertEqual(first.cover_image.name, second.cover_image.name)
+        self.assertEqual(self.refcount(first.cover_image.name), 2)
+
+    def test_orphans_are_collected(self):
+        """A file is deleted once no post references it, after the grace period."""
+        first = self.create_post('First', make_image(color='red'))
+        second = self.create_post('Second', make_image(color='red'))
+        shared = first.cover_image.name
+
+        first.delete()
+        self.assertEqual(self.refcount(shared), 1)
+        second.cover_image = make_image(color='blue')
+        second.save()
+        self.assertEqual(self.refcount(shared), 0)
+        self.assertEqual(self.refcount(second.cover_image.name), 1)
+
+        self.assertEqual(media.collect(default_storage, grace=3600), [])  # Within the grace period
+        out = StringIO()
+        call_command('gc_media', '--grace', '0', stdout=out)
+        self.assertIn('Deleted 1 media files.', out.getvalue())
+        self.assertFalse(default_storage.exists(shared))
+        self.assertTrue(default_storage.exists(second.cover_image.name))
+
+    def test_referenced_file_is_kept(self):
+        """A file referenced without being counted, e.g. before the counts existed, is kept."""
+        post = self.create_post('First', make_image())
+        MediaObject.objects.filter(name=post.cover_image.name).update(refcount=0)
+        self.assertEqual(media.collect(default_storage, grace=0), [])
+        self.assertTrue(default_storage.exists(post.cover_image.name))
+        self.assertEqual(self.refcount(post.cover_image.name), 1)
+
+    def test_text_edits_do_not_touch_the_images(self):
+        """Editing the text of a post or a profile opens no image, and keeps its file."""
+        admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com', password='pass')
+        self.client.login(username='admin', password='pass')
+        post = self.create_post('First', make_image())
+        profile = ProfileUser.objects.create(user=admin, photo=make_image(color='blue'))
+        cover, photo = post.cover_image.name, profile.photo.name
+        self.assertTrue(photo.startswith('blog/profile image/') and photo.endswith('.webp'))
+
+        with mock.patch.object(Image, 'open', wraps=Image.open) as image_open:
+            response = self.client.post(reverse('core:post-creation', args=(post.id,)), {
+                'title_heading': 'Renamed', 'slug': 'first', 'title_description': 'Description',
+                'description': 'Content',
+            })
+            self.assertEqual(response.status_code, 302)
+            response = self.client.post(reverse('account:profile-user', args=(admin.id,)),
+                                        {'full_name': 'Admin', 'bio': 'New bio'})
+            self.assertEqual(response.status_code, 302)
+        image_open.assert_not_called()
+
+        post.refresh_from_db()
+        profile.refresh_from_db()
+        self.assertEqual((post.title_heading, post.cover_image.name), ('Renamed', cover))
+        self.assertEqual((profile.bio, profile.photo.name), ('New bio', photo))
+        self.assertEqual((self.refcount(cover), self.refcount(photo)), (1, 1))
+
+    def test_profile_without_photo(self):
+        """A profile is saved without a photo."""
+        user = CustomUser.objects.create_user(username='user', email='user@example.com', password='pass')
+        profile = ProfileUser.objects.create(user=user, bio='Bio')
+        profile.bio = 'New bio'
+        profile.save()
+        self.assertFalse(profile.photo)
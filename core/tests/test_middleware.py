@@ -0,0 +1,113 @@
+import json
+import tempfile
+import time
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from account.models import CustomUser
+from core import timing
+from core.models import ProfileCapture
+from core.profiling import PROFILE_PARAM, make_token
+
+
+class RequestTimingMiddlewareTest(TestCase):
+    """
+    Test case for the request timing middleware: the 'Server-Timing' header,
+    the structured log line and the sampling rate.
+    """
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1)
+    def test_sampled_request_has_server_timing(self):
+        """A sampled request reports every category in the 'Server-Timing' header."""
+        with self.assertLogs('freeWords.timing', level='INFO') as logs:
+            response = self.client.get(reverse('core:home'))
+        header = response['Server-Timing']
+        for category in timing.CATEGORIES + ('app', 'total'):
+            self.assertIn(f'{category};dur=', header)
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['view'], 'core:home')
+        self.assertEqual(line['status'], 200)
+        self.assertGreater(line['db_calls'], 0)
+        self.assertGreater(line['cache_calls'], 0)
+        self.assertGreater(line['template_ms'], 0)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_request(self):
+        """A request that is not sampled has no 'Server-Timing' header."""
+        response = self.client.get(reverse('core:home'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_nested_spans_are_exclusive(self):
+        """Time spent in a nested span is not counted in its parent."""
+        token = timing.current_timings.set(timing.RequestTimings())
+        try:
+            started = time.perf_counter()
+            with timing.span('template'):
+                with timing.span('db'):
+                    time.sleep(0.05)
+            wall = time.perf_counter() - started
+            timings = timing.current_timings.get()
+        finally:
+            timing.current_timings.reset(token)
+        self.assertEqual(timings.counts['db'], 1)
+        self.assertGreaterEqual(timings.durations['db'], 0.05)
+        self.assertLessEqual(timings.durations['template'] + timings.durations['db'], wall)
+
+
+@override_settings(PROFILING_ROOT=tempfile.mkdtemp(), PROFILER='cprofile')
+class ProfilingMiddlewareTest(TestCase):
+    """
+    Test case for the on-demand profiling: only staff users with a valid token of
+    their own get a capture, which is listed in the admin.
+    """
+    def setUp(self):
+        cache.clear()
+        self.staff = CustomUser.objects.create_user(username='staff', email='staff@email.com',
+                                                    password='pass', is_staff=True, is_superuser=True)
+        self.user = CustomUser.objects.create_user(username='user', email='user@email.com', password='pass')
+
+    def test_staff_with_token_gets_a_capture(self):
+        """A staff user with a valid token gets a cProfile capture of the view."""
+        self.client.login(username='staff', password='pass')
+        response = self.client.get(reverse('core:home'), {PROFILE_PARAM: make_token(self.staff)})
+        self.assertEqual(response.status_code, 200)
+        capture = ProfileCapture.objects.get(pk=response['X-Profile-Capture'])
+        self.assertEqual(capture.url_name, 'core:home')
+        self.assertEqual(capture.profiler, 'cprofile')
+        self.assertTrue(capture.output.storage.exists(capture.output.name))
+        self.assertIn('function calls', capture.summary)
+
+    def test_header_token(self):
+        """The token can also be sent in the 'X-Profile-Token' header."""
+        self.client.login(username='staff', password='pass')
+        response = self.client.get(reverse('core:posts'), HTTP_X_PROFILE_TOKEN=make_token(self.staff))
+        self.assertIn('X-Profile-Capture', response)
+
+    def test_non_staff_is_not_profiled(self):
+        """A regular user cannot profile, even with a token signed for them."""
+        self.client.login(username='user', password='pass')
+        response = self.client.get(reverse('core:home'), {PROFILE_PARAM: make_token(self.user)})
+        self.assertNotIn('X-Profile-Capture', response)
+        self.assertFalse(ProfileCapture.objects.exists())
+
+    def test_token_of_another_user_is_rejected(self):
+        """A token is only valid for the staff user it was signed for."""
+        other_staff = CustomUser.objects.create_user(username='staff2', email='staff2@email.com',
+                                                     password='pass', is_staff=True)
+        self.client.login(username='staff', password='pass')
+        response = self.client.get(reverse('core:home'), {PROFILE_PARAM: make_token(other_staff)})
+        self.assertNotIn('X-Profile-Capture', response)
+
+    def test_captures_listed_in_admin(self):
+        """The admin lists the captures and serves their output."""
+        self.client.login(username='staff', password='pass')
+        capture_id = self.client.get(reverse('core:home'), {PROFILE_PARAM: make_token(self.staff)})['X-Profile-Capture']
+        response = self.client.get(reverse('admin:core_profilecapture_changelist'))
+        self.assertContains(response, 'core:home')
+        response = self.client.get(reverse('admin:core_profilecapture_download', args=[capture_id]))
+        self.assertEqual(response.status_code, 200)
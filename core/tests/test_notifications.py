@@ -0,0 +1,114 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from account.models import CustomUser
+from core import notifications, tasks
+from core.models import BlogPost, Comment, Notification, OutboxEmail
+from core.tests.utils import make_image
+
+
+@override_settings(NOTIFICATION_DIGEST_INTERVAL=600, SITE_URL='https://blog.example.com')
+class NotificationTest(TestCase):
+    """
+    Test case for the notifications of replies and approvals: queued once committed,
+    fanned out to the users concerned, and coalesced into one digest email per user.
+    """
+    def setUp(self):
+        cache.clear()
+        self.author = CustomUser.objects.create_user(username='author', email='author@example.com', password='pass')
+        self.replier = CustomUser.objects.create_user(username='replier', email='replier@example.com',
+                                                      password='pass')
+        self.staff = CustomUser.objects.create_user(username='staff', email='staff@example.com', password='pass',
+                                                    is_staff=True)
+        self.post = BlogPost.objects.create(
+            title_heading='Post & co', slug='post', title_description='Description', description='Content',
+            cover_image=make_image(),
+        )
+        self.comment = Comment.objects.create(post=self.post, user=self.author, content='Nice', is_approved=True)
+
+    def reply(self, user, content='Thanks', is_approved=True):
+        return Comment.objects.create(post=self.post, user=user, content=content, reply=self.comment, is_reply=True,
+                                      is_approved=is_approved)
+
+    def test_reply_is_fanned_out_on_approval(self):
+        """A new reply is pending: the fan-out is queued once a moderator approves it, after the commit."""
+        self.client.login(username='replier', password='pass')
+        with mock.patch.object(tasks.fan_out_notification, 'apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('core:reply-comment', args=[self.post.id, self.comment.id]),
+                                 {'content': 'Thanks'})
+            apply_async.assert_not_called()
+
+            reply = Comment.objects.get(reply=self.comment)
+            self.client.login(username='staff', password='pass')
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('account:comment-management', args=[reply.id]), {'action': 'approve_reply'})
+                apply_async.assert_not_called()
+        self.assertEqual([call.kwargs['args'] for call in apply_async.call_args_list], [
+            (Notification.APPROVAL, reply.id, self.staff.id), (Notification.REPLY, reply.id, self.replier.id),
+        ])
+
+    def test_approval_is_fanned_out_once(self):
+        """Approving a comment notifies its author, approving it again does not."""
+        pending = Comment.objects.create(post=self.post, user=self.author, content='Pending')
+        self.client.login(username='staff', password='pass')
+        url = reverse('account:comment-management', args=[pending.id])
+        with mock.patch.object(tasks.fan_out_notification, 'apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(url, {'action': 'approve'})
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(url, {'action': 'approve'})
+        apply_async.assert_called_once()
+        self.assertEqual(apply_async.call_args.kwargs['args'], (Notification.APPROVAL, pending.id, self.staff.id))
+
+    def test_fan_out_to_the_thread(self):
+        """A reply notifies the author of the comment and the earlier approved repliers, but not its own author."""
+        other = CustomUser.objects.create_user(username='other', email='other@example.com', password='pass')
+        pending = CustomUser.objects.create_user(username='pending', email='pending@example.com', password='pass')
+        self.reply(other)
+        self.reply(pending, is_approved=False)  # Not visible in the thread yet
+        reply = self.reply(self.replier)
+        with mock.patch.object(tasks.send_notification_digest, 'apply_async') as apply_async:
+            self.assertEqual(notifications.fan_out(Notification.REPLY, reply.id, self.replier.id), 2)
+        self.assertEqual(set(Notification.objects.values_list('recipient__username', flat=True)),
+                         {'author', 'other'})
+        self.assertEqual(apply_async.call_count, 2)
+        self.assertEqual(apply_async.call_args.kwargs['countdown'], 600)
+
+    def test_notifications_are_coalesced(self):
+        """Every notification of an interval goes in the same digest, sent in one email."""
+        with mock.patch.object(tasks.send_notification_digest, 'apply_async') as apply_async:
+            for content in ('First', 'Second', 'Third'):
+                notifications.fan_out(Notification.REPLY, self.reply(self.replier, content).id, self.replier.id)
+        apply_async.assert_called_once()
+        self.assertEqual(apply_async.call_args.kwargs['args'], (self.author.id,))
+        self.assertEqual(apply_async.call_args.kwargs['countdown'], 600)
+
+        headers = apply_async.call_args.kwargs['headers']
+        with mock.patch.object(tasks, 'schedule_drain'):
+            self.assertEqual(tasks.send_notification_digest.apply(args=[self.author.id], headers=headers).get(), 3)
+        email = OutboxEmail.objects.get()
+        self.assertEqual((email.to, email.subject), ('author@example.com', '3 new notifications on FREEWORDS'))
+        self.assertEqual(email.body.count('replier replied to a comment you follow on "Post & co"'), 3)
+        self.assertIn(f'https://blog.example.com{self.post.get_absolute_url()}', email.body)
+        self.assertFalse(Notification.objects.filter(emailed_at=None).exists())
+
+        # The digest is sent: the next notification starts a new interval
+        self.assertEqual(notifications.send_digest(self.author.id), 0)
+        with mock.patch.object(tasks.send_notification_digest, 'apply_async') as apply_async:
+            notifications.fan_out(Notification.APPROVAL, self.comment.id, self.staff.id)
+        apply_async.assert_called_once()
+
+    def test_pending_reply_is_not_fanned_out(self):
+        """A reply still pending notifies nobody."""
+        reply = self.reply(self.replier, is_approved=False)
+        self.assertEqual(notifications.fan_out(Notification.REPLY, reply.id, self.replier.id), 0)
+
+    def test_unreachable_broker(self):
+        """A digest that cannot be queued is scheduled again by the next notification."""
+        with mock.patch.object(tasks.send_notification_digest, 'apply_async', side_effect=OSError):
+            notifications.fan_out(Notification.APPROVAL, self.comment.id, self.staff.id)
+        self.assertIsNone(cache.get(notifications.DIGEST_SCHEDULED_KEY.format(user_id=self.author.id)))
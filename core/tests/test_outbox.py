@@ -0,0 +1,118 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import dispatch, outbox, tasks
+from core.models import OutboxEmail
+from core.tests.smtp import LocalSMTPServer
+
+
+@override_settings(EMAIL_OUTBOX_RATE_LIMIT=0, EMAIL_OUTBOX_RETRY_DELAY=60, EMAIL_OUTBOX_MAX_ATTEMPTS=2,
+                   DEFAULT_FROM_EMAIL='blog@example.com')
+class OutboxTest(TestCase):
+    """
+    Test case for the outbound email pipeline: emails queued in the outbox are sent in
+    batches through one SMTP connection, within the rate limit, and retried with a backoff.
+    """
+    def setUp(self):
+        cache.clear()
+        self.smtp = LocalSMTPServer().__enter__()
+        self.addCleanup(self.smtp.__exit__)
+        settings = override_settings(**self.smtp.settings())
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_enqueue_schedules_a_drain_after_commit(self):
+        """Queuing stores an email per recipient, and queues a drain once committed."""
+        with mock.patch.object(tasks.drain_outbox, 'apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                outbox.enqueue('Hello', 'Body', ['a@example.com', 'b@example.com'])
+                apply_async.assert_not_called()
+        apply_async.assert_called_once()
+        self.assertEqual(OutboxEmail.objects.filter(status=OutboxEmail.PENDING).count(), 2)
+
+    def test_batch_uses_one_connection(self):
+        """Every email of a batch is sent through the same SMTP connection."""
+        with mock.patch.object(tasks, 'schedule_drain'):
+            outbox.enqueue('Hello', 'Body', [f'user{i}@example.com' for i in range(5)], html_body='<p>Body</p>')
+        self.assertEqual(outbox.drain(batch_size=10), (5, None))
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertEqual(len(self.smtp.messages), 5)
+        self.assertIn('text/html', self.smtp.messages[0])
+        self.assertEqual(OutboxEmail.objects.filter(status=OutboxEmail.SENT).count(), 5)
+
+    @override_settings(EMAIL_OUTBOX_RATE_LIMIT=3)
+    def test_rate_limit(self):
+        """No more than the rate limit is sent per minute; the rest waits for the next minute."""
+        with mock.patch.object(tasks, 'schedule_drain'):
+            outbox.enqueue('Hello', 'Body', [f'user{i}@example.com' for i in range(5)])
+        sent, next_drain = outbox.drain(batch_size=2)
+        self.assertEqual(sent, 3)
+        self.assertTrue(0 < next_drain <= 60)
+        self.assertEqual(OutboxEmail.objects.filter(status=OutboxEmail.PENDING).count(), 2)
+
+    @override_settings(EMAIL_OUTBOX_RATE_LIMIT=5, EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_unused_sends_go_back_to_their_minute(self):
+        """Sends reserved just before a minute ends are given back to that minute, not the next one."""
+        with mock.patch.object(tasks, 'schedule_drain'):
+            outbox.enqueue('Hello', 'Body', 'a@example.com')
+        claim = outbox._claim
+
+        def claim_next_minute(count):
+            clock.time.return_value = 120.5
+            return claim(count)
+
+        with mock.patch.object(outbox, 'time') as clock, \
+                mock.patch.object(outbox, '_claim', side_effect=claim_next_minute):
+            clock.time.return_value = 119.5
+            self.assertEqual(outbox.drain(batch_size=5), (1, None))
+        self.assertEqual(cache.get(f'{outbox.RATE_KEY}:1'), 1)
+        self.assertEqual(cache.get(f'{outbox.RATE_KEY}:2'), 0)
+
+    def test_refused_email_is_retried_with_backoff(self):
+        """An email refused by the server is retried later, then given up; the others are sent."""
+        with mock.patch.object(tasks, 'schedule_drain'):
+            outbox.enqueue('Hello', 'Body', ['reject@example.com', 'ok@example.com'])
+        sent, next_drain = outbox.drain()
+        self.assertEqual(sent, 1)
+        self.assertTrue(55 <= next_drain <= 60)
+        email = OutboxEmail.objects.get(to='reject@example.com')
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.PENDING, 1))
+        self.assertIn('550', email.last_error)
+
+        OutboxEmail.objects.filter(id=email.id).update(send_after=timezone.now())
+        self.assertEqual(outbox.drain(), (0, None))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.FAILED, 2))
+        # The second retry waits twice as long as the first one
+        self.assertGreater(email.send_after, timezone.now() + timedelta(seconds=110))
+
+    def test_unreachable_server(self):
+        """When the server cannot be reached, the batch is kept for a retry."""
+        with mock.patch.object(tasks, 'schedule_drain'):
+            outbox.enqueue('Hello', 'Body', ['a@example.com', 'b@example.com'])
+        with override_settings(EMAIL_PORT=1):
+            self.assertEqual(outbox.drain()[0], 0)
+        self.assertEqual(list(OutboxEmail.objects.values_list('attempts', flat=True)), [1, 1])
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_drain_task(self):
+        """The task drains the outbox and releases its schedule lock."""
+        with mock.patch.object(tasks, 'schedule_drain'):
+            outbox.enqueue('Hello', 'Body', 'a@example.com')
+        cache.set(tasks.DRAIN_SCHEDULED_KEY, True)
+        tasks.drain_outbox.apply(headers={dispatch.HEADER: tasks.DRAIN_SCHEDULED_KEY})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIsNone(cache.get(tasks.DRAIN_SCHEDULED_KEY))
+
+    def test_delayed_drain_does_not_hold_new_emails(self):
+        """A drain waiting for a retry does not prevent an immediate drain of new emails."""
+        with mock.patch.object(tasks.drain_outbox, 'apply_async') as apply_async:
+            tasks.schedule_drain(countdown=480)
+            tasks.schedule_drain()
+            tasks.schedule_drain()
+        self.assertEqual([call.kwargs['countdown'] for call in apply_async.call_args_list], [480, 0])
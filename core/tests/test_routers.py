@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from account.models import CustomUser
+from core import routers
+from core.models import BlogPost, Comment, PostLike
+from core.tests.utils import make_image
+
+REPLICA = 'replica'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTest(TestCase):
+    """
+    Test case for the read replicas, stood in for by a second SQLite database holding
+    other rows than the primary: which database the requests read from.
+    """
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.settings[REPLICA] = connections.configure_settings({
+            'default': connections.settings['default'],
+            REPLICA: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(cls.directory, 'replica.sqlite3')},
+        })[REPLICA]
+        call_command('migrate', database=REPLICA, run_syncdb=True, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = BlogPost.objects.create(title_heading='Primary', slug='post', title_description='Summary',
+                                            description='Content', cover_image=make_image())
+        # The replica has not caught up with the last change of the post
+        stale = BlogPost(id=self.post.id, title_heading='Replica', slug='post', title_description='Summary',
+                         description='Content', created_at=self.post.created_at, cover_image=self.post.cover_image)
+        stale.save(using=REPLICA)
+        self.user = CustomUser.objects.create_user(username='reader', email='reader@example.com', password='pass')
+        self.user.save(using=REPLICA)
+        self.url = reverse('core:post-detail', args=(self.post.id, self.post.slug))
+
+    def title(self):
+        """The title of the post read by the post page, which is not cached."""
+        return self.client.get(self.url).context['post'].title_heading
+
+    def test_get_requests_read_from_the_replicas(self):
+        """The GET requests read from a replica, the code outside requests from the primary."""
+        self.assertEqual(self.title(), 'Replica')
+        self.assertEqual(BlogPost.objects.get(id=self.post.id).title_heading, 'Primary')
+
+    def test_cached_values_are_computed_from_the_primary(self):
+        """A value cached for every client is read from the primary, even by a GET request."""
+        self.assertEqual(self.title(), 'Replica')
+        response = self.client.get(reverse('core:api-post', args=(self.post.id,)), {'fields': 'title'})
+        self.assertEqual(response.json()['title'], 'Primary')
+
+    def test_one_replica_per_request(self):
+        """The replica is picked once, when the request starts."""
+        with self.settings(DATABASE_REPLICAS=[REPLICA, 'other']):
+            state = routers.RoutingState(use_replicas=True)
+            token = routers._current.set(state)
+            try:
+                router = routers.ReplicaRouter()
+                self.assertEqual({router.db_for_read(BlogPost) for _ in range(20)}, {state.replica})
+            finally:
+                routers._current.reset(token)
+
+    def test_writers_are_pinned_to_the_primary(self):
+        """A client that wrote reads from the primary for a while, the other clients from the replicas."""
+        self.client.login(username='reader', password='pass')
+        response = self.client.post(reverse('core:like-post', args=(self.post.id, self.post.slug)))
+        self.assertTrue(PostLike.objects.filter(post=self.post, user=self.user).exists())
+        self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], 10)
+        self.assertEqual(self.title(), 'Primary')
+
+        self.client.cookies.pop(routers.PIN_COOKIE)  # Expired
+        self.assertEqual(self.title(), 'Replica')
+
+    def test_get_request_writing(self):
+        """A GET request writing reads from the primary from then on, and pins its client."""
+        comment = Comment.objects.create(post=self.post, user=self.user, content='Comment')
+        Comment(id=comment.id, post_id=self.post.id, user_id=self.user.id, content='Comment').save(using=REPLICA)
+        self.client.login(username='reader', password='pass')
+        response = self.client.get(reverse('core:delete-comment', args=(comment.id,)))
+        self.assertFalse(Comment.objects.filter(id=comment.id).exists())
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+
+    def test_transactions_read_from_the_primary(self):
+        """The reads of a transaction open on the primary go to the primary."""
+        router = routers.ReplicaRouter()
+        request = self.client.get(self.url).wsgi_request
+        token = routers.start_request(request)
+        try:
+            self.assertEqual(router.db_for_read(BlogPost), REPLICA)
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(BlogPost), 'default')
+        finally:
+            routers.end_request(token)
+        self.assertEqual(router.db_for_read(BlogPost), 'default')
@@ -0,0 +1,103 @@
+from datetime import timedelta
+from unittest import mock
+
+import fakeredis
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.backends.db import SessionStore as DatabaseSessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from account.models import CustomUser
+from core.sessions import SessionStore
+
+
+class SessionEngineTest(TestCase):
+    """
+    Test case for the Redis session engine: sessions and flash messages are kept out of
+    the 'django_session' table.
+    """
+    def setUp(self):
+        caches['sessions'].clear()
+        self.user = CustomUser.objects.create_user(username='reader', email='reader@example.com', password='pass123')
+
+    def test_login_does_not_write_the_database(self):
+        """A login stores the session in the cache only."""
+        response = self.client.post(reverse('account:login'), {'username': 'reader', 'password': 'pass123'})
+        self.assertTrue(response.wsgi_request.user.is_authenticated)
+        self.assertFalse(Session.objects.exists())
+        self.assertTrue(SessionStore().exists(self.client.session.session_key))
+
+    def test_message_does_not_write_the_session(self):
+        """A flash message travels in a cookie, so the redirect showing it does not save the session."""
+        self.client.login(username='reader', password='pass123')
+        with mock.patch.object(SessionStore, 'save', autospec=True) as save:
+            response = self.client.get(reverse('account:login'))
+        self.assertRedirects(response, reverse('core:home'), fetch_redirect_response=False)
+        self.assertIn('messages', response.cookies)
+        save.assert_not_called()
+
+    def test_database_session_is_moved_to_the_cache(self):
+        """A session created by the database engine is read once from the table, then from the cache."""
+        old = DatabaseSessionStore()
+        old['theme'] = 'dark'
+        old.create()
+
+        session = SessionStore(old.session_key)
+        self.assertEqual(session['theme'], 'dark')
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(SessionStore(old.session_key)['theme'], 'dark')
+
+    @override_settings(SESSION_DB_FALLBACK=False)
+    def test_database_fallback_can_be_disabled(self):
+        old = DatabaseSessionStore()
+        old['theme'] = 'dark'
+        old.create()
+        self.assertNotIn('theme', SessionStore(old.session_key))
+
+    @override_settings(SESSION_CLEAR_BATCH_SIZE=2)
+    def test_clear_expired_in_batches(self):
+        """clearsessions deletes the expired rows a batch at a time, and keeps the valid ones."""
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f'expired{i}', session_data='', expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='valid', session_data='', expire_date=now + timedelta(days=1))
+        # A select and a delete per batch of 2, then the select of an empty batch
+        with self.assertNumQueries(7):
+            call_command('clearsessions')
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['valid'])
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'sessions': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://session-test/0',
+        'OPTIONS': {'CONNECTION_POOL_KWARGS': {'connection_class': fakeredis.FakeConnection}},
+    },
+})
+class RedisSessionSaveTest(TestCase):
+    """Test case for the saves of the session engine with django_redis."""
+
+    def setUp(self):
+        caches['sessions'].clear()
+        self.session = SessionStore()
+        self.session['theme'] = 'dark'
+        self.session.create()
+
+    def test_update_does_not_read_the_session(self):
+        """Saving an existing session is a single write."""
+        self.session['theme'] = 'light'
+        with mock.patch.object(caches['sessions'], 'get', side_effect=AssertionError):
+            self.session.save()
+        self.assertEqual(SessionStore(self.session.session_key)['theme'], 'light')
+
+    def test_update_of_a_deleted_session(self):
+        """A session deleted meanwhile (e.g. by a logout elsewhere) is not recreated."""
+        caches['sessions'].delete(self.session.cache_key)
+        self.session['theme'] = 'light'
+        with self.assertRaises(UpdateError):
+            self.session.save()
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.template import Context, Template
+from django.templatetags.static import static
+from django.test import TestCase, override_settings
+
+from core.templatetags import assets
+
+CSS = '''/* The layout */
+body {
+    background: url("bg.png");
+}
+''' + ''.join(f'.column-{i} {{\n    width: {i}%;\n}}\n' for i in range(1, 100))  # Large enough to be compressed
+
+
+class StaticAssetsTest(TestCase):
+    """
+    Test case for the static files built by 'collectstatic': minified, fingerprinted,
+    precompressed and served as immutable, and the critical CSS inlined in the pages.
+    """
+    def setUp(self):
+        source, root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        for path in (source, root):
+            self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        for name, content in [('app.css', CSS), ('app.js', 'function add(first, second) {\n    return first + second;\n}\n'),
+                              ('bg.png', 'png')]:
+            with open(os.path.join(source, name), 'w') as file:
+                file.write(content)
+
+        static_settings = override_settings(
+            STATIC_ROOT=root, STATICFILES_DIRS=[source],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'core.storage.StaticAssetsStorage'},
+            },
+        )
+        static_settings.enable()
+        self.addCleanup(static_settings.disable)
+        assets._critical_css.clear()
+        self.addCleanup(assets._critical_css.clear)
+
+    def render_critical_css(self):
+        return Template("{% load assets %}{% critical_css 'app.css' %}").render(Context())
+
+    def test_files_are_served_as_they_are_before_the_build(self):
+        """Without a manifest, as in development, the names and files are the sources."""
+        self.assertEqual(static('app.css'), '/static/app.css')
+        self.assertEqual(self.render_critical_css(), f'<style>{CSS}</style>')
+
+    def test_build(self):
+        """The files are minified, named after their content and compressed."""
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+        url = static('app.css')
+        self.assertRegex(url, r'^/static/app\.[0-9a-f]{12}\.css$')
+        name = url.removeprefix('/static/')
+        with staticfiles_storage.open(name) as file:
+            css = file.read().decode()
+        self.assertNotIn('/*', css)
+        self.assertIn(static('bg.png').removeprefix('/static/'), css)  # References are fingerprinted
+        for extension in ('.gz', '.br'):
+            self.assertTrue(staticfiles_storage.exists(name + extension))
+        with staticfiles_storage.open(static('app.js').removeprefix('/static/')) as file:
+            self.assertEqual(file.read(), b'function add(first,second){return first+second;}')
+        self.assertEqual(self.render_critical_css(), f'<style>{css}</style>')
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('immutable', response['Cache-Control'])
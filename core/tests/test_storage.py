@@ -0,0 +1,53 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from storages.backends.s3 import S3Storage
+
+from core import storage
+from core.storage import TimedS3Storage
+
+
+def make_s3_storage(**options):
+    """An S3 storage building its URLs offline, as no request is sent to build them."""
+    return TimedS3Storage(access_key='key', secret_key='secret', bucket_name='freewords', location='media',
+                          endpoint_url='https://s3.example.com', region_name='us-east-1', **options)
+
+
+@override_settings(MEDIA_CDN_URL='', AWS_S3_OBJECT_PARAMETERS={'CacheControl': 'public, max-age=31536000, immutable'})
+class StorageURLTest(SimpleTestCase):
+    """
+    Test case for the URLs of the media: memoized per name and variant, rewritten to
+    the CDN, and uploaded with far-future caching headers.
+    """
+    def setUp(self):
+        storage.urls.clear()
+        self.storage = make_s3_storage()
+
+    def test_url_is_memoized(self):
+        """A URL is signed once per name and variant."""
+        with mock.patch.object(S3Storage, 'url', autospec=True, side_effect=S3Storage.url) as url:
+            first = self.storage.url('blog/cover_image/a.webp')
+            self.assertEqual(self.storage.url('blog/cover_image/a.webp'), first)
+            self.storage.url('blog/cover_image/a.webp', parameters={'ResponseContentDisposition': 'attachment'})
+            self.storage.url('blog/cover_image/b.webp')
+        self.assertEqual(url.call_count, 3)
+        self.assertIn('Signature=', first)
+
+    def test_signed_url_is_memoized_for_half_its_validity(self):
+        """A signed URL is never served after its expiry."""
+        self.assertEqual(make_s3_storage(querystring_expire=600).url_timeout, 300)
+        self.assertIsNone(make_s3_storage(querystring_auth=False).url_timeout)
+
+    @override_settings(MEDIA_CDN_URL='https://cdn.example.com/')
+    def test_cdn_url(self):
+        """With a CDN, the URLs point to it, unsigned, without any call to boto."""
+        with mock.patch.object(S3Storage, 'url') as url:
+            self.assertEqual(self.storage.url('blog/cover_image/a b.webp'),
+                             'https://cdn.example.com/media/blog/cover_image/a%20b.webp')
+        url.assert_not_called()
+
+    def test_uploads_are_cached_for_a_year(self):
+        """The presigned uploads get the caching headers of the other uploads."""
+        upload = self.storage.presigned_post('incoming/a.jpg', 'image/jpeg', 1024, 600)
+        self.assertEqual(upload['fields']['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(upload['fields']['key'], 'media/incoming/a.jpg')
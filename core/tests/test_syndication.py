@@ -0,0 +1,112 @@
+import gzip
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import syndication, tasks
+from core.models import BlogPost, Tag
+
+
+@override_settings(SITE_URL='https://blog.example.com', SITEMAP_CHUNK_SIZE=2, SYNDICATION_FEED_SIZE=20)
+class SyndicationTest(TestCase):
+    """
+    Test case for the feeds and sitemaps: rebuilt by Celery for the posts changed only,
+    and served from the cache, gzipped and with ETags, without a query.
+    """
+    def setUp(self):
+        cache.clear()
+        self.tag = Tag.objects.create(name='django tips')
+        self.posts = [
+            BlogPost.objects.create(title_heading=f'Post {i}', slug=f'post-{i}', title_description='Description',
+                                    description='Content')
+            for i in range(3)
+        ]
+        self.posts[0].tags.add(self.tag)
+
+    def test_changes_queue_a_rebuild_of_their_documents(self):
+        """A change of a post queues the rebuild of its documents and of the feeds of its tags, once committed."""
+        post = self.posts[0]
+        with mock.patch.object(tasks.rebuild_syndication, 'apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                post.title_heading = 'Renamed'
+                post.save()
+            self.assertEqual(apply_async.call_args.kwargs['args'], ([post.id], ['django tips']))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.tag.blogpost_set.add(self.posts[1])
+            self.assertEqual(apply_async.call_args.kwargs['args'], ([self.posts[1].id], ['django tips']))
+
+            post_id = post.id
+            cache.clear()  # Released by the task once started, which is mocked
+            with self.captureOnCommitCallbacks(execute=True):
+                post.delete()
+            self.assertEqual(apply_async.call_args.kwargs['args'], ([post_id], ['django tips']))
+
+    def test_feeds_are_served_from_the_cache(self):
+        """The feeds are served without a query, gzipped when accepted, and revalidated with their ETag."""
+        syndication.rebuild()
+        url = reverse('core:feed', args=('rss',))
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('<title>Post 2</title>', response.content.decode())
+        self.assertIn(f'https://blog.example.com{self.posts[0].get_absolute_url()}', response.content.decode())
+
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), response.content)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        tag_feed = self.client.get(reverse('core:tag-feed', args=('django tips', 'atom'))).content.decode()
+        self.assertIn('Post 0', tag_feed)
+        self.assertNotIn('Post 1', tag_feed)
+
+    def test_unknown_documents(self):
+        """A document that does not exist is a 404, remembered without querying again."""
+        url = reverse('core:tag-feed', args=('unknown', 'rss'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 404)
+            self.assertEqual(self.client.get(reverse('core:tag-feed', args=('other', 'rss'))).status_code, 404)
+            self.assertEqual(self.client.get(reverse('core:feed', args=('json',))).status_code, 404)
+        # Refused from the names of the tags, without a key per unknown tag
+        self.assertIsNone(cache.get(syndication._key(syndication.feed_name('rss', 'unknown'))))
+
+    def test_new_tags_are_served_once_rebuilt(self):
+        """A tag created after the names were cached has a feed once its rebuild ran."""
+        syndication.tag_names()
+        Tag.objects.create(name='new tag')  # Eager Celery: rebuilt on commit
+        syndication.rebuild([], ['new tag'])
+        self.assertEqual(self.client.get(reverse('core:tag-feed', args=('new tag', 'rss'))).status_code, 200)
+
+    def test_missing_document_is_built_once(self):
+        """A request finding the document being built by another one waits for it instead of building it too."""
+        name = syndication.feed_name('rss')
+        cache.add(syndication._lock_key(name), True)
+        build_by_the_other_request = syndication.refresh
+        with mock.patch.object(syndication.time, 'sleep', side_effect=lambda seconds: build_by_the_other_request(name)), \
+                mock.patch.object(syndication, 'refresh', wraps=syndication.refresh) as refresh:
+            self.assertIsNotNone(syndication.get(name))
+        refresh.assert_not_called()
+
+    def test_sitemap_is_sharded(self):
+        """The sitemap index lists a chunk per range of ids, and a change rebuilds its chunk only."""
+        syndication.rebuild()
+        chunks = sorted({post.id // 2 for post in self.posts})
+        index = self.client.get(reverse('core:sitemap')).content.decode()
+        for chunk in chunks:
+            self.assertIn(f'https://blog.example.com/sitemap-{chunk}.xml', index)
+        for post in self.posts:
+            response = self.client.get(reverse('core:sitemap-chunk', args=(post.id // 2,)))
+            self.assertIn(f'https://blog.example.com{post.get_absolute_url()}', response.content.decode())
+
+        post = self.posts[-1]
+        names = syndication.rebuild([post.id], [])
+        self.assertEqual(names, ['feed:rss', 'feed:atom', f'sitemap:{post.id // 2}', 'sitemap'])
+
+        BlogPost.objects.filter(id__in=[p.id for p in self.posts if p.id // 2 == post.id // 2]).delete()
+        syndication.rebuild([post.id], [])
+        self.assertEqual(self.client.get(reverse('core:sitemap-chunk', args=(post.id // 2,))).status_code, 404)
+        self.assertNotIn(f'sitemap-{post.id // 2}.xml', self.client.get(reverse('core:sitemap')).content.decode())
@@ -0,0 +1,112 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from account.models import CustomUser
+from core import tasks, uploads
+from core.models import BlogPost
+from core.tests.utils import make_image
+
+
+class DirectUploadTest(TestCase):
+    """
+    Test case for the uploads straight to the storage, against the local stand-in of
+    the bucket: presigned uploads, their confirmation, and the processing queued after.
+    """
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        storage = override_settings(STORAGES={
+            'default': {'BACKEND': 'core.storage.TimedFileSystemStorage', 'OPTIONS': {'location': media_root}},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        })
+        storage.enable()
+        self.addCleanup(storage.disable)
+
+        self.admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com',
+                                                         password='pass')
+        self.client.login(username='admin', password='pass')
+
+    def upload(self, kind, file):
+        """Uploads a file as a browser does, returns the response of 'upload-start'."""
+        started = self.client.post(reverse('core:upload-start'), {
+            'kind': kind, 'content_type': file.content_type, 'size': file.size,
+        }).json()
+        response = self.client.post(started['upload']['url'], {**started['upload']['fields'], 'file': file})
+        self.assertEqual(response.status_code, 204)
+        return started
+
+    def test_invalid_uploads_are_refused(self):
+        """Only images smaller than the limit can be uploaded, and only by superusers."""
+        url = reverse('core:upload-start')
+        response = self.client.post(url, {'kind': 'cover', 'content_type': 'text/html', 'size': 10})
+        self.assertEqual(response.status_code, 400)
+        with override_settings(UPLOAD_MAX_SIZE=100):
+            response = self.client.post(url, {'kind': 'cover', 'content_type': 'image/jpeg', 'size': 101})
+        self.assertEqual(response.status_code, 400)
+
+        self.client.logout()
+        response = self.client.post(url, {'kind': 'cover', 'content_type': 'image/jpeg', 'size': 10})
+        self.assertNotEqual(response.status_code, 200)
+
+    def test_policy_is_enforced(self):
+        """The stand-in of the bucket only accepts the file its signed policy allows."""
+        started = self.client.post(reverse('core:upload-start'), {
+            'kind': 'cover', 'content_type': 'image/jpeg', 'size': 10,
+        }).json()
+        url, fields = started['upload']['url'], started['upload']['fields']
+        response = self.client.post(url, {**fields, 'key': 'blog/cover_image/other.jpg', 'file': make_image()})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, {**fields, 'policy': 'forged', 'file': make_image()})
+        self.assertEqual(response.status_code, 403)
+        # Not uploaded, so it cannot be completed
+        response = self.client.post(reverse('core:upload-complete'), {'token': started['token']})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cover_is_converted_after_the_post_is_saved(self):
+        """An uploaded cover is set on the post, then converted to WebP by Celery."""
+        started = self.upload('cover', make_image())
+        response = self.client.post(reverse('core:upload-complete'), {'token': started['token']})
+        self.assertEqual(response.json()['url'], started['url'])
+
+        data = {'title_heading': 'New Post', 'slug': 'new-post', 'title_description': 'Description',
+                'description': 'Content', 'cover_upload': started['token']}
+        with mock.patch.object(tasks.process_cover_upload, 'apply_async') as apply_async, \
+                mock.patch('core.media.encode_webp') as encode_webp:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('core:post-creation'), data)
+        self.assertEqual(response.status_code, 302)
+        encode_webp.assert_not_called()  # The request did not touch the image
+        post = BlogPost.objects.get(title_heading='New Post')
+        name = post.cover_image.name
+        self.assertTrue(name.startswith('incoming/'))
+        self.assertEqual(apply_async.call_args.kwargs['args'], (post.id, name))
+
+        webp = uploads.process_cover(post.id, name)
+        post.refresh_from_db()
+        self.assertEqual(post.cover_image.name, webp)
+        self.assertFalse(default_storage.exists(name))
+        with default_storage.open(webp) as file:
+            self.assertEqual(Image.open(file).format, 'WEBP')
+
+    def test_invalid_media_is_deleted(self):
+        """The images of the editor are checked by Celery once confirmed."""
+        fake = SimpleUploadedFile('fake.png', b'not an image', content_type='image/png')
+        started = self.upload('media', fake)
+        name = uploads._load(started['token'])['name']
+        with mock.patch.object(tasks.process_media_upload, 'apply_async') as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('core:upload-complete'), {'token': started['token']})
+        self.assertEqual(apply_async.call_args.kwargs['args'], (name,))
+
+        self.assertFalse(uploads.process_media(name))
+        self.assertFalse(default_storage.exists(name))
+        self.assertTrue(uploads.process_media(uploads._load(self.upload('media', make_image())['token'])['name']))
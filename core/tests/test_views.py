@@ -1,5 +1,6 @@
 from django.test import TestCase, RequestFactory, Client
 from django.core.cache import cache
+from core import cache as core_cache, local_cache
 from django.urls import reverse
 from core.models import BlogPost, Tag, Comment, PostLike
 from account.models import ProfileUser, CustomUser
@@ -64,10 +65,13 @@ class HomeViewTest(TestCase):
         self.assertEqual(len(response.context['obj']), 5)
 
     def test_profile_in_context(self):
-        """Test if the logged-in user's profile is included in the context."""
+        """Test if the logged-in user's profile is included in the context, as the viewer record."""
         self.client.login(username='testuser', password='password')
         response = self.client.get(reverse('core:home'))
-        self.assertEqual(response.context['profile'], self.profile)
+        viewer = response.context['viewer']
+        self.assertTrue(viewer['has_profile'])
+        self.assertEqual(viewer['bio'], self.profile.bio)
+        self.assertEqual(viewer['photo_url'], self.profile.photo.url)
 
     def test_top_liked_posts(self):
         """Test if the most liked posts are included in the context."""
@@ -97,21 +101,22 @@ class HomeViewTest(TestCase):
         """Test if user profile is cached after login."""
         self.client.login(username='testuser', password='password')
         self.client.get(reverse('core:home'))
-        cached_profile = cache.get(f"profile_{self.user.id}")
-        self.assertEqual(cached_profile, self.profile)
+        cached_viewer = cache.get(core_cache.VIEWER.key(user_id=self.user.id))
+        self.assertEqual(cached_viewer['username'], 'testuser')
+        self.assertEqual(cached_viewer['bio'], self.profile.bio)
 
     def test_profile_not_exist(self):
         """Test if a new user without a profile does not get a profile in the context."""
         new_user = CustomUser.objects.create_user(username='newuser', password='password', email='<test1@email.com>')
         self.client.login(username='newuser', password='password', email='<test@email.com>')
         response = self.client.get(reverse('core:home'))
-        self.assertIsNone(response.context['profile'])
+        self.assertFalse(response.context['viewer']['has_profile'])
 
     def test_anonymous_user(self):
         """Test if an anonymous user sees the home page without a profile in context."""
         response = self.client.get(reverse('core:home'))
         self.assertEqual(response.status_code, 200)
-        self.assertIsNone(response.context['profile'])
+        self.assertFalse(response.context['viewer'])
 
 
 class BlogPostDetailViewTest(TestCase):
@@ -146,7 +151,7 @@ class BlogPostDetailViewTest(TestCase):
 
     def test_cache_approved_comments(self):
         """Ensure that approved comments are cached properly."""
-        cache_key = f'approved_comments_{self.post.id}'
+        cache_key = core_cache.POST_APPROVED_COMMENTS.key(post_id=self.post.id)
         cache.set(cache_key, [self.comment], timeout=1200)
         response = self.client.get(self.url)
         self.assertIn(self.comment, response.context['comments'])
@@ -193,9 +198,10 @@ class BlogPostDetailViewTest(TestCase):
         for _ in range(5):
             PostLike.objects.get_or_create(user=self.user, post=popular_post)
 
-        cache_key = 'top_liked_posts'
+        cache_key = core_cache.TOP_LIKED_POSTS.key()
 
         cache.delete(cache_key)
+        local_cache.lru.clear()
 
         response = self.client.get(self.url)
 
@@ -338,9 +344,9 @@ class DeleteCommentViewTest(TestCase):
 
     def test_cache_deleted_on_comment_removal(self):
         """Test that the cache for approved comments is cleared when a comment is deleted."""
-        cache.set(f"approved_comments_{self.post.id}", 'cached_data')
+        cache.set(core_cache.POST_APPROVED_COMMENTS.key(post_id=self.post.id), 'cached_data')
         self.client.get(self.url)
-        self.assertIsNone(cache.get(f"approved_comments_{self.post.id}"))
+        self.assertIsNone(cache.get(core_cache.POST_APPROVED_COMMENTS.key(post_id=self.post.id)))
 
     def test_success_message_on_comment_deletion(self):
         """Test that a success message is displayed when a comment is deleted."""
@@ -394,9 +400,9 @@ class DeleteReplyViewTest(TestCase):
 
     def test_cache_deleted_on_reply_removal(self):
         """Test that the cache for approved comments is cleared when a reply is deleted."""
-        cache.set(f"approved_comments_{self.post.id}", 'cached_data')
+        cache.set(core_cache.POST_APPROVED_COMMENTS.key(post_id=self.post.id), 'cached_data')
         self.client.get(self.url)
-        self.assertIsNone(cache.get(f"approved_comments_{self.post.id}"))
+        self.assertIsNone(cache.get(core_cache.POST_APPROVED_COMMENTS.key(post_id=self.post.id)))
 
     def test_success_message_on_reply_deletion(self):
         """Test that a success message is displayed when a reply is deleted."""
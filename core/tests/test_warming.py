@@ -0,0 +1,108 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from core import cache as core_cache, signals, tasks, warming
+from core.models import BlogPost, Comment
+from core.tests.utils import make_image
+from core.warming import warm
+from account.models import CustomUser
+
+
+@override_settings(CACHE_METRICS_FLUSH_INTERVAL=0, CACHE_WARM_PAGES=1, CACHE_WARM_CONCURRENCY=1)
+class CacheWarmingTest(TestCase):
+    """
+    Test case for the cache warming: the hot families are pre-computed for the first
+    home pages, and the warming is queued after migrations and bulk changes.
+    """
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='user', email='user@email.com', password='pass')
+        self.posts = [
+            BlogPost.objects.create(title_heading=f'Post {i}', slug=f'post-{i}', title_description='Desc',
+                                    description='Content', cover_image=make_image())
+            for i in range(6)
+        ]
+        Comment.objects.create(post=self.posts[-1], user=self.user, content='Nice post', is_approved=True)
+        # Also clears the per-process cache, which an earlier warming may have filled
+        cache.clear()
+        core_cache.metrics.reset()
+
+    def test_warms_the_hot_families(self):
+        """The aggregates and the posts of the first home page are cached."""
+        durations = warm()
+        self.assertEqual(list(durations), ['aggregates', 'posts of page 1'])
+        for family in (core_cache.APPROVED_COMMENTS_PER_POST, core_cache.APPROVED_COMMENTS_COUNTS,
+                       core_cache.POST_LIKE_COUNTS, core_cache.TOP_LIKED_POSTS, core_cache.TOP_TAGS_POSTS):
+            self.assertIsNotNone(cache.get(family.key()), family)
+        # The newest post is on the first page, the oldest one on the second
+        self.assertEqual(len(cache.get(core_cache.POST_APPROVED_COMMENTS.key(post_id=self.posts[-1].id))), 1)
+        self.assertIsNone(cache.get(core_cache.POST_APPROVED_COMMENTS.key(post_id=self.posts[0].id)))
+
+    def test_only_missing_values_are_computed(self):
+        cache.set(core_cache.TOP_TAGS_POSTS.key(), ['tag'])
+        warm()
+        self.assertEqual(cache.get(core_cache.TOP_TAGS_POSTS.key()), ['tag'])
+
+    def test_refresh_recomputes_every_value(self):
+        cache.set(core_cache.TOP_TAGS_POSTS.key(), ['tag'])
+        warm(refresh=True)
+        self.assertEqual(cache.get(core_cache.TOP_TAGS_POSTS.key()), [])
+        self.assertEqual(core_cache.metrics.snapshot()[core_cache.TOP_TAGS_POSTS.name]['misses'], 0)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('warm_cache', '--pages', '2', stdout=out)
+        self.assertIn('posts of page 2', out.getvalue())
+        self.assertIn('Cache warmed: 3 jobs.', out.getvalue())
+
+    def test_concurrency_is_capped_by_the_database_pool(self):
+        """No more jobs run at once than the pool has connections, besides the one of the calling thread."""
+        with mock.patch.dict(connection.settings_dict, OPTIONS={'pool': {'min_size': 1, 'max_size': 3}}):
+            self.assertEqual(warming.max_concurrency(), 2)
+        # A pool of two connections runs the jobs one at a time, in the calling thread
+        with mock.patch.object(warming, 'max_concurrency', return_value=1), \
+                mock.patch.object(warming, 'ThreadPoolExecutor', side_effect=AssertionError):
+            self.assertEqual(len(warm(pages=2, concurrency=4)), 3)
+
+    def test_schedule_warming_queues_a_single_task(self):
+        """A burst of triggers queues a single warming."""
+        with mock.patch.object(tasks.warm_cache, 'apply_async') as apply_async:
+            tasks.schedule_warming()
+            tasks.schedule_warming()
+        apply_async.assert_called_once()
+
+    def test_unreachable_broker_is_logged(self):
+        with mock.patch.object(tasks.warm_cache, 'apply_async', side_effect=OSError('broker down')), \
+                self.assertLogs('core.dispatch', 'WARNING'):
+            tasks.schedule_warming()
+        self.assertIsNone(cache.get(tasks.WARMING_SCHEDULED_KEY))
+
+    @override_settings(CACHE_WARM_AFTER_MIGRATE=True)
+    def test_warming_after_migrate(self):
+        with mock.patch.object(tasks, 'schedule_warming') as schedule_warming:
+            signals.warm_cache_after_migrate(sender=None)
+        schedule_warming.assert_called_once()
+
+    def test_bulk_changes(self):
+        """Inside a bulk change, the cache is invalidated once, after the commit, and the warming is queued."""
+        post_key = core_cache.POST_APPROVED_COMMENTS.key(post_id=self.posts[0].id)
+        top_key = core_cache.TOP_LIKED_POSTS.key()
+        with mock.patch.object(core_cache, 'invalidate') as invalidate, \
+                mock.patch.object(tasks, 'schedule_warming') as schedule_warming, \
+                self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with signals.bulk_changes():
+                Comment.objects.create(post=self.posts[0], user=self.user, content='Imported', is_approved=True)
+                BlogPost.objects.create(title_heading='Imported', slug='imported', title_description='Desc',
+                                        description='Content', cover_image=make_image())
+            self.assertEqual(core_cache.TOP_LIKED_POSTS.key(), top_key)  # Not before the commit
+        # Only the comments waiting for approval of the admin profile are invalidated per object
+        self.assertEqual({call.args[0] for call in invalidate.call_args_list},
+                         {core_cache.PENDING_COMMENTS, core_cache.PENDING_REPLIES})
+        self.assertEqual(len(callbacks), 1)
+        schedule_warming.assert_called_once()
+        self.assertNotEqual(core_cache.POST_APPROVED_COMMENTS.key(post_id=self.posts[0].id), post_key)
+        self.assertNotEqual(core_cache.TOP_LIKED_POSTS.key(), top_key)
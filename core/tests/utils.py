@@ -0,0 +1,11 @@
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+
+def make_image(name='test_image.jpg', color='red', size=(10, 10)):
+    """Builds a valid JPEG upload, so the image processing in the model 'save()' succeeds."""
+    img_io = BytesIO()
+    Image.new('RGB', size, color).save(img_io, format='JPEG')
+    return SimpleUploadedFile(name, img_io.getvalue(), content_type='image/jpeg')
@@ -0,0 +1,99 @@
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Timings of the request being served, or None when the request is not sampled
+current_timings = ContextVar('current_timings', default=None)
+
+# The innermost open span, so nested spans are not counted twice
+_current_span = ContextVar('current_span', default=None)
+
+# Categories reported for every sampled request, in the order of the Server-Timing header
+CATEGORIES = ('db', 'cache', 'template', 'storage', 'image')
+
+
+class RequestTimings:
+    """
+    Wall time of a request split into categories (DB, cache, template, storage, image).
+
+    Spans are exclusive: the time of a DB query run while a template renders is
+    counted under 'db' only, and the remaining time of the request under 'app'.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = defaultdict(float)
+        self.counts = Counter()
+
+    def add(self, category, seconds):
+        self.durations[category] += seconds
+        self.counts[category] += 1
+
+    def summary(self):
+        """Returns {category: (milliseconds, count)}, including 'app' and 'total'."""
+        total = time.perf_counter() - self.started
+        result = {category: (self.durations[category] * 1000, self.counts[category]) for category in CATEGORIES}
+        result['app'] = (max(0.0, total - sum(self.durations.values())) * 1000, 1)
+        result['total'] = (total * 1000, 1)
+        return result
+
+
+class _Span:
+    __slots__ = ('children',)
+
+    def __init__(self):
+        self.children = 0.0
+
+
+@contextmanager
+def span(category):
+    """Measures the enclosed block under the given category when the request is sampled."""
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+
+    parent = _current_span.get()
+    token = _current_span.set(_Span())
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        own = _current_span.get()
+        _current_span.reset(token)
+        timings.add(category, max(0.0, elapsed - own.children))
+        if parent is not None:
+            parent.children += elapsed
+
+
+def timed(category):
+    """Decorator version of 'span', for methods of backends such as the storage."""
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            with span(category):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorator
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """Hook for 'connection.execute_wrapper' measuring every query under 'db'."""
+    with span('db'):
+        return execute(sql, params, many, context)
+
+
+def install_db_timer(sender, connection, **kwargs):
+    """
+    Receiver of 'connection_created' installing 'db_execute_wrapper' on every database
+    connection, in whatever thread it is opened. Under ASGI the ORM runs in the threads
+    of 'sync_to_async', not on the event loop thread of the middleware, so a wrapper
+    installed by the middleware would miss its queries. The wrapper measures nothing
+    outside sampled requests.
+    """
+    if db_execute_wrapper not in connection.execute_wrappers:
+        # First, so the wrappers pushed and popped by 'connection.execute_wrapper' stay last
+        connection.execute_wrappers.insert(0, db_execute_wrapper)
@@ -0,0 +1,157 @@
+"""
+Direct uploads of the media to the object storage.
+
+The bytes of an upload do not go through the application servers:
+
+1. 'start' (the 'upload-start' view) checks the type and the size of a file, and
+   returns a presigned POST of the storage: the browser uploads the file straight to
+   the bucket, under a new random name.
+2. 'complete' (the 'upload-complete' view) is called by the browser once the file is
+   uploaded. Images of the editor are used right away, and checked by the
+   'process_media_upload' Celery task.
+3. A cover image is attached to its post by the post form ('attach_cover'), and
+   converted to WebP by the 'process_cover_upload' Celery task once the post is
+   saved ('convert_cover'): until then, the post shows the uploaded image.
+
+Every step is given a token signed by 'start', so a browser can only complete and
+attach the files it was allowed to upload. The files uploaded but never completed
+stay under 'UPLOAD_INCOMING_PATH', which a lifecycle rule of the bucket expires.
+"""
+
+import logging
+import uuid
+from functools import partial
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from . import cache as core_cache, dispatch, media
+from .models import BlogPost
+
+logger = logging.getLogger(__name__)
+
+# Images accepted, and the extension of their files
+CONTENT_TYPES = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+}
+
+COVER = 'cover'
+MEDIA = 'media'
+
+SALT = 'core.uploads'
+
+
+class UploadError(Exception):
+    """An upload refused, with a message for the user."""
+
+
+def _name(kind, content_type):
+    """Returns a new name for an upload: the covers wait in the incoming path until converted."""
+    extension = CONTENT_TYPES[content_type]
+    if kind == COVER:
+        return f'{settings.UPLOAD_INCOMING_PATH}{uuid.uuid4().hex}{extension}'
+    return f'{settings.CKEDITOR_UPLOAD_PATH}{timezone.now():%Y/%m/%d}/{uuid.uuid4().hex}{extension}'
+
+
+def start(kind, content_type, size):
+    """
+    Returns the presigned upload of a new file, and the token of the next steps.
+
+    Raises:
+        UploadError: The kind, the type or the size of the file is not accepted.
+    """
+    if kind not in (COVER, MEDIA):
+        raise UploadError('Unknown kind of upload.')
+    if content_type not in CONTENT_TYPES:
+        raise UploadError('Only JPEG, PNG, GIF and WebP images can be uploaded.')
+    if not 0 < size <= settings.UPLOAD_MAX_SIZE:
+        raise UploadError(f'Images must be smaller than {settings.UPLOAD_MAX_SIZE // (1024 * 1024)} MB.')
+
+    name = _name(kind, content_type)
+    return {
+        'upload': default_storage.presigned_post(name, content_type, settings.UPLOAD_MAX_SIZE,
+                                                 settings.UPLOAD_URL_EXPIRES),
+        'url': default_storage.url(name),
+        'token': signing.dumps({'name': name, 'kind': kind}, salt=SALT),
+    }
+
+
+def _load(token, kind=None):
+    """Returns the name of the file of a token, once uploaded."""
+    try:
+        data = signing.loads(token, salt=SALT, max_age=settings.UPLOAD_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        raise UploadError('The upload is invalid or expired.')
+    if kind and data['kind'] != kind:
+        raise UploadError('The upload is invalid or expired.')
+    if not default_storage.exists(data['name']):
+        raise UploadError('The file was not uploaded.')
+    return data
+
+
+def complete(token):
+    """
+    Confirms an upload, and queues the check of the images of the editor.
+    Returns the URL of the file.
+    """
+    data = _load(token)
+    if data['kind'] == MEDIA:
+        from .tasks import process_media_upload  # The tasks import this module
+        dispatch.dispatch(process_media_upload, (data['name'],))
+    return default_storage.url(data['name'])
+
+
+def attach_cover(post, token):
+    """Sets an uploaded cover on a post about to be saved (see 'convert_cover')."""
+    post.cover_image.name = _load(token, kind=COVER)['name']
+
+
+def convert_cover(post):
+    """Queues the conversion of the uploaded cover of a saved post, once it is committed."""
+    from .tasks import process_cover_upload
+    dispatch.dispatch(process_cover_upload, (post.id, post.cover_image.name))
+
+
+def process_media(name):
+    """Deletes an image of the editor that is not a valid image. Returns whether it is valid."""
+    try:
+        with default_storage.open(name) as file:
+            Image.open(file).verify()
+    except Exception:
+        logger.warning('Deleting the invalid upload %s', name, exc_info=True)
+        default_storage.delete(name)
+        return False
+    return True
+
+
+def process_cover(post_id, name):
+    """
+    Converts the uploaded cover of a post to WebP, and sets it on the post unless its
+    cover changed in the meantime. The uploaded file is deleted.
+    """
+    if not default_storage.exists(name):  # Already converted
+        return None
+    with default_storage.open(name) as file:
+        webp = media.rendition(file, default_storage, 'blog/cover_image/',
+                               partial(media.encode_webp, quality=BlogPost.WEBP_QUALITY), '.webp')
+
+    with transaction.atomic():
+        updated = BlogPost.objects.filter(id=post_id, cover_image=name).update(cover_image=webp)
+        if updated:
+            # The update sends no signal: count the references as 'core.signals' does
+            media.retain(webp)
+            media.release(name)
+    default_storage.delete(name)
+    if not updated:  # The WebP is collected by 'gc_media' unless another post uses it
+        return None
+    # ...and invalidate the post as on saves
+    core_cache.bump(core_cache.POST, post_id=post_id)
+    core_cache.bump(core_cache.POSTS)
+    return webp
@@ -1,22 +1,33 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views, async_views
 
 app_name = 'core'
 
+# Under ASGI, the read-heavy pages are served by their async versions (see 'core.async_views')
+if settings.ASYNC_VIEWS:
+    home_view = async_views.AsyncHomeView.as_view()
+    post_detail_view = async_views.AsyncBlogPostDetailView.as_view()
+    posts_view = async_views.AsyncPostsShowView.as_view()
+else:
+    home_view = views.HomeView.as_view()
+    post_detail_view = views.BlogPostDetailView.as_view()
+    posts_view = views.PostsShowView.as_view()
+
 urlpatterns = [
     # Home URL: A view to display the home page of the site.
     # Name: 'home'
-    # View: HomeView
+    # View: HomeView (AsyncHomeView under ASGI)
     # This URL does not require any parameters.
-    path('', views.HomeView.as_view(), name='home'),
+    path('', home_view, name='home'),
 
     # Blog Post Detail URL: A view to display a detailed view of a specific blog post.
     # Name: 'post-detail'
-    # View: BlogPostDetailView
+    # View: BlogPostDetailView (AsyncBlogPostDetailView under ASGI)
     # Parameters:
     #   - pk: The primary key (ID) of the blog post
     #   - slug: A URL-friendly slug for the blog post
-    path('post-detail/<int:pk>/<slug:slug>/', views.BlogPostDetailView.as_view(), name='post-detail'),
+    path('post-detail/<int:pk>/<slug:slug>/', post_detail_view, name='post-detail'),
 
     # Delete Comment URL: A view for users to delete a comment they have made.
     # Name: 'delete-comment'
@@ -61,11 +72,18 @@ urlpatterns = [
     #   - pk: The ID of the blog post to be edited
     path('post-creation/<int:pk>/', views.PostCreationView.as_view(), name='post-creation'),
 
+    # Direct Upload URLs: presigned uploads of the images straight to the storage, the
+    # confirmation of an upload, and the stand-in of the bucket for a local storage.
+    # Names: 'upload-start', 'upload-complete', 'upload-local'
+    path('uploads/', views.UploadStartView.as_view(), name='upload-start'),
+    path('uploads/complete/', views.UploadCompleteView.as_view(), name='upload-complete'),
+    path('uploads/local/', views.LocalUploadView.as_view(), name='upload-local'),
+
     # Posts List URL: A view to display a list of all blog posts.
     # Name: 'posts'
-    # View: PostsShowView
+    # View: PostsShowView (AsyncPostsShowView under ASGI)
     # This URL does not require any parameters.
-    path('posts/', views.PostsShowView.as_view(), name='posts'),
+    path('posts/', posts_view, name='posts'),
 
     # Delete Post URL: A view to delete a specific blog post.
     # Name: 'delete'
@@ -73,4 +91,48 @@ urlpatterns = [
     # Parameters:
     #   - pk: The ID of the blog post to be deleted
     path('posts/delete/<int:pk>/', views.DeletePostView.as_view(), name='delete'),
+
+    # Feed URL: RSS or Atom feed of the latest posts, precomputed by Celery.
+    # Name: 'feed'
+    # View: FeedView
+    # Parameters:
+    #   - kind: 'rss' or 'atom'
+    path('feeds/<str:kind>.xml', views.FeedView.as_view(), name='feed'),
+
+    # Tag Feed URL: RSS or Atom feed of the latest posts of a tag, precomputed by Celery.
+    # Name: 'tag-feed'
+    # View: FeedView
+    # Parameters:
+    #   - tag: The name of the tag
+    #   - kind: 'rss' or 'atom'
+    path('feeds/tags/<str:tag>/<str:kind>.xml', views.FeedView.as_view(), name='tag-feed'),
+
+    # Sitemap URL: Index of the chunks of the sitemap, precomputed by Celery.
+    # Name: 'sitemap'
+    # View: SitemapView
+    # This URL does not require any parameters.
+    path('sitemap.xml', views.SitemapView.as_view(), name='sitemap'),
+
+    # Sitemap Chunk URL: A chunk of the sitemap, the posts of a range of ids.
+    # Name: 'sitemap-chunk'
+    # View: SitemapView
+    # Parameters:
+    #   - chunk: The number of the chunk
+    path('sitemap-<int:chunk>.xml', views.SitemapView.as_view(), name='sitemap-chunk'),
+
+    # API URLs: Read-only JSON API, version 1 (see 'core.api').
+    # Names: 'api-posts', 'api-post', 'api-post-comments', 'api-tags'
+    # Views: PostListView, PostDetailView, CommentTreeView, TagListView
+    # Parameters:
+    #   - pk: The ID of the blog post
+    path('api/v1/posts/', api.PostListView.as_view(), name='api-posts'),
+    path('api/v1/posts/<int:pk>/', api.PostDetailView.as_view(), name='api-post'),
+    path('api/v1/posts/<int:pk>/comments/', api.CommentTreeView.as_view(), name='api-post-comments'),
+    path('api/v1/tags/', api.TagListView.as_view(), name='api-tags'),
+
+    # Cache Metrics URL: Hit/miss counters of the cache key families in the Prometheus format.
+    # Name: 'cache-metrics'
+    # View: CacheMetricsView
+    # This URL does not require any parameters.
+    path('metrics/', views.CacheMetricsView.as_view(), name='cache-metrics'),
 ]
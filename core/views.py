@@ -1,20 +1,32 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.conf import settings
 from django.views import View
 from django.views.generic import ListView, DetailView
 from . models import BlogPost, Comment, PostLike, Tag
 from .forms import CommentForm, ReplyForm, PostCreationForm
 from django.contrib import messages
 from django.urls import reverse
-from django.db.models import Count, Q
-from account.models import ProfileUser
+from django.db.models import Q
 from django.contrib.auth.mixins import UserPassesTestMixin
-from django.core.cache import cache
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+import gzip
+import hmac
+import re
+from . import cache as core_cache, queries, syndication, uploads
+from .storage import LOCAL_UPLOAD_SALT
 
 
 class HomeView(ListView):
     """
     A view for displaying the homepage that includes a list of blog posts, approved comments count,
-    user profile, and top liked and tagged posts.
+    and top liked and tagged posts.
 
     Model: BlogPost
     Template: 'core/home.html'
@@ -28,61 +40,36 @@ class HomeView(ListView):
 
     def get_context_data(self, **kwargs):
         """
-        Adds additional data to the context, such as approved comments, user profile, top liked posts,
-        and top tags. It also uses caching to improve performance and reduce database queries.
+        Adds additional data to the context, such as approved comments, top liked posts and top tags.
+        The profile of the user is shown through 'viewer' (see 'account.context_processors'). It also uses caching to improve performance and reduce database queries.
 
-        Caches are used for storing approved comments, user profiles, top liked posts, and top tags
+        Caches are used for storing approved comments, top liked posts, and top tags
         to improve website performance by reducing server load.
         """
         # Get the default context from the parent class (ListView)
         context = super().get_context_data(**kwargs)
-        comments_cache_key = 'approved_comments_per_post'
-        comments = cache.get(comments_cache_key)
 
-        # If comments are not in the cache, retrieve them from the database
-        if not comments:
-            comments = BlogPost.objects.annotate(
-                approved_comments=Count('comments', filter=Q(comments__is_approved=True))
-            ).values('id', 'approved_comments')
-            cache.set(comments_cache_key, comments, timeout=1200)
-
-        comment_dict = {item['id']: item['approved_comments'] for item in comments}
-
-        for post in context['obj']:
-            post.approved_comments = comment_dict.get(post.id, 0)
+        # Declare every cached value of the page, so they are read from the cache in one round trip
+        batch = core_cache.CacheBatch()
 
-        # Cache key for storing the user profile
-        profile_cache_key = f"profile_{self.request.user.id}"
-        profile = cache.get(profile_cache_key)
+        # If comments are not in the cache, retrieve them from the database
+        batch.add('comments', core_cache.APPROVED_COMMENTS_PER_POST, lambda: list(queries.approved_comment_counts()))
 
-        # If the profile is not in the cache, retrieve it from the database
-        if profile is None:
-            try:
-                profile = ProfileUser.objects.get(user=self.request.user.id)
-                cache.set(profile_cache_key, profile, timeout=43200)
-            except ProfileUser.DoesNotExist:
-                profile = None
-                cache.set(profile_cache_key, profile, timeout=43200)
+        # If top liked posts are not in the cache, retrieve them from the database
+        batch.add('top_liked_posts', core_cache.TOP_LIKED_POSTS, lambda: list(queries.top_liked_posts()))
 
-        context['profile'] = profile
+        # If top tagged posts are not in the cache, retrieve them from the database
+        batch.add('top_tags_posts', core_cache.TOP_TAGS_POSTS, lambda: list(queries.top_tags()))
 
-        # Cache key for storing the top liked posts
-        top_liked_posts = cache.get('top_liked_posts')
+        values = batch.fetch()
 
-        # If top liked posts are not in the cache, retrieve them from the database
-        if not top_liked_posts:
-            top_liked_posts = BlogPost.objects.annotate(like_count=Count('likes')).order_by('-like_count')[:4]
-            cache.set('top_liked_posts', top_liked_posts, timeout=21600)
-        context['top_liked_posts'] = top_liked_posts
+        comment_dict = {item['id']: item['approved_comments'] for item in values['comments']}
 
-        # Cache key for storing the top tagged posts
-        top_tags_posts = cache.get('top_tags_posts')
+        for post in context['obj']:
+            post.approved_comments = comment_dict.get(post.id, 0)
 
-        # If top tagged posts are not in the cache, retrieve them from the database
-        if not top_tags_posts:
-            top_tags_posts = Tag.objects.annotate(post_count=Count('blogpost')).order_by('-post_count')
-            cache.set('top_tags_posts', top_tags_posts, timeout=21600)
-        context['top_tags_posts'] = top_tags_posts
+        context['top_liked_posts'] = values['top_liked_posts']
+        context['top_tags_posts'] = values['top_tags_posts']
 
         return context
 
@@ -105,38 +92,31 @@ class BlogPostDetailView(DetailView):
         context = super().get_context_data(**kwargs)
 
         post_id = self.object.id
-        approved_comments_cache_key = f'approved_comments_{post_id}'
-        approved_comments = cache.get(approved_comments_cache_key)
+        user = self.request.user
 
-        # Cache approved comments to reduce database queries
-        if not approved_comments:
-            approved_comments = list(self.object.comments.filter(is_approved=True))
-            cache.set(approved_comments_cache_key, approved_comments, timeout=1200)
-        context['comments'] = approved_comments
+        # Declare every cached value of the page, so they are read from the cache in one round trip
+        batch = core_cache.CacheBatch()
 
-        context['comment_form'] = CommentForm()
-        context['reply_form'] = ReplyForm
+        # Cache approved comments to reduce database queries
+        batch.add('comments', core_cache.POST_APPROVED_COMMENTS,
+                  lambda: list(queries.approved_comments(post_id)), post_id=post_id)
 
         # Cache top 4 most liked posts to improve performance
-        top_liked_posts_cache_key = 'top_liked_posts'
-        top_liked_posts = cache.get(top_liked_posts_cache_key)
-
-        if not top_liked_posts:
-            top_liked_posts = list(BlogPost.objects.annotate(like_count=Count('likes')).order_by('-like_count')[:4])
-            cache.set(top_liked_posts_cache_key, top_liked_posts, timeout=21600)
-        context['top_liked_posts'] = top_liked_posts
+        batch.add('top_liked_posts', core_cache.TOP_LIKED_POSTS, lambda: list(queries.top_liked_posts()))
 
         # Check if the current user has liked this post (cached for performance)
-        user = self.request.user
-        context['is_liked'] = False
         if user.is_authenticated:
-            user_like_cache_key = f'user_like_{user.id}_liked_post_{post_id}'
-            is_liked = cache.get(user_like_cache_key)
-            if is_liked is None:
-                # If the like status is not cached, query the database and cache the result
-                is_liked = PostLike.objects.filter(user=self.request.user, post=post_id).exists()
-                cache.set(user_like_cache_key, is_liked, timeout=3600)
-            context['is_liked'] = is_liked
+            batch.add('is_liked', core_cache.USER_LIKED_POST,
+                      lambda: PostLike.objects.filter(user=user, post=post_id).exists(),
+                      user_id=user.id, post_id=post_id)
+
+        values = batch.fetch()
+
+        context['comments'] = values['comments']
+        context['comment_form'] = CommentForm()
+        context['reply_form'] = ReplyForm
+        context['top_liked_posts'] = values['top_liked_posts']
+        context['is_liked'] = values.get('is_liked', False)
 
         return context
 
@@ -158,7 +138,7 @@ class BlogPostDetailView(DetailView):
                     comment.save()
 
                     # Clear cache to ensure updated comments are fetched
-                    cache.delete(f"approved_comments_{self.object.id}")
+                    core_cache.invalidate(core_cache.POST_APPROVED_COMMENTS, post_id=self.object.id)
 
                     messages.success(request,
                                      'Your comment will be displayed after it is approved by the administrator.')
@@ -179,7 +159,7 @@ class BlogPostDetailView(DetailView):
                 form.save()
 
                 # Clear cache to ensure updated comments are reflected
-                cache.delete(f"approved_comments_{self.object.id}")
+                core_cache.invalidate(core_cache.POST_APPROVED_COMMENTS, post_id=self.object.id)
 
                 messages.success(request, 'Your comment was successfully edited!')
                 return redirect('core:post-detail', pk=self.object.pk, slug=self.object.slug)
@@ -229,7 +209,7 @@ class ReplyCommentView(View):
                 reply.post = post
                 reply.reply = comment  # Assign reply to the correct comment
                 reply.is_reply = True
-                reply.save()
+                reply.save()  # The thread is notified once a moderator approves it
                 messages.success(request, 'Your reply submitted successfully.')
             else:
                 messages.error(request, 'Something went wrong!')
@@ -245,7 +225,7 @@ class DeleteReplyView(View):
     def get(self, request, reply_id):
         reply = get_object_or_404(Comment, id=reply_id, is_reply=True)
         if request.user.is_authenticated and reply.user == request.user:
-            cache.delete(f"approved_comments_{reply.post.id}")
+            core_cache.invalidate(core_cache.POST_APPROVED_COMMENTS, post_id=reply.post.id)
             reply.delete()
             messages.success(request, 'Your reply has been successfully deleted.')
             return redirect('core:post-detail', pk=reply.post.pk, slug=reply.post.slug)
@@ -258,7 +238,7 @@ class DeleteCommentView(View):
     def get(self,  request, comment_id):
         comment = get_object_or_404(Comment, id=comment_id)
         if comment.user == request.user:
-            cache.delete(f"approved_comments_{comment.post.id}")
+            core_cache.invalidate(core_cache.POST_APPROVED_COMMENTS, post_id=comment.post.id)
             comment.delete()
             messages.success(request, 'Your comment has been deleted successfully.')
             return redirect('core:post-detail', pk=comment.post.id, slug=comment.post.slug)
@@ -331,9 +311,20 @@ class PostCreationView(UserPassesTestMixin, View):
         if form.is_valid():
             cd = form.cleaned_data
             post = form.save(commit=False)
-            post.cover_image = request.FILES.get('cropped_image', cd['cover_image'])  # Handle cover image
+            cover_upload = request.POST.get('cover_upload')
+            if cover_upload:
+                # Uploaded straight to the storage by the browser (see 'core.uploads')
+                try:
+                    uploads.attach_cover(post, cover_upload)
+                except uploads.UploadError as error:
+                    messages.error(request, str(error))
+                    return render(request, self.template_name, {'form': form, 'tags': self.tags, 'post': post})
+            else:
+                post.cover_image = request.FILES.get('cropped_image', cd['cover_image'])  # Handle cover image
             post.save()
             post.tags.set(cd['tags'])  # Assign tags to the post
+            if cover_upload:
+                uploads.convert_cover(post)  # Converted to WebP by Celery once committed
 
             messages.success(request,
                              'The post was updated successfully' if pk else 'The post was created successfully')
@@ -365,25 +356,15 @@ class PostsShowView(ListView):
         """Adds comment and like counts to each blog post in the context."""
         context = super().get_context_data(**kwargs)
 
-        comments_cache_key = 'approved_comments'
-        comments = cache.get(comments_cache_key)
+        # Declare every cached value of the page, so they are read from the cache in one round trip
+        batch = core_cache.CacheBatch()
+        batch.add('comments', core_cache.APPROVED_COMMENTS_COUNTS, lambda: list(queries.approved_comment_counts()))
+        batch.add('likes', core_cache.POST_LIKE_COUNTS, lambda: list(queries.like_counts()))
+        values = batch.fetch()
 
-        if not comments:
-            comments = BlogPost.objects.annotate(
-                approved_comments=Count('comments', filter=Q(comments__is_approved=True))
-            ).values('id', 'approved_comments')
-            cache.set(comments_cache_key, comments, timeout=1200)
+        comment_dict = {item['id']: item['approved_comments'] for item in values['comments']}
 
-        comment_dict = {item['id']: item['approved_comments'] for item in comments}
-
-        likes_cache_key = 'post_like'
-        likes = cache.get(likes_cache_key)
-
-        if not likes:
-            likes = BlogPost.objects.annotate(like_count=Count('likes')).values('id', 'like_count')
-            cache.set(likes_cache_key, likes, timeout=1200)
-
-        like_dict = {item['id']: item['like_count'] for item in likes}
+        like_dict = {item['id']: item['like_count'] for item in values['likes']}
 
         for post in context['obj']:
             post.approved_comments = comment_dict.get(post.id, 0)
@@ -405,3 +386,118 @@ class DeletePostView(UserPassesTestMixin, View):
         post.delete()
         messages.success(request, 'The post was deleted successfully.')
         return redirect('core:posts')
+
+
+class UploadStartView(UserPassesTestMixin, View):
+    """
+    Issues the presigned upload of an image, uploaded by the browser straight to the
+    storage (see 'core.uploads'). Only superusers, who write the posts, can upload.
+    """
+    def test_func(self):
+        return self.request.user.is_superuser
+
+    def post(self, request):
+        try:
+            size = int(request.POST.get('size', 0))
+            return JsonResponse(uploads.start(request.POST.get('kind'), request.POST.get('content_type'), size))
+        except ValueError:
+            return JsonResponse({'error': 'Invalid size.'}, status=400)
+        except uploads.UploadError as error:
+            return JsonResponse({'error': str(error)}, status=400)
+
+
+class UploadCompleteView(UserPassesTestMixin, View):
+    """Called by the browser once an image is uploaded to the storage, returns its URL."""
+    def test_func(self):
+        return self.request.user.is_superuser
+
+    def post(self, request):
+        try:
+            return JsonResponse({'url': uploads.complete(request.POST.get('token', ''))})
+        except uploads.UploadError as error:
+            return JsonResponse({'error': str(error)}, status=400)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class LocalUploadView(View):
+    """
+    Stand-in of the bucket for the uploads to a local storage (see
+    'core.storage.TimedFileSystemStorage.presigned_post'). Like S3, it accepts the
+    multipart POST of a file authorized by a signed policy rather than a session.
+    """
+    def post(self, request):
+        try:
+            policy = signing.loads(request.POST.get('policy', ''), salt=LOCAL_UPLOAD_SALT,
+                                   max_age=settings.UPLOAD_URL_EXPIRES)
+        except signing.BadSignature:
+            return HttpResponseForbidden('Invalid or expired policy')
+        file = request.FILES.get('file')
+        if (file is None or request.POST.get('key') != policy['key']
+                or request.POST.get('Content-Type') != policy['type'] or not 0 < file.size <= policy['max_size']):
+            return HttpResponse('The upload does not match its policy', status=400)
+        # Stored under the exact key, as S3 does, not under a name of its content
+        default_storage._save(policy['key'], file)
+        return HttpResponse(status=204)
+
+
+class CacheMetricsView(View):
+    """
+    Exposes the hit/miss counters of every cache key family in the Prometheus text format.
+    Accessible to staff users, or to a scraper sending 'Authorization: Bearer <CACHE_METRICS_TOKEN>'.
+    """
+    def get(self, request):
+        token = getattr(settings, 'CACHE_METRICS_TOKEN', None)
+        # Compared in constant time, so the token cannot be guessed from the response times
+        authorization = request.headers.get('Authorization', '')
+        if not (request.user.is_staff or
+                (token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()))):
+            return HttpResponseForbidden()
+        return HttpResponse(core_cache.prometheus_text(core_cache.metrics.snapshot()),
+                            content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class SyndicationView(View):
+    """
+    Serves a feed or a sitemap precomputed by Celery (see 'core.syndication'), from the
+    cache and without a query. The document is sent gzipped to the clients accepting it,
+    and a client sending back its ETag or date gets a 304.
+    """
+    accepts_gzip = re.compile(r'\bgzip\b')
+
+    def document_name(self, **kwargs):
+        """Returns the name of the document asked for, or None when there is none."""
+        raise NotImplementedError
+
+    def get(self, request, **kwargs):
+        name = self.document_name(**kwargs)
+        document = name and syndication.get(name)
+        if not document:
+            raise Http404('No document found matching the query')
+
+        last_modified = int(document['last_modified'])
+        response = get_conditional_response(request, etag=document['etag'], last_modified=last_modified)
+        if response is None:
+            if self.accepts_gzip.search(request.headers.get('Accept-Encoding', '')):
+                response = HttpResponse(document['content'], content_type=document['content_type'])
+                response['Content-Encoding'] = 'gzip'
+            else:
+                response = HttpResponse(gzip.decompress(document['content']), content_type=document['content_type'])
+        response['ETag'] = document['etag']
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'SYNDICATION_MAX_AGE', 300))
+        return response
+
+
+class FeedView(SyndicationView):
+    """Serves the RSS or Atom feed of the latest posts, or of the latest posts of a tag."""
+    def document_name(self, kind, tag=None):
+        if kind not in syndication.FEED_CLASSES or (tag is not None and tag not in syndication.tag_names()):
+            return None
+        return syndication.feed_name(kind, tag)
+
+
+class SitemapView(SyndicationView):
+    """Serves the sitemap index, or a chunk of the sitemap."""
+    def document_name(self, chunk=None):
+        return syndication.SITEMAP_INDEX if chunk is None else syndication.sitemap_name(chunk)
@@ -0,0 +1,86 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+from . import cache as core_cache, queries
+from .models import BlogPost
+from .views import HomeView
+
+logger = logging.getLogger(__name__)
+
+
+def warm_aggregates(refresh=False):
+    """Warms the values shown on every home and posts page: counts, sidebar and tag cloud."""
+    batch = core_cache.CacheBatch(refresh=refresh)
+    batch.add('comments_per_post', core_cache.APPROVED_COMMENTS_PER_POST, lambda: list(queries.approved_comment_counts()))
+    batch.add('comment_counts', core_cache.APPROVED_COMMENTS_COUNTS, lambda: list(queries.approved_comment_counts()))
+    batch.add('like_counts', core_cache.POST_LIKE_COUNTS, lambda: list(queries.like_counts()))
+    batch.add('top_liked_posts', core_cache.TOP_LIKED_POSTS, lambda: list(queries.top_liked_posts()))
+    batch.add('top_tags', core_cache.TOP_TAGS_POSTS, lambda: list(queries.top_tags()))
+    batch.fetch()
+
+
+def warm_posts(post_ids, refresh=False):
+    """Warms the approved comments shown on the detail page of the given posts."""
+    batch = core_cache.CacheBatch(refresh=refresh)
+    for post_id in post_ids:
+        batch.add(post_id, core_cache.POST_APPROVED_COMMENTS,
+                  lambda post_id=post_id: list(queries.approved_comments(post_id)), post_id=post_id)
+    batch.fetch()
+
+
+def _run(job, *args, close_connection=False):
+    """Runs a job and returns its duration in seconds."""
+    started = time.perf_counter()
+    try:
+        job(*args)
+    finally:
+        if close_connection:
+            connection.close()  # Each thread of the pool opens its own database connection
+    return time.perf_counter() - started
+
+
+def max_concurrency():
+    """
+    Jobs the database pool of the process can serve at the same time, besides the
+    connection of the thread running the warming, or None without a bounded pool.
+    """
+    pool = connection.settings_dict.get('OPTIONS', {}).get('pool')
+    if isinstance(pool, dict) and pool.get('max_size'):
+        return max(1, pool['max_size'] - 1)
+    return None
+
+
+def warm(pages=None, concurrency=None, refresh=False):
+    """
+    Pre-computes the hot cache families, so the first requests after a deploy, a Redis
+    restart or a bulk change of the content do not all recompute them at once.
+
+    It warms the aggregates of the home and posts pages, and the detail page of the
+    posts listed on the first 'pages' home pages. At most 'concurrency' jobs run at the
+    same time, to bound the load on the database, and never more than the connection
+    pool of the process can serve. Only missing values are computed,
+    unless 'refresh' is set. Returns the duration of every job, as {job: seconds}.
+    """
+    pages = pages or getattr(settings, 'CACHE_WARM_PAGES', 3)
+    concurrency = concurrency or getattr(settings, 'CACHE_WARM_CONCURRENCY', 4)
+    # Each job holds a connection: more jobs than the pool has would wait for one, and fail
+    concurrency = min(concurrency, max_concurrency() or concurrency)
+
+    post_ids = list(BlogPost.objects.values_list('id', flat=True)[:pages * HomeView.paginate_by])
+    jobs = {'aggregates': (warm_aggregates, refresh)}
+    for page, start in enumerate(range(0, len(post_ids), HomeView.paginate_by), start=1):
+        jobs[f'posts of page {page}'] = (warm_posts, post_ids[start:start + HomeView.paginate_by], refresh)
+
+    if concurrency == 1:
+        durations = {name: _run(*job) for name, job in jobs.items()}
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='cache-warming') as executor:
+            futures = {name: executor.submit(_run, *job, close_connection=True) for name, job in jobs.items()}
+            durations = {name: future.result() for name, future in futures.items()}
+
+    logger.info('Cache warmed in %.2fs: %s', sum(durations.values()), ', '.join(durations))
+    return durations
@@ -0,0 +1,26 @@
+"""
+gunicorn configuration of the ASGI deployment, with uvicorn workers.
+
+Each worker runs an event loop, so a request waiting on Redis or PostgreSQL does not
+hold the worker, and the read-heavy pages are served by their async views.
+
+Usage:
+    gunicorn freeWords.asgi:application -c deploy/gunicorn_uvicorn.py
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# One event loop per worker; a worker per core is enough as the workers do not block on I/O
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+
+worker_class = 'uvicorn_worker.UvicornWorker'
+
+# Route the home, post detail and posts pages to 'core.async_views'
+raw_env = ['ASYNC_VIEWS=1']
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
@@ -0,0 +1,23 @@
+"""
+gunicorn configuration of the WSGI deployment, with threaded workers.
+
+The threads of a worker are read from the same GUNICORN_THREADS variable as
+'settings.WORKER_THREADS', which sizes the database and Redis connection pools of
+each process, so the pools always match the requests a worker serves at once.
+
+Usage:
+    gunicorn freeWords.wsgi:application -c deploy/gunicorn_wsgi.py
+"""
+
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+workers = int(os.environ.get('GUNICORN_WORKERS', 1))
+
+# Requests served at the same time by a worker; also sizes its connection pools
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
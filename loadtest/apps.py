@@ -0,0 +1,22 @@
+from django.apps import AppConfig
+
+
+class LoadtestConfig(AppConfig):
+    """
+    Configuration class for the 'loadtest' application.
+
+    This application is only installed by 'loadtest.settings'. It provides the
+    seeding command and the cache statistics middleware used by the load harness.
+    """
+
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'loadtest'
+
+    def ready(self):
+        from core import local_cache
+
+        from .cache import CountingLocalCache
+
+        # The reads served by the per-process cache are counted too, see 'CountingLocalCache'
+        local_cache.lru = local_cache.listener.local_cache = CountingLocalCache(
+            local_cache.lru.max_bytes, local_cache.lru.timeout)
@@ -0,0 +1,182 @@
+"""
+Benchmark of the Redis cache and Celery profiles of freeWords.
+
+Compares the profile the project used to run with (no option applied: unbounded pool,
+no timeouts, no compression, one round trip per metric counter, JSON task messages)
+with the production profile of 'freeWords.settings' (blocking pool sized per worker,
+lz4/zlib compression above 'CACHE_COMPRESS_MIN_BYTES', pipelined metric flushes,
+msgpack task messages). For each one it reports the get/set throughput of threads
+sharing a pool, the bytes stored per value, the duration of a metrics flush and the
+cost of serializing task messages.
+
+It runs against an in-process fakeredis by default, which has no network latency and
+so understates the gain of compression and pipelining; pass '--redis-url' to measure
+against a real Redis.
+
+Usage:
+    python -m loadtest.bench_redis
+    python -m loadtest.bench_redis --redis-url redis://127.0.0.1:6379/15 --threads 8
+"""
+
+import argparse
+import os
+import threading
+import time
+
+import django
+
+SETTINGS_MODULE = 'loadtest.settings'
+
+
+def make_payloads(posts):
+    """Values shaped like the hot cache families, for a site of 'posts' posts."""
+    from django.utils import timezone
+
+    from account.models import CustomUser
+    from core.models import BlogPost, Comment
+
+    now = timezone.now()
+    user = CustomUser(id=1, username='reader', email='reader@example.com')
+    post = BlogPost(id=1, title_heading='A post', title_description='About something')
+    return {
+        # The per-post counters read by every home and posts page
+        'counts': [{'id': post_id, 'approved_comments': post_id % 7} for post_id in range(posts)],
+        # The approved comments of a post detail page
+        'comments': [
+            Comment(id=i, post=post, user=user, content='A comment on the post, ' * 8, is_approved=True,
+                    created_at=now, updated_at=now)
+            for i in range(20)
+        ],
+        # A namespace version, or any other small value
+        'version': 1700000000000,
+    }
+
+
+def build_cache(location, options, connection_class):
+    """A django_redis cache with the given options, outside of 'settings.CACHES'."""
+    from django_redis.cache import RedisCache
+
+    options = dict(options, CONNECTION_POOL_KWARGS=dict(options.get('CONNECTION_POOL_KWARGS', {})))
+    if connection_class is not None:
+        options['CONNECTION_POOL_KWARGS']['connection_class'] = connection_class
+    return RedisCache(location, {'OPTIONS': options})
+
+
+def profiles(threads):
+    """The options of the old and of the production profiles; compression is a variant of the latter."""
+    from django.conf import settings
+
+    production = {
+        key: value for key, value in settings.CACHES['default']['OPTIONS'].items()
+        if not key.startswith('ASYNC_')
+    }
+    # Sized for the threads of the benchmark, like GUNICORN_THREADS does for a worker
+    production['CONNECTION_POOL_KWARGS'] = dict(production['CONNECTION_POOL_KWARGS'], max_connections=threads + 2)
+    return {
+        'old': {'CLIENT_CLASS': 'django_redis.client.DefaultClient'},
+        'production (lz4)': dict(production, COMPRESSOR='core.compressors.Lz4Compressor'),
+        'production (zlib)': dict(production, COMPRESSOR='core.compressors.ZlibCompressor'),
+    }
+
+
+def bench_throughput(cache, payloads, threads, operations):
+    """Runs 'operations' get/set pairs per thread, returns the operations per second."""
+    keys = list(payloads)
+
+    def worker(thread):
+        for i in range(operations):
+            name = keys[i % len(keys)]
+            cache.set(f'bench:{thread}:{name}', payloads[name], timeout=60)
+            cache.get(f'bench:{thread}:{name}')
+
+    workers = [threading.Thread(target=worker, args=(thread,)) for thread in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return 2 * threads * operations / (time.perf_counter() - started)
+
+
+def stored_bytes(cache, payloads):
+    """Bytes stored in Redis for each payload."""
+    client = cache.client.get_client(write=True)
+    sizes = {}
+    for name, value in payloads.items():
+        cache.set(f'bench:size:{name}', value, timeout=60)
+        sizes[name] = client.strlen(cache.client.make_key(f'bench:size:{name}'))
+    return sizes
+
+
+def bench_flush(cache, counters, pipelined, rounds):
+    """Flushes 'counters' metric counters 'rounds' times, returns the milliseconds per flush."""
+    keys = [f'bench:metric:{i}' for i in range(counters)]
+    started = time.perf_counter()
+    for _ in range(rounds):
+        if pipelined:  # As 'core.cache.CacheMetrics.flush' does with django_redis
+            pipeline = cache.client.get_client(write=True).pipeline(transaction=False)
+            for key in keys:
+                pipeline.incrby(cache.client.make_key(key), 1)
+            pipeline.execute()
+        else:
+            for key in keys:
+                if not cache.add(key, 1, timeout=None):
+                    cache.incr(key, 1)
+    return (time.perf_counter() - started) * 1000 / rounds
+
+
+def bench_task_messages(rounds):
+    """Microseconds to serialize and parse the arguments of a task, per Celery serializer."""
+    from kombu.serialization import dumps, loads
+
+    message = [['Password reset', 'reader@example.com', 'https://example.com/reset/abc/def/', 'reader'], {}, {}]
+    results = {}
+    for serializer in ('json', 'msgpack'):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            content_type, encoding, body = dumps(message, serializer=serializer)
+            loads(body, content_type, encoding, accept=[content_type])
+        results[serializer] = ((time.perf_counter() - started) * 1e6 / rounds, len(body))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the old and the production Redis/Celery profiles.')
+    parser.add_argument('--redis-url', help='a real Redis to benchmark (its keys starting with "bench:" are overwritten)')
+    parser.add_argument('--threads', type=int, default=4, help='threads sharing the connection pool')
+    parser.add_argument('--operations', type=int, default=2000, help='get/set pairs per thread')
+    parser.add_argument('--posts', type=int, default=500, help='posts of the simulated site')
+    args = parser.parse_args(argv)
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = SETTINGS_MODULE
+    django.setup()
+
+    connection_class = None
+    if args.redis_url is None:
+        import fakeredis
+        connection_class = fakeredis.FakeConnection
+    location = args.redis_url or 'redis://bench/0'
+    payloads = make_payloads(args.posts)
+    # Every metric counter of every cache family, as flushed by each process
+    from core.cache import FAMILIES, CacheMetrics
+    counters = len(FAMILIES) * len(CacheMetrics.FIELDS)
+
+    header = f"{'profile':<20}{'ops/s':>10}{'flush ms':>10}" + ''.join(f'{name + " B":>12}' for name in payloads)
+    print(header)
+    print('-' * len(header))
+    for name, options in profiles(args.threads).items():
+        cache = build_cache(location, options, connection_class)
+        cache.delete_pattern('bench:*')
+        ops = bench_throughput(cache, payloads, args.threads, args.operations)
+        flush = bench_flush(cache, counters, pipelined=name != 'old', rounds=200)
+        sizes = stored_bytes(cache, payloads)
+        print(f'{name:<20}{ops:>10.0f}{flush:>10.2f}' + ''.join(f'{size:>12}' for size in sizes.values()))
+        cache.delete_pattern('bench:*')
+
+    print()
+    for serializer, (micros, size) in bench_task_messages(20000).items():
+        print(f'task message ({serializer}): {micros:.1f} us to serialize and parse, {size} bytes')
+
+
+if __name__ == '__main__':
+    main()
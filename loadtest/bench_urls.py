@@ -0,0 +1,106 @@
+"""
+Benchmark of the media URLs in the templates of freeWords.
+
+Renders the image markup of the home page (the cover of every post of the page, and
+of the top posts in the sidebar) and of a post page (its cover, and the sidebar),
+with three storages:
+
+- 'signed'   : the plain S3 storage of django-storages, building and signing every URL
+- 'memoized' : the production storage, signing a URL once per process (see
+               'core.storage.CachedURLMixin')
+- 'cdn'      : the production storage with MEDIA_CDN_URL, building unsigned CDN URLs
+
+No request is sent to S3: URLs are built and signed locally.
+
+Usage:
+    python -m loadtest.bench_urls
+    python -m loadtest.bench_urls --posts 20 --renders 500
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+import django
+
+SETTINGS_MODULE = 'loadtest.settings'
+
+PAGES = {
+    'home': '''
+        {% for o in posts %}<img src="{{ o.cover_image.url }}" alt="{{ o.title_heading }}">{% endfor %}
+        {% for post in top_posts %}<img src="{{ post.cover_image.url }}">{% endfor %}
+    ''',
+    'post-detail': '''
+        <img src="{{ post.cover_image.url }}" alt="{{ post.title_heading }}">
+        {% for post in top_posts %}<img src="{{ post.cover_image.url }}">{% endfor %}
+    ''',
+}
+
+
+def storages():
+    """The storages compared, with the settings to render with."""
+    from storages.backends.s3 import S3Storage
+
+    from core.storage import TimedS3Storage
+
+    options = dict(access_key='bench', secret_key='bench', bucket_name='freewords',
+                   endpoint_url='https://s3.example.com', region_name='us-east-1')
+    return [
+        ('signed', S3Storage(**options), {}),
+        ('memoized', TimedS3Storage(**options), {}),
+        ('cdn', TimedS3Storage(**options), {'MEDIA_CDN_URL': 'https://media.example.com'}),
+    ]
+
+
+def bench(template, context, renders):
+    """Median milliseconds per render, the first render (cold memo) excluded."""
+    template.render(context)
+    durations = []
+    for _ in range(renders):
+        start = time.perf_counter()
+        template.render(context)
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the render time of the media URLs per storage.')
+    parser.add_argument('--posts', type=int, default=10, help='posts of a page of the home page')
+    parser.add_argument('--top-posts', type=int, default=5, help='posts of the sidebar')
+    parser.add_argument('--renders', type=int, default=200, help='renders per page and storage')
+    args = parser.parse_args(argv)
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = SETTINGS_MODULE
+    django.setup()
+
+    from django.template import Context, Template
+    from django.test import override_settings
+
+    from core import storage as core_storage
+    from core.models import BlogPost
+
+    field = BlogPost._meta.get_field('cover_image')
+    templates = {name: Template(source) for name, source in PAGES.items()}
+
+    header = f'{"storage":<12}' + ''.join(f'{name + " (ms)":>20}' for name in PAGES)
+    print(header)
+    print('-' * len(header))
+    original = field.storage
+    try:
+        for name, storage, settings in storages():
+            field.storage = storage
+            core_storage.urls.clear()
+            # New posts, as a file keeps the storage of its first access
+            posts = [BlogPost(id=i, title_heading=f'Post {i}', cover_image=f'blog/cover_image/cover-{i}.webp')
+                     for i in range(args.posts)]
+            context = Context({'posts': posts, 'top_posts': posts[:args.top_posts], 'post': posts[0]})
+            with override_settings(**settings):
+                durations = [bench(template, context, args.renders) for template in templates.values()]
+            print(f'{name:<12}' + ''.join(f'{duration:>20.3f}' for duration in durations))
+    finally:
+        field.storage = original
+
+
+if __name__ == '__main__':
+    main()
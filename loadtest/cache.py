@@ -0,0 +1,57 @@
+from contextvars import ContextVar
+
+from core.local_cache import LocalCache
+from core.redis_cache import RedisCache
+
+# Hit/miss counters of the request currently being served, or None outside a request
+request_cache_stats = ContextVar('request_cache_stats', default=None)
+
+_MISSING = object()
+
+
+def _record(hits, misses):
+    """Adds the given hits and misses to the counters of the current request."""
+    stats = request_cache_stats.get()
+    if stats is not None:
+        stats['hits'] += hits
+        stats['misses'] += misses
+
+
+class CountingRedisCache(RedisCache):
+    """
+    Cache backend of the project that counts hits and misses of every read.
+
+    The counters are kept per request (see 'loadtest.middleware.CacheStatsMiddleware'),
+    so the harness can compute a cache hit ratio for each view.
+    """
+
+    def get(self, key, default=None, version=None, client=None):
+        value = super().get(key, _MISSING, version=version, client=client)
+        if value is _MISSING:
+            _record(0, 1)
+            return default
+        _record(1, 0)
+        return value
+
+    def get_many(self, keys, version=None, client=None):
+        keys = list(keys)
+        values = super().get_many(keys, version=version, client=client)
+        _record(len(values), len(keys) - len(values))
+        return values
+
+
+class CountingLocalCache(LocalCache):
+    """
+    Per-process cache (see 'core.local_cache') that counts its hits as cache hits.
+
+    The reads it serves never reach Redis, so without it the local families would not
+    appear in the hit ratio at all. Its misses are not counted: they are read from
+    Redis next, where 'CountingRedisCache' counts them.
+    """
+
+    def get(self, key, default=None):
+        value = super().get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        _record(1, 0)
+        return value
@@ -0,0 +1,77 @@
+import random
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from account.models import CustomUser, ProfileUser
+from core.models import BlogPost, Comment, PostLike, Tag
+from core.signals import bulk_changes
+from loadtest.scenario import LOADTEST_PASSWORD
+
+
+def make_image(name, color):
+    """Builds a small JPEG upload, so the image processing in the model 'save()' runs for real."""
+    img_io = BytesIO()
+    Image.new('RGB', (640, 360), color).save(img_io, format='JPEG')
+    return SimpleUploadedFile(name, img_io.getvalue(), content_type='image/jpeg')
+
+
+class Command(BaseCommand):
+    """
+    Seeds the load-test database with users, profiles, tags, posts, comments and likes.
+
+    The data set is deterministic for a given '--seed', so successive runs measure
+    the same workload.
+    """
+    help = 'Seed the load-test database with a deterministic data set.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=50)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument('--comments-per-post', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=26)
+
+    def handle(self, *args, **options):
+        if BlogPost.objects.exists():
+            self.stdout.write('The load-test database is already seeded.')
+            return
+
+        rng = random.Random(options['seed'])
+
+        users = []
+        for i in range(options['users']):
+            user = CustomUser.objects.create_user(
+                username=f'loaduser{i}', email=f'loaduser{i}@example.com',
+                password=LOADTEST_PASSWORD, full_name=f'Load User {i}',
+            )
+            ProfileUser.objects.create(user=user, bio=f'Bio of load user {i}',
+                                       photo=make_image(f'avatar{i}.jpg', (i * 10 % 256, 80, 160)))
+            users.append(user)
+
+        tags = [Tag.objects.create(name=f'tag-{i}') for i in range(options['tags'])]
+
+        # An import of posts: the cache is invalidated and warmed once, at the end
+        with bulk_changes():
+            for i in range(options['posts']):
+                post = BlogPost.objects.create(
+                    title_heading=f'Load test post {i}',
+                    slug=f'load-test-post-{i}',
+                    title_description=f'Description of load test post {i}',
+                    description='<p>' + ' '.join(['Lorem ipsum dolor sit amet.'] * 40) + '</p>',
+                    cover_image=make_image(f'cover{i}.jpg', (40, i * 5 % 256, 120)),
+                )
+                post.tags.set(rng.sample(tags, k=min(3, len(tags))))
+
+                for j in range(options['comments_per_post']):
+                    Comment.objects.create(post=post, user=rng.choice(users),
+                                           content=f'Comment {j} on post {i}', is_approved=rng.random() < 0.8)
+
+                for user in rng.sample(users, k=rng.randint(0, len(users))):
+                    PostLike.objects.create(user=user, post=post)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['users']} users, {options['tags']} tags and {options['posts']} posts."
+        ))
@@ -0,0 +1,28 @@
+from .cache import request_cache_stats
+
+
+class CacheStatsMiddleware:
+    """
+    Middleware that reports the cache reads of each request to the load harness.
+
+    It adds two response headers:
+    - 'X-Cache-Stats': the number of cache hits and misses, e.g. 'hits=3;misses=1',
+      hits of the per-process cache included
+    - 'X-View-Name': the namespaced URL name of the view that served the request
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request_cache_stats.set({'hits': 0, 'misses': 0})
+        try:
+            response = self.get_response(request)
+            stats = request_cache_stats.get()
+        finally:
+            request_cache_stats.reset(token)
+
+        response['X-Cache-Stats'] = f"hits={stats['hits']};misses={stats['misses']}"
+        if request.resolver_match is not None:
+            response['X-View-Name'] = request.resolver_match.view_name
+        return response
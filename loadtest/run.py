@@ -0,0 +1,183 @@
+"""
+Load-test harness for freeWords.
+
+Boots the application under gunicorn with 'loadtest.settings' (local stand-ins for
+PostgreSQL, Redis, RabbitMQ and S3), replays the weighted traffic mix defined in
+'loadtest.scenario' and reports, for each view, the throughput, the latency
+percentiles and the cache hit ratio.
+
+Usage:
+    python -m loadtest.run --users 20 --duration 60
+    python -m loadtest.run --url http://127.0.0.1:8000 --duration 30  # an already running server
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.request import urlopen
+
+import django
+
+from .scenario import spawn_user
+
+SETTINGS_MODULE = 'loadtest.settings'
+
+
+def setup_database(reset):
+    """Creates the SQLite schema and seeds it; returns the (id, slug) of every post and the user count."""
+    from django.conf import settings
+    from django.core.management import call_command
+
+    if reset and settings.LOADTEST_DATA_DIR.exists():
+        shutil.rmtree(settings.LOADTEST_DATA_DIR)
+    settings.LOADTEST_DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    call_command('loadtest_seed')
+
+    from account.models import CustomUser
+    from core.models import BlogPost
+    posts = list(BlogPost.objects.values_list('id', 'slug'))
+    return posts, CustomUser.objects.filter(username__startswith='loaduser').count()
+
+
+def start_server(port, workers, threads):
+    """Starts gunicorn in a subprocess and waits until it answers."""
+    # GUNICORN_THREADS sizes the connection pools of each worker (see 'freeWords.settings')
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=SETTINGS_MODULE, GUNICORN_THREADS=str(threads))
+    server = subprocess.Popen([
+        sys.executable, '-m', 'gunicorn', 'freeWords.wsgi:application',
+        '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', str(threads),
+        '--log-level', 'warning',
+    ], env=env)
+
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urlopen(url + '/', timeout=2).read()
+            return server, url
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start within 30 seconds')
+
+
+def parse_cache_stats(headers):
+    """Reads the 'X-Cache-Stats' header set by 'loadtest.middleware.CacheStatsMiddleware'."""
+    stats = {'hits': 0, 'misses': 0}
+    for part in (headers.get('X-Cache-Stats') or '').split(';'):
+        name, _, value = part.partition('=')
+        if name in stats:
+            stats[name] = int(value)
+    return stats['hits'], stats['misses']
+
+
+def run_user(user, deadline, samples, lock):
+    """Runs the tasks of one virtual user until the deadline and records a sample per request."""
+    user.on_start()
+    while time.monotonic() < deadline:
+        func = user.next_task()
+        name, (status, headers) = func()
+        elapsed = user.session.elapsed  # The reported request only, not the pages loaded before it
+        hits, misses = parse_cache_stats(headers)
+        with lock:
+            samples.append((name, elapsed, status, hits, misses))
+
+
+def percentile(values, fraction):
+    """Returns the value at the given fraction of a sorted list (nearest-rank method)."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(fraction * len(values) + 0.5) - 1))
+    return values[index]
+
+
+def summarize(samples, duration):
+    """Groups the samples per view and computes throughput, latency percentiles and cache hit ratio."""
+    grouped = defaultdict(list)
+    for sample in samples:
+        grouped[sample[0]].append(sample)
+
+    report = {}
+    for name, rows in sorted(grouped.items()):
+        latencies = sorted(row[1] for row in rows)
+        hits = sum(row[3] for row in rows)
+        misses = sum(row[4] for row in rows)
+        report[name] = {
+            'requests': len(rows),
+            'errors': sum(1 for row in rows if row[2] >= 400),
+            'rps': len(rows) / duration,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'max_ms': latencies[-1] * 1000,
+            'cache_hit_ratio': hits / (hits + misses) if hits + misses else None,
+        }
+    return report
+
+
+def print_report(report):
+    header = f"{'view':<22}{'reqs':>8}{'errs':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'cache hit':>11}"
+    print(header)
+    print('-' * len(header))
+    for name, row in report.items():
+        ratio = '-' if row['cache_hit_ratio'] is None else f"{row['cache_hit_ratio']:.1%}"
+        print(f"{name:<22}{row['requests']:>8}{row['errors']:>6}{row['rps']:>9.1f}{row['p50_ms']:>9.1f}"
+              f"{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}{ratio:>11}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a weighted traffic mix against freeWords.')
+    parser.add_argument('--users', type=int, default=10, help='number of concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='test duration in seconds')
+    parser.add_argument('--url', help='target an already running server instead of booting gunicorn')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn workers (use 1 with fakeredis)')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--reset', action='store_true', help='drop the load-test database and media first')
+    parser.add_argument('--json', help='also write the report to this JSON file')
+    args = parser.parse_args(argv)
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = SETTINGS_MODULE
+    django.setup()
+    posts, user_count = setup_database(args.reset)
+
+    server = None
+    url = args.url
+    if url is None:
+        server, url = start_server(args.port, args.workers, args.threads)
+
+    samples, lock = [], threading.Lock()
+    try:
+        deadline = time.monotonic() + args.duration
+        threads = [
+            threading.Thread(target=run_user, args=(spawn_user(url, posts, user_count, seed), deadline, samples, lock))
+            for seed in range(args.users)
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = summarize(samples, elapsed)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
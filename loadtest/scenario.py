@@ -0,0 +1,158 @@
+"""
+Weighted traffic mix replayed by the load harness.
+
+The classes follow the Locust model: each virtual user class has a weight, and its
+tasks are methods decorated with '@task(weight)'. Every task returns the name under
+which its request is reported, so the figures can be grouped per view. Only its last
+request is reported and measured.
+"""
+
+import random
+import time
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+# Password shared by every seeded user, used by the members to log in
+LOADTEST_PASSWORD = 'loadtest-password'
+
+SEARCH_TERMS = ['load', 'post 1', 'description', 'test', 'nothing-matches']
+
+
+def task(weight=1):
+    """Marks a method as a task of a virtual user, picked with the given relative weight."""
+    def decorator(func):
+        func.task_weight = weight
+        return func
+    return decorator
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    """Keeps redirects as responses, so a POST is measured without the page it redirects to."""
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HttpSession:
+    """
+    A cookie-aware HTTP client returning (status, headers) for each request.
+
+    The duration of the last request is kept in 'elapsed', so a task that loads a page
+    before the request it reports (e.g. for its CSRF cookie) is measured on the latter only.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), _NoRedirect())
+        self.elapsed = 0.0
+
+    def cookie(self, name):
+        for cookie in self.cookies:
+            if cookie.name == name:
+                return cookie.value
+        return None
+
+    def request(self, path, data=None):
+        headers = {}
+        body = None
+        if data is not None:
+            body = urlencode(data).encode()
+            headers['X-CSRFToken'] = self.cookie('csrftoken') or ''
+            headers['Referer'] = self.base_url + path
+        started = time.perf_counter()
+        try:
+            with self.opener.open(Request(self.base_url + path, data=body, headers=headers), timeout=30) as response:
+                response.read()
+                return response.status, response.headers
+        except HTTPError as error:
+            error.read()
+            return error.code, error.headers
+        finally:
+            self.elapsed = time.perf_counter() - started
+
+
+class VirtualUser:
+    """Base class of the virtual users: picks weighted tasks and runs them one after another."""
+    weight = 1
+
+    def __init__(self, base_url, posts, user_count, rng):
+        self.session = HttpSession(base_url)
+        self.posts = posts
+        self.user_count = user_count
+        self.rng = rng
+        self.tasks = [getattr(self, name) for name in dir(self)
+                      if hasattr(getattr(self, name, None), 'task_weight')]
+
+    def on_start(self):
+        """Hook called once before the first task."""
+
+    def next_task(self):
+        return self.rng.choices(self.tasks, weights=[t.task_weight for t in self.tasks])[0]
+
+    def random_post_path(self):
+        post_id, slug = self.rng.choice(self.posts)
+        return f'/post-detail/{post_id}/{slug}/', post_id, slug
+
+
+class AnonymousReader(VirtualUser):
+    """A visitor who is not logged in and only reads pages."""
+    weight = 3
+
+    @task(5)
+    def home(self):
+        page = self.rng.choice([1, 1, 1, 2, 3])
+        return 'home', self.session.request('/' if page == 1 else f'/?page={page}')
+
+    @task(4)
+    def post_detail(self):
+        path, _, _ = self.random_post_path()
+        return 'post-detail', self.session.request(path)
+
+    @task(2)
+    def search(self):
+        query = urlencode({'q': self.rng.choice(SEARCH_TERMS)})
+        return 'search', self.session.request(f'/posts/?{query}')
+
+
+class Member(VirtualUser):
+    """A logged-in user who reads posts, toggles likes and writes comments."""
+    weight = 1
+
+    def on_start(self):
+        username = f'loaduser{self.rng.randrange(self.user_count)}'
+        self.session.request('/account/login/')
+        self.session.request('/account/login/', {'username': username, 'password': LOADTEST_PASSWORD})
+
+    @task(2)
+    def home(self):
+        return 'home (member)', self.session.request('/')
+
+    @task(4)
+    def post_detail(self):
+        path, _, _ = self.random_post_path()
+        return 'post-detail (member)', self.session.request(path)
+
+    @task(2)
+    def like_toggle(self):
+        path, post_id, slug = self.random_post_path()
+        self.session.request(path)  # Loads the CSRF cookie, as a browser would; not measured
+        return 'like-toggle', self.session.request(f'/post/{post_id}/{slug}/like/', {})
+
+    @task(1)
+    def comment(self):
+        path, _, _ = self.random_post_path()
+        self.session.request(path)
+        content = f'Load test comment {self.rng.random()}'
+        return 'comment-post', self.session.request(path, {'new_comment': 'True', 'content': content})
+
+
+USER_CLASSES = [AnonymousReader, Member]
+
+
+def spawn_user(base_url, posts, user_count, seed):
+    """Creates a virtual user, choosing its class according to the class weights."""
+    rng = random.Random(seed)
+    user_class = rng.choices(USER_CLASSES, weights=[c.weight for c in USER_CLASSES])[0]
+    return user_class(base_url, posts, user_count, rng)
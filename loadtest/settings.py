@@ -0,0 +1,87 @@
+"""
+Settings used by the load-test harness.
+
+They extend the project settings and replace every external service with a local
+stand-in, so the harness can run on a single machine:
+
+- PostgreSQL  -> a SQLite file under 'loadtest/.data/'
+- Redis       -> fakeredis (or a real Redis when LOADTEST_REDIS_URL is set)
+- RabbitMQ    -> Celery eager mode with the in-memory broker
+- S3 storage  -> the local filesystem under 'loadtest/.data/media/'
+"""
+
+import os
+
+import fakeredis
+import fakeredis.aioredis
+
+from freeWords.settings import *  # noqa: F401,F403
+from freeWords.settings import BASE_DIR, CACHES, INSTALLED_APPS, MIDDLEWARE
+
+LOADTEST_DATA_DIR = BASE_DIR / 'loadtest' / '.data'
+
+SECRET_KEY = 'loadtest-only-secret-key'
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+
+INSTALLED_APPS = INSTALLED_APPS + ['loadtest.apps.LoadtestConfig']
+
+# Count cache hits and misses per request and report them in a response header
+MIDDLEWARE = MIDDLEWARE + ['loadtest.middleware.CacheStatsMiddleware']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': LOADTEST_DATA_DIR / 'db.sqlite3',
+    }
+}
+
+# A real Redis is used when LOADTEST_REDIS_URL is set, otherwise an in-process fakeredis.
+# fakeredis is private to each gunicorn worker, so run a single worker with it.
+LOADTEST_REDIS_URL = os.environ.get('LOADTEST_REDIS_URL')
+
+# The production options (pool, timeouts, compression), so the harness measures them too
+CACHES = {
+    'default': {
+        'BACKEND': 'loadtest.cache.CountingRedisCache',
+        'LOCATION': LOADTEST_REDIS_URL or 'redis://loadtest/0',
+        'OPTIONS': {
+            **CACHES['default']['OPTIONS'],
+            'CONNECTION_POOL_KWARGS': dict(CACHES['default']['OPTIONS']['CONNECTION_POOL_KWARGS']),
+        }
+    }
+}
+
+if not LOADTEST_REDIS_URL:
+    CACHES['default']['OPTIONS']['CONNECTION_POOL_KWARGS']['connection_class'] = fakeredis.FakeConnection
+    # Same fake server for the redis.asyncio client of the async views
+    CACHES['default']['OPTIONS']['ASYNC_CONNECTION_CLASS'] = fakeredis.aioredis.FakeConnection
+
+# Sessions on the same server, under their own prefix
+CACHES['sessions'] = {**CACHES['default'], 'BACKEND': 'django_redis.cache.RedisCache', 'KEY_PREFIX': 'session'}
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'core.storage.TimedFileSystemStorage',
+        'OPTIONS': {
+            'location': LOADTEST_DATA_DIR / 'media',
+            'base_url': '/media/',
+        },
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    }
+}
+
+# Run Celery tasks inline instead of sending them to RabbitMQ
+CELERY_BROKER_URL = 'memory://'
+CELERY_RESULT_BACKEND = 'cache+memory://'
+CELERY_TASK_ALWAYS_EAGER = True
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+# No warming queued by 'migrate': with eager Celery it would run inside the migrate of
+# the test database and fill the caches before the first test. Run 'warm_cache' instead.
+CACHE_WARM_AFTER_MIGRATE = False